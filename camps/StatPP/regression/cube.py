@@ -0,0 +1,100 @@
+import logging
+import numpy as np
+from multiprocessing import shared_memory
+
+
+"""Module: cube.py
+
+Classes:
+    PredictorCube
+        Methods:
+            __init__
+            attach
+            name
+            close
+            __enter__
+            __exit__
+"""
+
+
+class PredictorCube(object):
+    """Preallocated, contiguous float32 array dimensioned by
+    [number_of_vars, number_of_stations, number_of_dates] that predictors
+    and predictands are written into in place.
+
+    Attributes:
+        shape (tuple): Shape of the cube.
+        array (:np.array:): The float32 data array.
+        shm (:obj:SharedMemory): Shared memory block backing the array, or
+                None if the cube lives in process memory.
+
+    Note:
+        When shared, the array is backed by multiprocessing.shared_memory so
+        worker processes can attach to it by name rather than receiving a
+        pickled copy. The process that created the block is responsible for
+        calling close, which also unlinks it.
+    """
+
+    dtype = np.dtype('float32')
+
+    def __init__(self, shape, shared=False, name=None):
+        """Allocates the cube, or attaches to an existing shared block.
+
+        Args:
+            shape (tuple): Shape of the cube.
+            shared (bool): If the cube should be backed by shared memory.
+            name (str): Name of an existing shared memory block to attach to.
+        """
+
+        self.shape = tuple(int(n) for n in shape)
+        self.shm = None
+        self._owner = False
+        nbytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        if name is not None:
+            self.shm = shared_memory.SharedMemory(name=name)
+        elif shared:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes,1))
+            self._owner = True
+            logging.info("Created shared predictor cube "+self.shm.name+" of "+str(nbytes)+" bytes")
+
+        if self.shm is None:
+            self.array = np.empty(self.shape, dtype=self.dtype)
+        else:
+            self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+
+    @classmethod
+    def attach(cls, name, shape):
+        """Returns a PredictorCube attached to an existing shared block."""
+
+        return cls(shape, name=name)
+
+
+    @property
+    def name(self):
+        """Name of the shared memory block, or None if not shared."""
+
+        if self.shm is None:
+            return None
+        return self.shm.name
+
+
+    def close(self):
+        """Releases the array. Shared blocks are closed and, if this
+        process created them, unlinked.
+        """
+
+        self.array = None
+        if self.shm is not None:
+            self.shm.close()
+            if self._owner:
+                self.shm.unlink()
+            self.shm = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,36 +2,157 @@ import sys
 import numpy as np
 import pdb
 import logging
+import functools
+from multiprocessing import Pool, cpu_count
 from ...core import util as util
+from .cube import PredictorCube
 
 
-def get_aaa(stations, predictors):
-    """aaa is a 3D data array used in xprod and plr. When returned, aaa is
-       dimensioned by [number_of_vars, number_of_stations, number_of_dates].
+def get_aaa(stations, predictors, shared=False):
+    """aaa is a 3D data array used in xprod and plr. Returns a PredictorCube
+       whose array is dimensioned by [number_of_vars, number_of_stations, number_of_dates].
+       Each variable is written into the preallocated cube in place. Masked
+       values are stored as 9999, the missing value xprod tests for.
     """
 
-    # Slice stations if need be
-
-    # Slice Dates
-
-    # Stack data
     logging.info('Creating aaa array')
-    aaa = None
-    for pred in predictors:
+    cube = None
+    for nv,pred in enumerate(predictors):
         # Just get the station and date dimensions
-        num_dimensions =  len(pred.data.shape)
-        cur_data = pred.data.copy()
-        if num_dimensions > 2:
+        cur_data = pred.data
+        if cur_data.ndim > 2:
             cur_data = cur_data[:,:,0]
-        if aaa is None:
-            aaa = cur_data.copy()
-        else:
-            aaa = np.dstack((aaa,cur_data))
+        if cube is None:
+            cube = PredictorCube((len(predictors),)+cur_data.T.shape, shared=shared)
+        dest = cube.array[nv]
+        np.copyto(dest, np.ma.getdata(cur_data).T, casting='unsafe')
+        if np.ma.is_masked(cur_data):
+            dest[np.ma.getmaskarray(cur_data).T] = 9999.0
+
+    return cube
+
+
+def xprod(regression_params, aaa, num_dates, stations, groups, num_vars, num_processors=1):
+    """Computes the sample size, variable sums, and sums of cross products
+    for each station group. Returns [smpl, sums, sumx]. The engine used is
+    selected by the 'xprod_engine' regression parameter; 'numpy' (default)
+    or 'loop'. aaa may be an array or a PredictorCube.
+    """
+
+    engine = regression_params.get('xprod_engine', 'numpy')
+    if engine == 'numpy':
+        return xprod_numpy(regression_params, aaa, num_dates, stations, groups, num_vars,
+                           num_processors=num_processors)
+    elif engine == 'loop':
+        if isinstance(aaa, PredictorCube):
+            aaa = aaa.array
+        return xprod_loop(regression_params, aaa, num_dates, stations, groups, num_vars)
+    raise ValueError("Unknown xprod_engine: " + str(engine))
+
+
+def xprod_chunk(data, locs, nvrbl, ndates):
+    """Returns the sample counts, sums and cross products for the stations
+    at locs in data. Results are dimensioned by station.
+    """
+
+    # blk is dimensioned [stations, vars, dates]. Missing values are
+    # tested in float32, matching the precision used by xprod_loop.
+    blk = np.moveaxis(data[:nvrbl,locs,:ndates].astype('float32'), 1, 0)
+    valid = ~np.any(blk == 9999.0, axis=1)
+    blk = blk.astype('float64')
+    blk *= valid[:,np.newaxis,:]
+
+    counts = np.count_nonzero(valid, axis=1).astype('float64')
+    psums = blk.sum(axis=2)
+    pxprod = np.matmul(blk, blk.transpose(0,2,1))
+    return counts, psums, pxprod
+
+
+def xprod_chunk_shared(name, shape, locs, nvrbl, ndates):
+    """Worker version of xprod_chunk that attaches to a shared PredictorCube."""
+
+    cube = PredictorCube.attach(name, shape)
+    try:
+        return xprod_chunk(cube.array, locs, nvrbl, ndates)
+    finally:
+        cube.close()
+
+
+def xprod_numpy(regression_params, aaa, num_dates, stations, groups, num_vars, chunk_size=256, num_processors=1):
+    """Vectorized version of xprod_loop. The missing value mask is built once
+    per (station, date), and the per-station sums and cross products are
+    computed as batched matrix products over chunks of at most chunk_size
+    stations before being reduced into their groups. If aaa is a shared
+    PredictorCube and num_processors is greater than 1, chunks are computed
+    by worker processes attached to the cube.
+    """
+
+    logging.info('Calculating Cross Products')
+    ndates = num_dates
+    nvrbl = num_vars
+    num_groups = len(groups)
+    logging.info("Number of dates       : "+str(ndates))
+    logging.info("Number of vars        : "+str(nvrbl))
+    logging.info("Number of stations is :" +str(len(stations)))
+
+    # Map each station to its location in aaa once, rather than searching
+    # the station list for every group member.
+    station_index = {s : i for i,s in enumerate(stations)}
+    shared_name = None
+    if isinstance(aaa, PredictorCube):
+        shared_name = aaa.name
+        shape = aaa.shape
+        data = aaa.array
+    else:
+        data = np.ma.getdata(aaa)
+
+    # Variables start with index 1 in the output arrays, as in xprod_loop.
+    smpl = np.zeros((num_groups),dtype='float64',order='F')
+    sums = np.zeros((num_groups,nvrbl+1),dtype='float64',order='F')
+    sumx = np.zeros((num_groups,nvrbl+1,nvrbl+1),dtype='float64',order='F')
+
+    # Flatten groups into (group, station location) pairs. Pairs are ordered
+    # by group so each chunk can be reduced with np.add.reduceat.
+    pair_group = np.repeat(np.arange(num_groups), [len(g) for g in groups])
+    pair_loc = np.array([station_index[s] for g in groups for s in g], dtype='int64')
+    starts = list(range(0, len(pair_loc), chunk_size))
+
+    if shared_name is not None and num_processors > 1 and len(starts) > 1:
+        args = [(shared_name, shape, pair_loc[s:s+chunk_size], nvrbl, ndates) for s in starts]
+        pool = Pool(num_processors)
+        try:
+            results = pool.imap(functools.partial(_xprod_star, xprod_chunk_shared), args)
+            _reduce_chunks(results, starts, pair_group, chunk_size, smpl, sums, sumx)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = (xprod_chunk(data, pair_loc[s:s+chunk_size], nvrbl, ndates) for s in starts)
+        _reduce_chunks(results, starts, pair_group, chunk_size, smpl, sums, sumx)
+
+    return [smpl,sums,sumx]
+
+
+def _xprod_star(func, args):
+    return func(*args)
+
+
+def _reduce_chunks(results, starts, pair_group, chunk_size, smpl, sums, sumx):
+    """Reduces per-station chunk results into their groups."""
 
-    return aaa.T
+    for start,(counts,psums,pxprod) in zip(starts, results):
+        gidx = pair_group[start:start+chunk_size]
+        bounds = np.flatnonzero(np.r_[True, gidx[1:] != gidx[:-1]])
+        ug = gidx[bounds]
+        smpl[ug] += np.add.reduceat(counts, bounds)
+        sums[ug,1:] += np.add.reduceat(psums, bounds, axis=0)
+        sumx[ug,1:,1:] += np.add.reduceat(pxprod, bounds, axis=0)
 
 
-def xprod(regression_params, aaa, num_dates, stations, groups, num_vars):
+def xprod_loop(regression_params, aaa, num_dates, stations, groups, num_vars):
+    """Original loop based cross product calculation. Retained as a reference
+    implementation for xprod_numpy.
+    """
 
     logging.info('Calculating Cross Products')
     stations = list(stations)
@@ -109,7 +230,11 @@ def xprod(regression_params, aaa, num_dates, stations, groups, num_vars):
     return [smpl,sums,sumx]
 
 
-def regress(groups,predictors,predictands,aaa,q,regression_params):
+def regress(groups,predictors,predictands,aaa,q,regression_params,num_processors=1):
+    """Develops a regression equation for each station group. When
+    num_processors is greater than 1, groups are farmed out to a pool of
+    worker processes. Equations are returned in the original group order.
+    """
 
     # Note the following:
     #
@@ -119,6 +244,53 @@ def regress(groups,predictors,predictands,aaa,q,regression_params):
 
     logging.info(" -- INSIDE FUNCTION REGRESS")
 
+    npred = len(predictors)
+    ntand = len(predictands)
+    nvrbl = ntand + npred
+    logging.info(" nvrbl = " + str(nvrbl))
+    logging.info(" npred = " + str(npred))
+    logging.info(" ntand = " + str(ntand))
+
+    # Workers only need the procedure strings of the predictors and their
+    # own group's slice of q, not the full predictor objects.
+    procedures = [pred.SOSA__usedProcedure for pred in predictors]
+    develop = functools.partial(regress_group, procedures=procedures, npred=npred,
+                                ntand=ntand, regression_params=regression_params)
+    args = [(ng, g, (q[0][ng], q[1][ng,:], q[2][ng,:,:])) for ng,g in enumerate(groups)]
+
+    if num_processors > 1 and len(groups) > 1:
+        logging.info(" Developing equations for "+str(len(groups))+" groups on "+str(num_processors)+" processes")
+        pool = Pool(num_processors)
+        try:
+            equations = pool.starmap(develop, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        equations = [develop(*arg) for arg in args]
+
+    for i,j in enumerate(predictors):
+        logging.info(i)
+        logging.info(j)
+    return equations
+
+
+def regress_group(ng, group, q_ng, procedures, npred, ntand, regression_params):
+    """Develops the regression equation for a single station group.
+
+    Args:
+        ng (int): Index of the group.
+        group (list): Stations in the group.
+        q_ng (tuple): Sample size, variable sums and cross products for the group.
+        procedures (list): SOSA__usedProcedure string of each predictor.
+        npred (int): Number of predictors.
+        ntand (int): Number of predictands.
+        regression_params (dict): Regression parameters from the control file.
+
+    Returns:
+        dict: The equation for the group.
+    """
+
     nst = regression_params['nst']       # Number of predictors to select.
     mforce = regression_params['mforce'] # Number of predictors to force.
     nselt = regression_params['nselt']   # Selection method.
@@ -133,29 +305,11 @@ def regress(groups,predictors,predictands,aaa,q,regression_params):
     colnb = regression_params['colnb']   # Remaining RV of a point binary predictor for it to be selected
     colngb = regression_params['colngb'] # Remaining RV of a grid binary predictor for it to be selected
 
-    npred = len(predictors)
-    #remove next line
-    #npred = npred - 2
-    ntand = len(predictands)
     nvrbl = ntand + npred
-    num_stations = aaa.shape[1]
-    #for t in typ:
-    #    if t == 1: npred += 1
-    #    if t == 2: ntand += 1
-    logging.info(" nvrbl = " + str(nvrbl))
-    logging.info(" npred = " + str(npred))
-    logging.info(" ntand = " + str(ntand))
 
-    # Riley
+    # Work arrays are created for every group so that no state carries
+    # over from one group to the next.
     predictor_list = np.zeros((nvrbl+1),dtype='int32',order='F')
-    coefs = np.zeros((len(groups),nvrbl),dtype='int32',order='F')
-    constants = np.zeros((len(groups)),dtype='int32',order='F')
-    predictand_list = np.zeros((len(predictands)),dtype='int32',order='F')
-    summary = [([0]*12) for i in range((npred))]
-    # End Riley
-
-    #lp = np.zeros((5,nvrbl+1),dtype='int32',order='F')
-    #slp = np,.zeros((5,nvrbl+1),dtype='float32',order='F')
 
     avg = np.zeros((nvrbl+1),dtype='float64',order='F') # Arithmetic average for each variable.
     const = np.zeros((ntand+1),dtype='float64',order='F')  # variances of predictands
@@ -175,286 +329,271 @@ def regress(groups,predictors,predictands,aaa,q,regression_params):
     # finding strongest (anti)-correlations between remaining predictors and predictands
     # to be used to select next predictor key to add to regression equation
 
-    # Init Equations
-    equations = []
-    for ng,group in enumerate(groups):
-        equations.append({'stations' : group})
-        equations[ng]['predictors'] = []
-        equations[ng]['constant'] = []
-        equations[ng]['coefs'] = [np.zeros((ntand), dtype='int32')]*npred
-        equations[ng]['ancil'] = {}
-
-    eq_list = []
-
-    # Begin iteration over groups
-    for ng,g in enumerate(groups):
-
-        a = np.zeros((ntand+1),dtype='float64',order='F') # regression constants
-        corr = np.zeros((ntand+1),dtype='float64',order='F') # multiple correlation coefficient
-        ess = np.zeros((ntand+1),dtype='float64',order='F') # standard error estimate
-        rdvr = np.zeros((ntand+1),dtype='float64',order='F') # coefficient of determination
-
-        # CHECK: Number of cases (neccas) for equation development.
-        if q[0][ng] <= neccas:
-            logging.info(" EQUATION DEVELOPMENT FOR GROUP " + str(ng))
-            logging.info(" STATION NAME "+ str(groups[ng]))
-            logging.info(" NOT ENOUGH SAMPLES TO CALCULATE")
-            logging.info(str(43*"*"))
-            sys.stdout.flush()
-            #continue
-        if (q[0][ng] <= 1):
-            continue
-
-        logging.info(" EQUATION DEVELOPMENT FOR GROUP "+str(ng))
-        logging.info(" STATION NAME "+str(groups[ng]))
-        print((" %6d TOTAL CASES FOR REGRESSION ANALYSIS\n" % (q[0][ng])))
+    # Init Equation
+    equation = {'stations' : group}
+    equation['predictors'] = []
+    equation['constant'] = []
+    equation['coefs'] = [np.zeros((ntand), dtype='int32')]*npred
+    equation['ancil'] = {}
+
+    a = np.zeros((ntand+1),dtype='float64',order='F') # regression constants
+    corr = np.zeros((ntand+1),dtype='float64',order='F') # multiple correlation coefficient
+    ess = np.zeros((ntand+1),dtype='float64',order='F') # standard error estimate
+    rdvr = np.zeros((ntand+1),dtype='float64',order='F') # coefficient of determination
+
+    # CHECK: Number of cases (neccas) for equation development.
+    if q_ng[0] <= neccas:
+        logging.info(" EQUATION DEVELOPMENT FOR GROUP " + str(ng))
+        logging.info(" STATION NAME "+ str(group))
+        logging.info(" NOT ENOUGH SAMPLES TO CALCULATE")
+        logging.info(str(43*"*"))
         sys.stdout.flush()
+        #continue
+    if (q_ng[0] <= 1):
+        return equation
 
-        # Initialize lp for each equation group, this assumes the ids
-        # are listed first.
-        # for n in range(1,npred+1):
-        #     lp[0,n] = n
-        #     lp[1,n] = int(ids[n-1][0])
-        #     lp[2,n] = int(ids[n-1][1])
-        #     lp[3,n] = int(ids[n-1][2])
-        #     lp[4,n] = int(ids[n-1][3])
-
-        # Make predictor list hold index associated with predictor place
-        for n in range(1, len(predictors)):
-            predictor_list[n] = n # make predictor list hold index associated with predictor place
-
-        # Put dot products into p( , ). This replicates xfer.f.
-        p = np.copy(q[2][ng,:,:])
-
-        # Compute means, covariances, standard deviations for each variable in group
-        # avg is the mean = sum of variable values divided by the sample size
-        avg = 1.0/q[0][ng] * q[1][ng,:]
-        # p is covariance after centering over means of variables
-        p -= np.outer(avg,q[1][ng,:])
-
-        # Replicate Do 425/424 loops
-        var = np.copy(np.diag(p))
-        p -= np.diag(var)
-        var = np.where(var>0, var, 0)
-        p += np.diag(var)  # ensure that diagonal elements of p are not negative
-        stddev = np.sqrt(1.0/q[0][ng] * var) # compute standard deviation
-        sig = np.copy(stddev)
-
-        # CHECK: Check variances of point and grid binary predictors against their
-        #        thresholds varnb and varngb, respectively.
-        for n in predictor_list:
-            if "BinaryGrid" in predictors[n].SOSA__usedProcedure:
-                # ADD logging...
-                if stddev[n]**2.0 < varngb:
-                    for nn in predictor_list:
-                        p[n,nn] = 0.0
-                        p[nn,n] = 0.0
-                    stddev[n] = 0.0
-                    sig[n] = 0.0
-                    var[n] = 0.0
-            elif "BinaryPoint" in predictors[n].SOSA__usedProcedure:
-                # ADD logging...
-                if stddev[n]**2.0 < varnb:
-                    for nn in predictor_list:
-                        p[n,nn] = 0.0
-                        p[nn,n] = 0.0
-                    stddev[n] = 0.0
-                    sig[n] = 0.0
-                    var[n] = 0.0
-
-        # Initially, set sig to stddev, then for predictors only, set sig
-        # to diagonal elements of p, each being the sum of squares for that variable.
-        sig[1:npred+1] = var[1:npred+1]
-
-        # Deal with binary predictands...not yet. For now, just put some data
-        # into const.
-        const[1:ntand+1] = np.copy(var[npred+1:nvrbl+1])
-        if 0 not in const[1:ntand+1]:
-            const_1[1:ntand+1] = np.reciprocal(const[1:ntand+1])
-
-        # --------------------------------------------
-        # ----- REGRESSION SCREENING BEGINS HERE -----
-        # --------------------------------------------
-
-        # IMPORTANT: The "*x" versions of regression parameters are for each equation group.
-        nstx = min(npred,nst)
-        colnx = coln
-        colnbx = colnb
-        colngbx = colngb
-
-        # The below while loop will run until a predictors reduction of
-        # variance does not exceed cutoff
-        k = 0
-        knt = 0  # number of predictors chosen
-        done = False
-        while (not done and k < nstx):
-
-            # Choose next predictor 'key' to add to the regression
-            # p[rng,rngd] is submatrix d_k of transformend P after Gaussian elimination on columns 1 to k
-            rng = list(range(k+1,npred+1)) # range of reminaing predictors in p
-            rngd = list(range(npred+1,nvrbl+1))     # predictand range in p
-            rngc = list(range(1,ntand+1))  # predictand range in const, vh
-
-            # Perform colinearity test
-            # IMPORTANT: Here we need to determine if predictor is continuous,
-            #            point binary, or grid binary and use the appropriate
-            #            colnx, colnbx, or colgbx.
-            coln_test = colnx
-            cor2 = 0.0*cor2
-            for l in rng:
-                # Use l-1, but might have to used l-ntand....maybe
-                if "BinaryGrid" in predictors[l-1].SOSA__usedProcedure:
-                    coln_test = colngbx
-                elif "BinaryPoint" in predictors[l-1].SOSA__usedProcedure:
-                    coln_test = colnbx
-                else:
-                    coln_test = colnx
-
-                if (p[l,l]>0.0 and sig[l]>0.0 and p[l,l]>coln_test*sig[l]):
-                    pll_1=1.0/p[l,l]
-                    cor2[l,rngd] = pll_1*np.multiply(p[[l],:][:,rngd],p[[l],:][:,rngd])
-
-            cor2[:,rngd] = np.multiply(cor2[:,rngd],const_1[rngc])
-
-            # find 'key' as the predictor with strongest (anti)correlation with one of the predictands
-            cor2maxl = np.amax(cor2, axis=1)
-            vht      = np.amax(cor2maxl)
-            key      = np.argmax(cor2maxl)
-
-            # This replicates Do 525.
-            vh[rngc] = np.copy(cor2[[key],:][:,rngd])
-            vh[rngc] = np.copy(cor2[key,rngd])
-
-            # This replicates Do 530. For now, it only supports testing
-            # ROV against any 1 predictand (in u600, NSNGL=1).
-            # FUTURE: Added ability to test ROV against the avg of all predictands.
-
-            if (vht>0 and key>k and key<=npred and np.any(vh[rngc] > cutoff)):
-
-                # number of operations below:
-                # number of groups * nstx (< npred) * (npred + ntand)
-                # Typical number 2 * 10^6 ~= 3000 * 15 * 44
-                # Variable  key  is the strongest (anti-)correlated predictor
-                # for some predictant
-                # among all remaining predictors [k+1:npred+1].
-                # Bring variable  key  to  the place of  k+1,
-                # which is the first of the remaining predictors.
-                # Swap columns key and k+1 of matrices p, lp;
-                # Swap rows    key and k+1 of matrix p;
-                # swap elements key and k+1 of vectors sig, avg
-                #
-                # Do 555
-
-                tmp = np.copy(p[:,k+1])
-                p[:,k+1]=p[:,key]
-                p[:,key] = tmp
-
-                # Do 560
-                tmp = np.copy(p[k+1,:])
-                p[k+1,:] = p[key,:]
-                p[key,:] = tmp
-
-                # Do 565, Predictor ID stuff.
-                #tmp5 = np.copy(lp[:,k+1])
-                #lp[:,k+1] = lp[:,key]
-                #lp[:,key] = tmp5
-                # Riley
-                try:
-                    tmp5 = np.copy(predictor_list[k+1])
-                    predictor_list[k+1] = predictor_list[key]
-                    predictor_list[key] = tmp5
-                except:
-                    pdb.set_trace()
-                # End Riley
-
-                tvh = np.copy(sig[k+1])
-                sig[k+1] = sig[key]
-                sig[key] = tvh
-
-                # IS: New, swap k+1 and key elements of avg
-                tvh = np.copy(avg[k+1])
-                avg[k+1] = avg[key]
-                avg[key] = tvh
-
-                # Gaussian elimination on column k+1 to make it the transpose of
-                # [0 .. 0 1 0....0] with 1 in the row with index k+1
-                # Do 570
-                ptmp = np.copy(p[k+1,:])
-                f=1.0/p[k+1,k+1]
-                p -= f* np.outer(p[:,k+1],ptmp)
-                # Do 575
-                p[k+1,:] = f * ptmp
-
-                # Compute regression constants using eq. (1) in documentation
-                # Do 580
-                a[rngc] = np.copy(avg[rngd])
-                # Do 585
-                # Do 584
-                a[rngc] -= np.dot(avg[1:k+2],p[1:k+2,rngd])
-
-
-                # Do 587
-                # standard error estimate
-                ess[rngc] = np.copy(np.diag(p[rngd,:][:,rngd]))
-                ess = np.where(ess>0, ess, 0)
-                ess = np.sqrt(1.0/q[0][ng]*ess)
-
-                # coefficient of determination
-                # which is proportion of variablity of predictand that can
-                # be attributed to variability in predictiors selected fo far
-                rdvr[rngc] = np.copy(sig[rngd])
-                rdvr[rngc] = np.true_divide (1.0/q[0][ng],np.multiply(rdvr[rngc],rdvr[rngc]))
-                rdvr[rngc] = 1.0- np.multiply(np.diag(p[rngd,:][:,rngd]),rdvr[rngc])
-                rdvr = np.where (rdvr>0, rdvr,0)
-
-                # multiple correlation coefficient
-                corr = np.sqrt(rdvr)
-
-                # Still inside for k; for n in ntand; vh[n] > cutoff
-                #print " VARIABLE ",lp[1:5,k+1]," SELECTED. TOTAL RV ",rdvr[rngc]
-                logging.info(" VARIABLE "+str(predictor_list[k+1])+" SELECTED. TOTAL RV "+str(rdvr[rngc]))
-
-                # increment k to continue while loop, set knt to the number of selected predictors
-                k += 1
-                knt = k
-
-            else: # vh[n] < cutoff
-
-                # If we come here, then the next selected predictor does not
-                # contribute more reduction of variance than is set by the
-                # threshold variable, cutoff.
-                # The regression screeneng while loop is finished.
-                logging.info(" NEXT SELECTED PREDICTOR DOES NOT CONTRIBUTE MORE THAN "+str(cutoff)+" REDUCTION OF VARIANCE")
-                done = True
-
-        # Outside while k...Print regression equation information
-        logging.info(" TOTAL RV BY "+str(knt)+" PREDICTORS: f "+str(rdvr[rngc]))
-        logging.info(" MULTIPLE CORRELATION COEFFICIENT: "+str(corr[rngc]))
-        logging.info(" STD ERROR ESTIMATE: "+str(ess[rngc]))
-        logging.info(" REGRESSION EQUATION")
-        logging.info(""*44+"CONSTANT "+str(a[rngc]))
-        equations[ng]['constant'] = a[rngc]
-        equations[ng]['ancil']['Equation Constant'] = a[rngc]
-        equations[ng]['ancil']['Multiple Correlation Coeeficient'] = corr[rngc]
-        equations[ng]['ancil']['Standard Error Estimate'] = ess[rngc]
-        equations[ng]['ancil']['Reduction of Variance'] = rdvr[rngc]
-        equations[ng]['ancil']['Predictand Average'] = avg[-ntand:]
-        equations[ng]['constant'] = a[rngc]
-        for k in range(1,knt+1):
-            #print k,lp[1,k],lp[2,k],lp[3,k],lp[4,k],p[k,npred+1:npred+ntand+1]
-            logging.info(str(k) + " " + str(predictor_list[k]) + " " +str(p[k,npred+1:npred+ntand+1]))
-            equations[ng]['predictors'].append(predictor_list[k])
-            equations[ng]['coefs'][predictor_list[k]-1] = p[k,npred+1:npred+ntand+1]
-#            summary[predictor_list[k]][k] += 1
-        logging.info("\n %43s\n" % (43*"*"))
-#        sys.stdout.flush()
-    for i,j in enumerate(predictors):
-        logging.info(i)
-        logging.info(j)
-#    for i in summary:
+    logging.info(" EQUATION DEVELOPMENT FOR GROUP "+str(ng))
+    logging.info(" STATION NAME "+str(group))
+    print((" %6d TOTAL CASES FOR REGRESSION ANALYSIS\n" % (q_ng[0])))
+    sys.stdout.flush()
 
-#        print i[1:]
-    return equations
+    # Initialize lp for each equation group, this assumes the ids
+    # are listed first.
+    # for n in range(1,npred+1):
+    #     lp[0,n] = n
+    #     lp[1,n] = int(ids[n-1][0])
+    #     lp[2,n] = int(ids[n-1][1])
+    #     lp[3,n] = int(ids[n-1][2])
+    #     lp[4,n] = int(ids[n-1][3])
+
+    # Make predictor list hold index associated with predictor place
+    for n in range(1, npred):
+        predictor_list[n] = n # make predictor list hold index associated with predictor place
+
+    # Put dot products into p( , ). This replicates xfer.f.
+    p = np.copy(q_ng[2])
+
+    # Compute means, covariances, standard deviations for each variable in group
+    # avg is the mean = sum of variable values divided by the sample size
+    avg = 1.0/q_ng[0] * q_ng[1]
+    # p is covariance after centering over means of variables
+    p -= np.outer(avg,q_ng[1])
+
+    # Replicate Do 425/424 loops
+    var = np.copy(np.diag(p))
+    p -= np.diag(var)
+    var = np.where(var>0, var, 0)
+    p += np.diag(var)  # ensure that diagonal elements of p are not negative
+    stddev = np.sqrt(1.0/q_ng[0] * var) # compute standard deviation
+    sig = np.copy(stddev)
+
+    # CHECK: Check variances of point and grid binary predictors against their
+    #        thresholds varnb and varngb, respectively.
+    for n in predictor_list:
+        if "BinaryGrid" in procedures[n]:
+            # ADD logging...
+            if stddev[n]**2.0 < varngb:
+                for nn in predictor_list:
+                    p[n,nn] = 0.0
+                    p[nn,n] = 0.0
+                stddev[n] = 0.0
+                sig[n] = 0.0
+                var[n] = 0.0
+        elif "BinaryPoint" in procedures[n]:
+            # ADD logging...
+            if stddev[n]**2.0 < varnb:
+                for nn in predictor_list:
+                    p[n,nn] = 0.0
+                    p[nn,n] = 0.0
+                stddev[n] = 0.0
+                sig[n] = 0.0
+                var[n] = 0.0
+
+    # Initially, set sig to stddev, then for predictors only, set sig
+    # to diagonal elements of p, each being the sum of squares for that variable.
+    sig[1:npred+1] = var[1:npred+1]
+
+    # Deal with binary predictands...not yet. For now, just put some data
+    # into const.
+    const[1:ntand+1] = np.copy(var[npred+1:nvrbl+1])
+    if 0 not in const[1:ntand+1]:
+        const_1[1:ntand+1] = np.reciprocal(const[1:ntand+1])
+
+    # --------------------------------------------
+    # ----- REGRESSION SCREENING BEGINS HERE -----
+    # --------------------------------------------
+
+    # IMPORTANT: The "*x" versions of regression parameters are for each equation group.
+    nstx = min(npred,nst)
+    colnx = coln
+    colnbx = colnb
+    colngbx = colngb
+
+    # The below while loop will run until a predictors reduction of
+    # variance does not exceed cutoff
+    k = 0
+    knt = 0  # number of predictors chosen
+    done = False
+    while (not done and k < nstx):
+
+        # Choose next predictor 'key' to add to the regression
+        # p[rng,rngd] is submatrix d_k of transformend P after Gaussian elimination on columns 1 to k
+        rng = list(range(k+1,npred+1)) # range of reminaing predictors in p
+        rngd = list(range(npred+1,nvrbl+1))     # predictand range in p
+        rngc = list(range(1,ntand+1))  # predictand range in const, vh
+
+        # Perform colinearity test
+        # IMPORTANT: Here we need to determine if predictor is continuous,
+        #            point binary, or grid binary and use the appropriate
+        #            colnx, colnbx, or colgbx.
+        coln_test = colnx
+        cor2 = 0.0*cor2
+        for l in rng:
+            # Use l-1, but might have to used l-ntand....maybe
+            if "BinaryGrid" in procedures[l-1]:
+                coln_test = colngbx
+            elif "BinaryPoint" in procedures[l-1]:
+                coln_test = colnbx
+            else:
+                coln_test = colnx
+
+            if (p[l,l]>0.0 and sig[l]>0.0 and p[l,l]>coln_test*sig[l]):
+                pll_1=1.0/p[l,l]
+                cor2[l,rngd] = pll_1*np.multiply(p[[l],:][:,rngd],p[[l],:][:,rngd])
+
+        cor2[:,rngd] = np.multiply(cor2[:,rngd],const_1[rngc])
+
+        # find 'key' as the predictor with strongest (anti)correlation with one of the predictands
+        cor2maxl = np.amax(cor2, axis=1)
+        vht      = np.amax(cor2maxl)
+        key      = np.argmax(cor2maxl)
+
+        # This replicates Do 525.
+        vh[rngc] = np.copy(cor2[[key],:][:,rngd])
+        vh[rngc] = np.copy(cor2[key,rngd])
+
+        # This replicates Do 530. For now, it only supports testing
+        # ROV against any 1 predictand (in u600, NSNGL=1).
+        # FUTURE: Added ability to test ROV against the avg of all predictands.
+
+        if (vht>0 and key>k and key<=npred and np.any(vh[rngc] > cutoff)):
+
+            # number of operations below:
+            # number of groups * nstx (< npred) * (npred + ntand)
+            # Typical number 2 * 10^6 ~= 3000 * 15 * 44
+            # Variable  key  is the strongest (anti-)correlated predictor
+            # for some predictant
+            # among all remaining predictors [k+1:npred+1].
+            # Bring variable  key  to  the place of  k+1,
+            # which is the first of the remaining predictors.
+            # Swap columns key and k+1 of matrices p, lp;
+            # Swap rows    key and k+1 of matrix p;
+            # swap elements key and k+1 of vectors sig, avg
+            #
+            # Do 555
+
+            tmp = np.copy(p[:,k+1])
+            p[:,k+1]=p[:,key]
+            p[:,key] = tmp
+
+            # Do 560
+            tmp = np.copy(p[k+1,:])
+            p[k+1,:] = p[key,:]
+            p[key,:] = tmp
+
+            # Do 565, Predictor ID stuff.
+            #tmp5 = np.copy(lp[:,k+1])
+            #lp[:,k+1] = lp[:,key]
+            #lp[:,key] = tmp5
+            # Riley
+            try:
+                tmp5 = np.copy(predictor_list[k+1])
+                predictor_list[k+1] = predictor_list[key]
+                predictor_list[key] = tmp5
+            except:
+                pdb.set_trace()
+            # End Riley
+
+            tvh = np.copy(sig[k+1])
+            sig[k+1] = sig[key]
+            sig[key] = tvh
+
+            # IS: New, swap k+1 and key elements of avg
+            tvh = np.copy(avg[k+1])
+            avg[k+1] = avg[key]
+            avg[key] = tvh
+
+            # Gaussian elimination on column k+1 to make it the transpose of
+            # [0 .. 0 1 0....0] with 1 in the row with index k+1
+            # Do 570
+            ptmp = np.copy(p[k+1,:])
+            f=1.0/p[k+1,k+1]
+            p -= f* np.outer(p[:,k+1],ptmp)
+            # Do 575
+            p[k+1,:] = f * ptmp
+
+            # Compute regression constants using eq. (1) in documentation
+            # Do 580
+            a[rngc] = np.copy(avg[rngd])
+            # Do 585
+            # Do 584
+            a[rngc] -= np.dot(avg[1:k+2],p[1:k+2,rngd])
+
+
+            # Do 587
+            # standard error estimate
+            ess[rngc] = np.copy(np.diag(p[rngd,:][:,rngd]))
+            ess = np.where(ess>0, ess, 0)
+            ess = np.sqrt(1.0/q_ng[0]*ess)
+
+            # coefficient of determination
+            # which is proportion of variablity of predictand that can
+            # be attributed to variability in predictiors selected fo far
+            rdvr[rngc] = np.copy(sig[rngd])
+            rdvr[rngc] = np.true_divide (1.0/q_ng[0],np.multiply(rdvr[rngc],rdvr[rngc]))
+            rdvr[rngc] = 1.0- np.multiply(np.diag(p[rngd,:][:,rngd]),rdvr[rngc])
+            rdvr = np.where (rdvr>0, rdvr,0)
+
+            # multiple correlation coefficient
+            corr = np.sqrt(rdvr)
+
+            # Still inside for k; for n in ntand; vh[n] > cutoff
+            #print " VARIABLE ",lp[1:5,k+1]," SELECTED. TOTAL RV ",rdvr[rngc]
+            logging.info(" VARIABLE "+str(predictor_list[k+1])+" SELECTED. TOTAL RV "+str(rdvr[rngc]))
+
+            # increment k to continue while loop, set knt to the number of selected predictors
+            k += 1
+            knt = k
+
+        else: # vh[n] < cutoff
+
+            # If we come here, then the next selected predictor does not
+            # contribute more reduction of variance than is set by the
+            # threshold variable, cutoff.
+            # The regression screeneng while loop is finished.
+            logging.info(" NEXT SELECTED PREDICTOR DOES NOT CONTRIBUTE MORE THAN "+str(cutoff)+" REDUCTION OF VARIANCE")
+            done = True
+
+    # Outside while k...Print regression equation information
+    logging.info(" TOTAL RV BY "+str(knt)+" PREDICTORS: f "+str(rdvr[rngc]))
+    logging.info(" MULTIPLE CORRELATION COEFFICIENT: "+str(corr[rngc]))
+    logging.info(" STD ERROR ESTIMATE: "+str(ess[rngc]))
+    logging.info(" REGRESSION EQUATION")
+    logging.info(""*44+"CONSTANT "+str(a[rngc]))
+    equation['constant'] = a[rngc]
+    equation['ancil']['Equation Constant'] = a[rngc]
+    equation['ancil']['Multiple Correlation Coeeficient'] = corr[rngc]
+    equation['ancil']['Standard Error Estimate'] = ess[rngc]
+    equation['ancil']['Reduction of Variance'] = rdvr[rngc]
+    equation['ancil']['Predictand Average'] = avg[-ntand:]
+    equation['constant'] = a[rngc]
+    for k in range(1,knt+1):
+        #print k,lp[1,k],lp[2,k],lp[3,k],lp[4,k],p[k,npred+1:npred+ntand+1]
+        logging.info(str(k) + " " + str(predictor_list[k]) + " " +str(p[k,npred+1:npred+ntand+1]))
+        equation['predictors'].append(predictor_list[k])
+        equation['coefs'][predictor_list[k]-1] = p[k,npred+1:npred+ntand+1]
+    logging.info("\n %43s\n" % (43*"*"))
+    return equation
 
 
 def make_consistent_dims(predictors, predictands):
@@ -503,11 +642,15 @@ def main_camps(control, predictors, predictands):
     """
     all_vars = predictors+predictands
     stations = make_consistent_dims(predictors, predictands)
-    aaa = get_aaa(stations, all_vars)
-    aaa = np.ma.masked_greater_equal(aaa,9999)
-    # Get Station groups
-    groups = [[x] for x in stations]
-    num_dates = aaa.shape[2]
-    q = xprod(control.regression_parameters, aaa, num_dates, stations, groups, len(all_vars))
-    equations = regress(groups,predictors,predictands,aaa,q,control.regression_parameters)
+    num_processors = min(getattr(control, 'num_processors', 1), cpu_count())
+    # The cube is placed in shared memory when workers will read from it
+    aaa = get_aaa(stations, all_vars, shared=num_processors > 1)
+    try:
+        # Get Station groups
+        groups = [[x] for x in stations]
+        num_dates = aaa.shape[2]
+        q = xprod(control.regression_parameters, aaa, num_dates, stations, groups, len(all_vars), num_processors)
+        equations = regress(groups,predictors,predictands,aaa.array,q,control.regression_parameters,num_processors)
+    finally:
+        aaa.close()
     return equations
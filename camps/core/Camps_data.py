@@ -9,6 +9,9 @@ from netCDF4 import Dataset
 
 from .nc_writable import nc_writable
 from .Process import Process
+from .write_session import WriteSession
+from .lazy_array import LazyArray
+from .template_dict import TemplateDict, freeze
 from . import Time
 from ..registry import util as cfg
 from ..registry import constants as const
@@ -18,6 +21,8 @@ from ..registry import constants as const
 """Module: Camps_data.py
 
 Methods:
+    get_metadata_templates
+    slot_names
 
 Classes:
     Camps_data
@@ -40,6 +45,11 @@ Classes:
             get_phenom_time
             get_time
             add_process
+            data
+            get_lazy_data
+            is_lazy
+            read_data
+            slice_data
             add_data
             get_data_type
             get_dimensions
@@ -86,6 +96,8 @@ Classes:
             __add__
             add_times
             __getattr__
+            __copy__
+            __deepcopy__
             __str__
 """
 
@@ -94,6 +106,54 @@ FILL_VALUE = 9999
 MISSING_VALUE = 9999
 coord_str = 'coordinates'
 meta = cfg.read_variables()
+# Frozen metadata and properties templates of each name in netcdf.yaml,
+# shared by the Camps_data objects of that name.
+metadata_templates = {}
+
+
+def get_metadata_templates(name):
+    """Returns the frozen metadata and properties templates of the variable
+    name in netcdf.yaml, or None if it is not there. They are made once per
+    name and shared by every Camps_data object of that name.
+    """
+
+    try:
+        return metadata_templates[name]
+    except KeyError:
+        pass
+    if name not in meta:
+        return None
+    meta_dict = {}
+    info_dict = copy.copy(meta[name])
+    prop_dict = {k:v for k,v in info_dict.items() if k!='attribute' and k!='dimensions' and k!='data_type'}
+    meta_dict['name'] = name
+    if 'attribute' in info_dict.keys():
+        attr = info_dict.pop('attribute')
+        for k,v in attr.items():
+            if v:
+                meta_dict[k] = v
+    metadata_templates[name] = (freeze(meta_dict), freeze(prop_dict))
+    return metadata_templates[name]
+
+
+# Slot names of each subclass of Camps_data, including those of its bases.
+class_slots = {}
+
+
+def slot_names(cls):
+    """Returns the names of the slots of the class cls and its bases."""
+
+    try:
+        return class_slots[cls]
+    except KeyError:
+        pass
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    class_slots[cls] = tuple(names)
+    return class_slots[cls]
+
 
 class Camps_data(nc_writable):
     """Camps data object for storing data and metadata describing the variable.
@@ -109,10 +169,17 @@ class Camps_data(nc_writable):
                 that may be used internally.
         location (:obj:Location) Location object which describes the first dimensions.
 
+    The metadata and properties of objects made from netcdf.yaml are
+    TemplateDicts sharing the template of their name until modified, and
+    processes added by name are interned, so objects are cheap to create
+    and to copy.
+
     Note:
         Time objects must have a dimensionality that's compatible with 'data'.
     """
 
+    __slots__ = ('name', '_data', 'dimensions', 'processes', 'preprocesses', 'metadata',
+                 'time', 'properties', 'components', 'location')
 
     def __init__(self, name, autofill=True):
         """Initializes object properties and adds metadata from netcdf.yaml
@@ -333,7 +400,7 @@ class Camps_data(nc_writable):
         """Adds a Process object to the Processes list or creates one if given a str."""
 
         if process.__class__ is not Process and type(process) is str:
-            process = Process(process)
+            process = Process.intern(process)
 
         self.processes.append(process)
 
@@ -342,7 +409,7 @@ class Camps_data(nc_writable):
         """Adds a Process object to the Preprocesses list or creates one if given a str."""
 
         if process.__class__ is not Process and type(process) is str:
-            process = Process(process)
+            process = Process.intern(process)
 
         self.preprocesses.append(process)
 
@@ -381,6 +448,57 @@ class Camps_data(nc_writable):
         self.components.append(c_obj)
 
 
+    @property
+    def data(self):
+        """The variable data. Data read lazily from a netCDF4 file is read
+        on first access.
+        """
+
+        data = self._data
+        if isinstance(data, LazyArray):
+            data = data.read()
+            self._data = data
+        return data
+
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+
+    def get_lazy_data(self):
+        """Returns the data without reading it: a LazyArray if it has not
+        been read from its file yet, else the array.
+        """
+
+        return self._data
+
+
+    def is_lazy(self):
+        """Returns True if the data has not been read from its file yet."""
+
+        return isinstance(self._data, LazyArray) and not self._data.is_read()
+
+
+    def read_data(self):
+        """Reads the data from its file if it has not been read yet."""
+
+        if isinstance(self._data, LazyArray):
+            self._data = self._data.read()
+
+
+    def slice_data(self, key):
+        """Indexes the data with key. If the data has not been read yet and
+        key indexes each dimension independently, the index is only recorded,
+        so just the selected part is read from the file later.
+        """
+
+        if self.is_lazy():
+            self._data = self._data[key]
+        else:
+            self.data = self.data[key]
+
+
     def add_data(self, data):
         """Given a numpy array with the correct dimensions,
         sets it to objects 'data' instance variable.
@@ -495,22 +613,13 @@ class Camps_data(nc_writable):
         """ Reads the variable's metadata from netcdf.yaml and inserts it into
         the variable's camps data object."""
 
-        meta_dict = {}
-        try:
-            info_dict = copy.copy(meta[self.name])
-        except KeyError:
+        templates = get_metadata_templates(self.name)
+        if templates is None:
             logging.warning("'" + self.name + "' not found in netcdf.yaml")
-            self.metadata = meta_dict
+            self.metadata = {}
             return
-        prop_dict = {k:v for k,v in info_dict.items() if k!='attribute' and k!='dimensions' and k!='data_type'} 
-        meta_dict['name'] = self.name
-        if 'attribute' in info_dict.keys():
-            attr = info_dict.pop('attribute')
-            for k,v in attr.items():
-                if v:
-                    meta_dict[k] = v
-        self.properties = prop_dict
-        self.metadata = meta_dict
+        self.metadata = TemplateDict(templates[0])
+        self.properties = TemplateDict(templates[1])
 
     def add_metadata(self, key, value):
         """Adds an entry into the metadata."""
@@ -888,9 +997,17 @@ class Camps_data(nc_writable):
         nc_handle.createDimension(dimension_name, dim_length)
 
 
-    def write_to_nc(self, nc_handle, write_components=False):
+    def write_to_nc(self, nc_handle, write_components=False, profile=None, session=None):
         """Writes a variable into a netCDF file, including its data and metadata.
         Returns variable name.
+
+        profile is the I/O profile, see writer.get_io_profile, that sets the
+        chunking and compression of the variable. If None, data is chunked by
+        get_chunk_size and compressed with zlib level 4.
+
+        session is the WriteSession of nc_handle that indexes the variables
+        already written, shared by the variables written into one file. If None,
+        a session is started for this variable.
         """
 
         #Add the vertical dimension to the variable
@@ -925,7 +1042,7 @@ class Camps_data(nc_writable):
         if write_components:
             comp_names = []
             for c in self.components: #add components of variable
-                comp_name = c.write_to_nc(nc_handle, write_components)
+                comp_name = c.write_to_nc(nc_handle, write_components, profile, session)
                 comp_names.append(comp_name)
             if len(comp_names) > 0:
                 self.metadata.update({'PROV__wasDerivedFrom' : '( ' + ' '.join(comp_names) + ' )'})
@@ -938,7 +1055,7 @@ class Camps_data(nc_writable):
         # Create the netCDF variable.
         fill_value = self.get_fill_value()
         missing_value = self.get_missing_value()
-        chunksize = self.get_chunk_size()
+        chunksize = self.get_chunk_size(profile)
 
         if self.data is None:
             dtype = int
@@ -960,69 +1077,44 @@ class Camps_data(nc_writable):
         #Determine if variable has not already been written into the netCDF file.
         #NOTE: I tried to have this portion at the beginning of the function in order to
         #avoid doing the above code, but I get an error.
-        #Get the basename of the variable and collect names of variables already written
-        #into the netCDF file with the same basename.
-        variable_name = self.get_variable_name()
-        var_names = []
-        var_name = variable_name
-        number = 0
-        while var_name in list(nc_handle.variables.keys()):
-            var_names.append(var_name)
-            number += 1
-            var_name = variable_name + str(number)
-        variable_name = var_name
-
-        #Determine if the variable is a primary variable or a component.
-        #Select from the existing netCDF variables those of the same type.
+        #Get the basename of the variable and the name it would be written as, after
+        #the variables already written into the netCDF file with the same basename.
+        if session is None:
+            session = WriteSession(nc_handle)
+        basename = self.get_variable_name()
+        variable_name = session.next_name(basename)
+
+        #Determine if the variable is identical in substance to a netCDF variable of the
+        #same basename and type, primary or component: the same observed property, names,
+        #units, model cycle time and leadtime, sizes of x, y, and level, and names and
+        #order of ancillary variables.  If so, return the name of the identical variable.
         is_primary = 'stations' in self.dimensions
-        v_names = []
-        if is_primary:
-            for v_name in var_names:
-                if 'stations' in nc_handle.variables[v_name].dimensions:
-                    v_names.append(v_name)
+        metadata = self.metadata
+        if self.is_feature_of_interest():
+            metadata = {k : v for k,v in self.metadata.items() if k != 'SOSA__observedProperty'}
+            key = session.metadata_key(metadata, None, is_primary)
         else:
-            for v_name in var_names:
-                if 'stations' not in nc_handle.variables[v_name].dimensions:
-                    v_names.append(v_name)
-
-        #Determine if the variable is identical in substance to one of the collection of
-        #existing netCDF variables.  If so, return the name of the identical netCDF variable.
-        for v_name in v_names:
-            match = True
-            #
-            for attr in ['SOSA__observedProperty', 'standard_name', 'long_name', 'units', 'coordinates', \
-                'filepath', 'smooth']:
-                try:
-                    if self.metadata[attr] != nc_handle.variables[v_name].getncattr(attr)[:]:
-                        match = False
-                        break
-                except:
-                    pass
-            if match: #values of model cycle time and leadtime, and sizes of x, y, and level.
-                for attr in ['FcstTime_hour', 'x', 'y', 'level', 'leadtime']:
-                    try:
-                        if self.metadata[attr] != nc_handle.variables[v_name].getncattr(attr):
-                            match = False
-                            break
-                    except:
-                        pass
-            if match: #names and order of ancillary variables, including white space.
-                if ancillary_variables != nc_handle.variables[v_name].getncattr('ancillary_variables'):
-                    match = False
-                    break
-            if match:
-                return v_name
+            key = session.metadata_key(metadata, ancillary_variables, is_primary)
+        v_name = session.find(basename, key)
+        if v_name is not None:
+            return v_name
 
         #Write the variable into the netCDF file.
         logging.info("Writing " + variable_name + " into the netCDF file.")
+        if profile is None:
+            profile = {}
+        least_significant_digit = profile.get('least_significant_digit')
+        if np.dtype(dtype).kind != 'f':
+            least_significant_digit = None
         nc_var = nc_handle.createVariable(
             variable_name,
             dtype,
             tuple(self.dimensions),
             chunksizes=chunksize,
-            zlib=True,
-            complevel=4,
-            shuffle=False,
+            zlib=profile.get('zlib', True),
+            complevel=profile.get('complevel', 4),
+            shuffle=profile.get('shuffle', False),
+            least_significant_digit=least_significant_digit,
             fill_value=fill_value)
 
         #Add the metadata
@@ -1046,18 +1138,39 @@ class Camps_data(nc_writable):
 
         #add variable's data
         self.add_nc_data(nc_var)
+        session.add(basename, variable_name, nc_var)
 
         #Return the variable name written into the netCDF file
         return variable_name
 
 
 
-    def get_chunk_size(self):
-        """Return an appropriate chunk size tuple given internal data."""
+    def get_chunk_size(self, profile=None):
+        """Return an appropriate chunk size tuple given internal data.
+
+        Args:
+            profile (dict): I/O profile, see writer.get_io_profile. If it sets
+                chunk_bytes, chunks are sized to about chunk_bytes, giving the
+                dimensions in its chunk_priority their full length in order.
+                Other dimensions have a chunk length of 1.
+        """
 
         if self.data is None:
             return None
 
+        if profile is not None and profile.get('chunk_bytes') and len(self.dimensions) > 0:
+            shape = [max(int(n), 1) for n in self.data.shape]
+            chunksizes = [1] * len(shape)
+            budget = max(int(profile['chunk_bytes']) // self.data.dtype.itemsize, 1)
+            order = []
+            for p in profile.get('chunk_priority') or []:
+                order += [n for n,d in enumerate(self.dimensions)
+                          if d.rstrip('0123456789') == p and n not in order]
+            for n in order:
+                chunksizes[n] = int(min(shape[n], max(budget, 1)))
+                budget = budget // chunksizes[n]
+            return tuple(chunksizes)
+
         if len(self.dimensions) > 0:
             chunksizes = []
             for n,d in enumerate(self.dimensions):
@@ -1351,16 +1464,41 @@ class Camps_data(nc_writable):
 
     def __getattr__(self, name):
         """Returns metadata using '.' operator"""
-        if name in self.metadata:
-            return self.metadata[name]
+        # Bypass __getattr__ so an object being unpickled, before its
+        # metadata is restored, does not recurse.
+        try:
+            metadata = object.__getattribute__(self, 'metadata')
+        except AttributeError:
+            raise AttributeError(name)
+        if name in metadata:
+            return metadata[name]
         else:
-            raise AttributeError
+            raise AttributeError(name)
 
     def __copy__(self):
         """Creates a copy of the object"""
         cls = self.__class__
         result = cls.__new__(cls)
-        result.__dict__.update(self.__dict__)
+        for slot in slot_names(cls):
+            try:
+                setattr(result, slot, getattr(self, slot))
+            except AttributeError:
+                pass
+        return result
+
+    def __deepcopy__(self, memo):
+        """Creates a deep copy of the object. Metadata templates and interned
+        processes are shared rather than copied.
+        """
+        cls = self.__class__
+        result = cls.__new__(cls)
+        memo[id(self)] = result
+        for slot in slot_names(cls):
+            try:
+                value = getattr(self, slot)
+            except AttributeError:
+                continue
+            setattr(result, slot, copy.deepcopy(value, memo))
         return result
 
 
@@ -1,6 +1,9 @@
 import os
 import sys
 import re
+import copy
+import numpy as np
+from types import MappingProxyType
 from netCDF4 import Dataset
 from .nc_writable import nc_writable
 import pdb
@@ -9,12 +12,20 @@ from ..registry import util as cfg
 class Process(nc_writable):
     """Class holding process chain information for CAMPS data
 
+    Processes made with Process.intern are shared by every Camps_data
+    object that uses them, and are read-only; with_attributes returns the
+    interned Process with changed attributes.
+
     Attributes:
         name (str): Name of the variable.
         process_step (str): URL to description of the process.
         attributes (dict): Additional attributes to add to the variable.
     """
 
+    __slots__ = ('name', 'process_step', 'attributes', 'interned')
+
+    # Interned Processes by name, process step and attributes.
+    _interned = {}
 
     def __init__(self, name, process_step=None, **attributes):
         """Initializes the Process object. It requires process_step,
@@ -22,6 +33,7 @@ class Process(nc_writable):
         """
 
         self.name = name
+        self.interned = False
 
         self.process_step = process_step
         # Check the configuratin file for the process metadata if process step not provided
@@ -32,6 +44,86 @@ class Process(nc_writable):
         self.attributes = attributes
 
 
+    @classmethod
+    def intern(cls, name, process_step=None, attributes=None):
+        """Returns the shared, read-only Process with name, process_step and
+        attributes, creating it the first time it is requested. Without a
+        process_step, the process step and attributes are those of name in
+        procedures.yaml.
+
+        A Process with attributes that cannot be compared by value is not
+        interned; a new, modifiable Process is returned instead.
+        """
+
+        try:
+            if not attributes:
+                attributes = {}
+                key = (name, process_step, ())
+            else:
+                key = (name, process_step, tuple(sorted((k, type(v).__name__, attribute_key(v))
+                                                        for k,v in attributes.items())))
+            return cls._interned[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return cls.from_attributes(name, process_step, attributes)
+
+        if process_step is None:
+            process = cls(name)
+        else:
+            process = cls.from_attributes(name, process_step, attributes)
+        process.attributes = MappingProxyType(process.attributes)
+        process.interned = True
+        cls._interned[key] = process
+        return process
+
+
+    @classmethod
+    def from_attributes(cls, name, process_step, attributes):
+        """Returns a new Process with a copy of the attributes dict, which
+        may itself hold a 'process_step' entry, as those of procedures.yaml do.
+        """
+
+        process = cls.__new__(cls)
+        process.name = name
+        process.process_step = process_step
+        process.attributes = dict(attributes)
+        process.interned = False
+        return process
+
+
+    def with_attributes(self, **attributes):
+        """Returns the interned Process with the attributes of this one,
+        added to or changed by attributes, as add_attribute would.
+        """
+
+        merged = dict(self.attributes)
+        process_step = attributes.pop('process_step', self.process_step)
+        merged.update(attributes)
+        return Process.intern(self.name, process_step, merged)
+
+
+    def __copy__(self):
+        if self.interned:
+            return self
+        return Process.from_attributes(self.name, self.process_step, self.attributes)
+
+
+    def __deepcopy__(self, memo):
+        """Interned Processes are read-only, so they are shared by copies."""
+
+        if self.interned:
+            return self
+        return Process.from_attributes(self.name, copy.deepcopy(self.process_step, memo),
+                                       copy.deepcopy(self.attributes, memo))
+
+
+    def __reduce__(self):
+        if self.interned:
+            return (Process.intern, (self.name, self.process_step, dict(self.attributes)))
+        return (Process.from_attributes, (self.name, self.process_step, self.attributes))
+
+
     def write_to_nc(self, nc_handle):
         """Writes the netCDF variable representation of the Process
         to the nc_handle.
@@ -131,6 +223,8 @@ class Process(nc_writable):
             None
         """
 
+        if self.interned:
+            raise TypeError("Process " + self.name + " is interned and shared; use with_attributes")
         if key == "process_step":
             self.process_step = value
         #elif key == "source":
@@ -150,3 +244,22 @@ class Process(nc_writable):
         """
 
         return self.attributes[key]
+
+
+def attribute_key(value):
+    """Returns a hashable key of a Process attribute value that is equal
+    for equal values.
+
+    Raises:
+        TypeError: If the value cannot be compared by value.
+    """
+
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    arr = np.asarray(value)
+    if arr.dtype.kind == 'O':
+        raise TypeError("unhashable attribute value")
+    return (arr.dtype.str, arr.shape, arr.tobytes())
@@ -21,6 +21,10 @@ Methods
     str_to_datetime
     epoch_to_datetime
     epoch_time
+    str_to_datetime64
+    datetime64_to_str
+    epoch_seconds
+    epoch_to_datetime64
     num_timesteps
     get_time_dim_name
     get_lead_dim_name
@@ -202,6 +206,95 @@ def epoch_time(time):
     return int(seconds_since_epoch)
 
 
+def _epoch_offset():
+    """Returns the seconds added by epoch_time to the seconds since
+    1970-01-01 00:00, which is nonzero when the local timezone is not UTC.
+    """
+
+    if "UTC" in tzname[0]:
+        return 0
+    return int((datetime.utcfromtimestamp(0) - datetime.fromtimestamp(0)).total_seconds())
+
+
+def str_to_datetime64(times):
+    """Convert an array of times in form YYYYMM[DD[HH[MM]]] to a
+    numpy datetime64[s] array of the same shape, as str_to_datetime
+    does for a single time. Missing days default to 1 and missing
+    hours and minutes to 0.
+    """
+
+    times = np.asarray(times)
+    shape = times.shape
+    if times.dtype.kind not in ('U', 'S'):
+        times = times.astype(str)
+
+    # Parse the digits of every string at once as fixed-width bytes.
+    # A field is parsed from the digits the string covers, so a field cut
+    # short by the end of the string reads as in str_to_datetime, and a
+    # field the string does not reach takes its default.
+    chars = np.char.ljust(times.astype('S12').reshape(-1), 12, b'0')
+    digits = np.frombuffer(chars.tobytes(), dtype=np.uint8).reshape(-1, 12).astype(np.int64) - ord('0')
+    lengths = np.char.str_len(times.reshape(-1))
+    def field(start, end, default=0):
+        covered = np.clip(lengths - start, 0, end - start)[:, None]
+        k = np.arange(end - start)
+        scale = np.where(k < covered, 10 ** np.maximum(covered - 1 - k, 0), 0)
+        return np.where(covered[:, 0] > 0, (digits[:, start:end] * scale).sum(axis=1), default)
+    year = field(0, 4)
+    month = field(4, 6)
+    day = field(6, 8, default=1)
+    hour = field(8, 10)
+    minute = field(10, 12)
+
+    months = (year - 1970) * 12 + (month - 1)
+    days = months.astype('datetime64[M]').astype('datetime64[D]') + (day - 1)
+    seconds = days.astype('datetime64[s]') + (hour * ONE_HOUR + minute * ONE_MINUTE)
+
+    return seconds.reshape(shape)
+
+
+def datetime64_to_str(times, minutes=False):
+    """Convert an array of datetime64 times to an array of strings in
+    form YYYYMMDDHH, or YYYYMMDDHHMM if minutes is True.
+    """
+
+    times = np.asarray(times, dtype='datetime64[m]')
+    year = times.astype('datetime64[Y]').astype(np.int64) + 1970
+    month = times.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    day = (times.astype('datetime64[D]') - times.astype('datetime64[M]')).astype(np.int64) + 1
+    hour = (times - times.astype('datetime64[D]')).astype(np.int64) // 60
+    stamp = ((year * 100 + month) * 100 + day) * 100 + hour
+    if minutes:
+        stamp = stamp * 100 + times.astype(np.int64) % 60
+
+    return stamp.astype(str)
+
+
+def epoch_seconds(times):
+    """Return an array of times as int64 seconds since the epoch,
+    consistent with epoch_time, where times is an array of strings in
+    form YYYYMMDD[HH[MM]], datetimes, or datetime64s.
+    """
+
+    times = np.asarray(times)
+    if times.dtype.kind in ('U', 'S'):
+        times = str_to_datetime64(times)
+    else:
+        times = times.astype('datetime64[s]')
+
+    return times.astype(np.int64) + _epoch_offset()
+
+
+def epoch_to_datetime64(seconds):
+    """Converts an array of epoch times in seconds to datetime64[s],
+    the inverse of epoch_seconds.
+    """
+
+    seconds = np.asarray(seconds, dtype=np.int64) - _epoch_offset()
+
+    return seconds.astype('datetime64[s]')
+
+
 def num_timesteps(start_time, end_time, stride=timedelta(hours=1)):
     """Calculates the number of timesteps between a start and
     end time with a stride of type timedelta.  Default value of stride is 1 hour.
@@ -274,22 +367,21 @@ class Time(nc_writable):
         elif type(end_date) == int:
             end_date = epoch_to_datetime(end_date)
 
-        #Convert stride to timedelta format
+        #Convert stride to seconds
         if type(stride) == str:
-            stride = int(str)
-        elif type(stride) is not timedelta:
-            stride = timedelta(seconds=stride)
+            stride = int(stride)
+        elif type(stride) is timedelta:
+            stride = stride.total_seconds()
+        stride = int(stride)
 
         #Fill time data array with values resulting
         #from stepping from start time to end time
-        #with a specified stride.
-        temp = []
-        cur_date = start_date
-        while 1:
-            temp.append(epoch_time(cur_date))
-            cur_date += stride
-            if cur_date > end_date: break
-        self.data = np.asarray(temp,dtype=np.int64)
+        #with a specified stride. The start time is
+        #always included.
+        start = epoch_time(start_date)
+        end = epoch_time(end_date)
+        num_steps = max(end - start, 0) // stride + 1
+        self.data = start + stride * np.arange(num_steps, dtype=np.int64)
 
 
     def get_fill_value(self):
@@ -635,12 +727,12 @@ class PhenomenonTimePeriod(Time):
                 # Create an empty 2-D array of length (data_len,2)
                 new_time = np.full((data_len,2), FILL_VALUE, int)
 
-                # Loop through your array. Initialize i is needed here incase the for
-                # loop does not trigger because of a singular date (i.e. no range).
-                i = 0
-                for i in range(offset,(data_len-period)+1,period):
-                    new_time[i][0] = self.data[i]-(period*ONE_HOUR) # Beginning of time period
-                    new_time[i][1] = self.data[i]                   # Ending of time period
+                # Fill every period'th time. i is the last filled index, or 0
+                # if there are none because of a singular date (i.e. no range).
+                ends = np.arange(offset,(data_len-period)+1,period)
+                new_time[ends,0] = self.data[ends]-(period*ONE_HOUR) # Beginning of time period
+                new_time[ends,1] = self.data[ends]                   # Ending of time period
+                i = ends[-1] if len(ends) > 0 else 0
                 self.diff = new_time[i][1] - new_time[i][0] #diff is period in seconds, and
                 self.duration = int(self.diff/3600)              #duration is periond in hours.
 
@@ -5,9 +5,12 @@ import pygrib
 import pyproj
 import pdb
 import re
+import glob
 import logging
 import numpy as np
 import time
+from collections import deque
+from multiprocessing import Pool, shared_memory
 
 from ....core import Camps_data
 from ....core import writer
@@ -18,10 +21,24 @@ from ....registry import util as yamlutil
 
 Methods:
     convert_grib2
+    convert_grib2_streaming
+    get_grid_metadata
+    create_grid_variables
+    create_variable
+    get_input_files
+    build_inventory
+    message_offsets
+    read_message
+    grib2_inventory
+    decode_message
     get_projection_data
     get_forecast_hash
     get_levelless_forecast_hash
     sort_by_lead_time
+
+Classes:
+    StreamedGribVariable
+    GribDecoder
 """
 
 
@@ -33,8 +50,13 @@ def convert_grib2(control):
     to netCDF.
     """
 
+    files = get_input_files(control['input'])
+    if getattr(control, 'streaming', False) or (getattr(control, 'num_processors', None) or 1) > 1 \
+            or len(files) > 1:
+        return convert_grib2_streaming(control)
+
     #Grab some information from control file
-    filename = control['input']
+    filename = files[0]
     output = control['output']
 
     #Open the grib file
@@ -76,45 +98,7 @@ def convert_grib2(control):
     fcst_time = run_time
 
     # Grid information -- Construct metadata dictionary
-    grid_meta_dict = {}
-    if tmp_grb.gridType == "lambert":
-        isProjected = True
-        dx = tmp_grb.Dx/1000.0
-        dy = tmp_grb.Dy/1000.0
-        grid_meta_dict['SOSA__observedProperty'] = 'projection'
-        grid_meta_dict['grid_mapping_name'] = "lambert_conformal_conic" # CF-conventions name
-        grid_meta_dict['standard_parallel'] = tmp_grb.LaDInDegrees
-        grid_meta_dict['longitude_of_central_meridian'] = tmp_grb.LoVInDegrees
-        grid_meta_dict['latitude_of_projection_origin'] = tmp_grb.LaDInDegrees
-    elif tmp_grb.gridType == "mercator":
-        isProjected = True
-        dx = tmp_grb.Di/1000.0
-        dy = tmp_grb.Dj/1000.0
-        grid_meta_dict['SOSA__observedProperty'] = 'projection'
-        grid_meta_dict['grid_mapping_name'] = "mercator" # CF-conventions name
-        grid_meta_dict['standard_parallel'] = tmp_grb.LaDInDegrees
-        grid_meta_dict['longitude_of_projection_origin'] = tmp_grb.projparams['lon_0']
-        grid_meta_dict['scale_factor_at_projection_origin'] = 1
-    elif tmp_grb.gridType == "polar_stereographic":
-        isProjected = True
-        dx = tmp_grb.Dx/1000.0
-        dy = tmp_grb.Dy/1000.0
-        grid_meta_dict['SOSA__observedProperty'] = 'projection'
-        grid_meta_dict['grid_mapping_name'] = "polar_stereographic" # CF-conventions name
-        grid_meta_dict['straight_vertical_longitude_from_pole'] = tmp_grb.orientationOfTheGridInDegrees
-        grid_meta_dict['latitude_of_projection_origin'] = 90.0
-        grid_meta_dict['standard_parallel'] = tmp_grb.LaDInDegrees
-        grid_meta_dict['scale_factor_at_projection_origin'] = 1
-    elif tmp_grb.gridType == "regular_ll":
-        isProjected = False
-        grid_meta_dict['SOSA__observedProperty'] = 'projection'
-        grid_meta_dict['grid_mapping_name'] = "latitude_longitude" # CF-conventions name
-
-
-    # Get the projection x, y data in meters
-    if isProjected:
-        projstring,x_proj_data,y_proj_data = get_projection_data(tmp_grb)
-        grid_meta_dict['PROJ_string'] = projstring
+    grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data = get_grid_metadata(tmp_grb)
 
     #---------------------------------------------------------------------------
     # Loop through each forecast hour
@@ -232,118 +216,372 @@ def convert_grib2(control):
     # Format and Write values to NetCDF file
     #---------------------------------------------------------------------------
 
-    #Get standard dimension names
-    dimensions = yamlutil.read_dimensions()
-    lat = dimensions['lat']
-    lon = dimensions['lon']
-    lead_time_dim = dimensions['lead_time']
-    nctime = dimensions['time']
-    x_proj = dimensions['x_proj']
-    y_proj = dimensions['y_proj']
-
     #Iterate over the dictionaries of grb variable information and create
     #objects for each. Stacking and formatting data where necessary.
     for name, grb_dict in data_dict.items():
         example_grb = grb_dict['example_grb']
 
         #Get a generic name for the variable to instantiate the object
-        name = get_levelless_forecast_hash(example_grb)
-        logging.info(name)
-
-        #Create object for variable
-        obj = Camps_data(name)
-
-        #Check to see if variable is in netcdf.yaml file
-        if len(obj.metadata) == 0: #if not in netcdf.yaml we cannot write -- skip variable
-            logging.warning('variable %s not in netcdf.yaml, not writing to file'%(name))
-            continue
+        info = {
+            'name' : get_levelless_forecast_hash(example_grb),
+            'level' : grb_dict['level'],
+            'level_units' : grb_dict['level_units'],
+            'units' : grb_dict['units'],
+            'period' : grb_dict['period'],
+            'step_range' : example_grb.endStep - example_grb.startStep,
+            }
+        logging.info(info['name'])
 
         # Stack data by lead time
         stacked = grb_dict['data']
         stacked = np.array(stacked)
         stacked = np.moveaxis(stacked,[0,1,2,3],[-3,-2,-1,-4])
 
-        #Convert lead_time to an array in seconds
-        lead_time = grb_dict['lead_time']
-        lead_time = np.array([x * Time.ONE_HOUR for x in lead_time])
+        obj = create_variable(control, info, stacked, grb_dict['lead_time'], grb_dict['valid_time'],
+                              grb_dict['dtype'], fcst_time, grid_meta_dict, full_start, full_end)
+        if obj is not None:
+            all_objs.append(obj)
 
-        #Stack the valid_time array -- will be 2D
-        valid_time = np.vstack(grb_dict['valid_time'])
+    all_objs += create_grid_variables(tmp_grb, grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data)
 
-        #Loop over valid time array and convert to epoch_time
-        for i, arr in enumerate(valid_time):
-            for j, val in enumerate(arr):
-                valid_time[i, j] = Time.epoch_time(val)
-        valid_time = valid_time.astype(int)
+    writer.write(all_objs, output, profile=getattr(control, 'io_profile', None))
 
-        #Add source information from control file
-        if control.source:
-            obj.add_source(control.source)
-        #Add processes to object based on the control file settings
-        if control.preprocesses: [ obj.add_preprocess(p) for p in control.preprocesses ]
 
-        #Adding forecast model cycle time to object
-        obj.add_fcstTime(fcst_time)
+def convert_grib2_streaming(control):
+    """Converts grib2 file messages into a netCDF file one field at a time.
 
-        #Set dimensions of variable data in object
-        obj.dimensions = [nctime, lead_time_dim, y_proj, x_proj]
+    A lightweight inventory of the messages (byte offsets and keys) is built
+    first. The netCDF variables are then created from it, each message is
+    decoded when its [time, lead] hyperslab is written, and the decoded
+    field is released right after. Peak memory is bounded by a single field
+    rather than every field of the file.
 
-        # Add "grid_mapping" attribute. NOTE: The attribute value must be the variable
-        # name of the grid mapping variable.
-        obj.add_metadata('grid_mapping', grid_meta_dict['grid_mapping_name']+'_grid')
+    The input may also be a list of files or glob patterns, for example one
+    file per model cycle over a season. The messages of every file are
+    placed by their valid time into the same [time, lead] variables of one
+    netCDF file, so a season is converted in a single pass. All files must
+    share a grid, and only cycles at the hour of the first message are kept.
+    """
 
-        #Add Vertical coordinate(s)
-        vert_coords = grb_dict['level']
-        vert_units = grb_dict['level_units']
-        if 'Pa' in vert_units:
-            vert_type = 'plev'
-        else:
-            vert_type = 'elev'
-        obj.add_vert_coord(vert_coords[0], vert_type=vert_type)
+    #Grab some information from control file
+    files = get_input_files(control['input'])
+    output = control['output']
+    num_processors = getattr(control, 'num_processors', None) or 1
 
-        #Add units
-        obj.metadata['units'] = grb_dict['units']
+    logging.info("Building inventory of " + str(len(files)) + " grib files")
+    start = time.time()
+    inventory = build_inventory(files, num_processors)
+    logging.info("Inventory of " + str(len(inventory)) + " messages built in " + str(time.time()-start) + " seconds.")
+    if len(inventory) == 0:
+        raise ValueError("No grib2 messages found in " + str(control['input']))
 
-        #Add period info
-        if grb_dict['period'] > 0:
-            obj.metadata['hours'] = grb_dict['period']
+    # Save temporary grb to easily access common information
+    tmp_grb = read_message(inventory[0]['file'], inventory[0])
 
-        #Add data to object
-        dtype = grb_dict['dtype'] #set data type
-        try:
-            obj.add_data(stacked)
-            obj.change_data_type(dtype)
-            all_objs.append(obj) #append the variable object to list of objects
-        except:
-            logging.warning('not an numpy array')
-
-        #Add PhenomenonTime or PhenomenonTimePeriod
-        period = (example_grb.endStep - example_grb.startStep)*Time.ONE_HOUR
-        if period > 0:
-            phenom_timePd = valid_time-period
-            phenom_timePd = np.dstack((phenom_timePd,valid_time))
-            ptime = Time.PhenomenonTimePeriod(data=phenom_timePd)
-        else:
-            ptime = Time.PhenomenonTime(data=valid_time)
-        obj.time.append(ptime)
+    for entry in inventory:
+        if entry['grid'] != inventory[0]['grid']:
+            raise ValueError("Grid of " + entry['file'] + " does not match grid of " + inventory[0]['file'])
+    cycle = [entry for entry in inventory if entry['hour'] == tmp_grb.hour]
+    if len(cycle) < len(inventory):
+        logging.warning("Skipping " + str(len(inventory)-len(cycle)) + " messages not from the "
+                        + str(tmp_grb.hour).zfill(2) + "Z cycle")
+    inventory = cycle
+
+    # Time information
+    run_time = tmp_grb.hour
+
+    #############################################################################
+    # Set up time array
+    rstart = control['start']
+    rend = control['end']
+    dates = np.arange(datetime.strptime(rstart, '%Y%m%d%H%M'),datetime.strptime(rend, '%Y%m%d%H%M') + timedelta(days=1),timedelta(days=1))
+    dates_str = [d.astype(datetime).strftime('%Y%m%d') for d in dates]
+    full_start = rstart[0:8]+str(run_time).zfill(2)
+    full_end = rend[0:8]+str(run_time).zfill(2)
+    #############################################################################
+
+    fcst_time = run_time
+    grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data = get_grid_metadata(tmp_grb)
+    shape = (tmp_grb.Ny, tmp_grb.Nx)
+
+    #---------------------------------------------------------------------------
+    # Group the inventory by variable and lead time, in the order the
+    # messages would be sorted by sort_by_lead_time.
+    #---------------------------------------------------------------------------
+    lead_times = [None] * (GRIB2_MAXIMUM_LEAD_HOURS + 1)
+    for entry in inventory:
+        if lead_times[entry['endStep']] is None:
+            lead_times[entry['endStep']] = {}
+        lead_times[entry['endStep']].setdefault(entry['fcst_hash'], []).append(entry)
 
+    # For each variable, the leads and the message placed at each day of each lead.
+    var_dict = {}
+    for hour in range(GRIB2_MAXIMUM_LEAD_HOURS):
+        vars_dict = lead_times[hour]
+        if vars_dict is None:
+            continue
+        for name, entries in vars_dict.items():
+            lead = entries[0]['endStep']
+            dates_dt = np.array([(datetime.strptime(d,'%Y%m%d') + timedelta(hours=lead)).strftime('%Y%m%d%H%M') for d in dates_str])
+            fields = [None] * len(dates_str)
+            example = None
+            for entry in entries:
+                index = np.where(entry['valid'] == dates_dt)[0]
+                if len(index) == 0:
+                    continue
+                fields[index[0]] = entry
+                if example is None:
+                    example = entry
+            if example is None:
+                logging.warning("No messages of " + name + " at lead time " + str(lead) + " fall in the date range")
+                continue
+            if name not in var_dict:
+                var_dict[name] = {'example' : example, 'lead_time' : [], 'valid_time' : [], 'fields' : []}
+            var_dict[name]['lead_time'].append(example['endStep'])
+            var_dict[name]['valid_time'].append(dates_dt)
+            var_dict[name]['fields'].append(fields)
+
+    #---------------------------------------------------------------------------
+    # Create the variables with placeholder data; the fields are decoded
+    # and written while the file is written.
+    #---------------------------------------------------------------------------
+    logging.info("Creating Camps-data objects for variables at each projection")
+    decoder = GribDecoder(shape, num_processors)
+    all_objs = []
+    for name, var in var_dict.items():
+        logging.info(var['example']['name'])
+        data_shape = (len(dates_str), len(var['lead_time'])) + shape
+        placeholder = np.broadcast_to(np.float32(9999.0), data_shape)
+        obj = create_variable(control, var['example'], placeholder, var['lead_time'], var['valid_time'],
+                              None, fcst_time, grid_meta_dict, full_start, full_end, cls=StreamedGribVariable)
+        if obj is None:
+            continue
+        obj.fields = var['fields']
+        obj.decoder = decoder
+        all_objs.append(obj)
+
+    all_objs += create_grid_variables(tmp_grb, grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data)
+
+    try:
+        writer.write(all_objs, output, profile=getattr(control, 'io_profile', None))
+    finally:
+        decoder.close()
+
+
+class StreamedGribVariable(Camps_data):
+    """Camps_data object of a grib2 variable whose data is decoded from
+    the grib2 files one field at a time as it is written to netCDF.
 
-        #Add ForecastReferenceTime
-        ftime = Time.ForecastReferenceTime(start_time=full_start, end_time=full_end, stride=Time.ONE_DAY)
-        obj.time.append(ftime)
+    Attributes:
+        fields (list): For each lead time, the inventory entry of the
+            message at each day, or None where there is no message.
+        decoder (:obj:`GribDecoder`): Decodes the messages.
+    """
+
+    __slots__ = ('fields', 'decoder')
+
+    def add_nc_data(self, nc_var):
+        """Decodes each field and writes it into its [time, lead] hyperslab
+        of nc_var. Days without a message are written as missing.
+        """
+
+        missing = np.full(self.data.shape[2:], 9999.0, dtype=self.data.dtype)
+        ndays = self.data.shape[0]
+        entries = [entry for fields in self.fields for entry in fields]
+        for i, values in enumerate(self.decoder.decode(entries)):
+            l, t = divmod(i, ndays)
+            if values is None:
+                nc_var[t,l] = missing
+            else:
+                nc_var[t,l] = values
 
 
-        #Add LeadTime
-        ltime = Time.LeadTime(data=lead_time)
-        #ltime = get_LeadTime(lead_time)
-        obj.time.append(ltime)
+class GribDecoder(object):
+    """Decodes grib2 messages into float32 fields, either in this process
+    or with a pool of worker processes.
+
+    Workers read and decode the byte range of a message independently
+    and place the field in one slot of a ring of shared memory slots,
+    so fields are handed back to the single writing process without
+    being pickled. At most one field per slot is in flight at a time.
+
+    Attributes:
+        shape (tuple): Shape of a field, (Ny, Nx).
+        num_processors (int): Number of worker processes; 1 decodes serially.
+        num_slots (int): Number of fields decoded ahead of the writer.
+    """
+
+    def __init__(self, shape, num_processors=1, num_slots=None):
+        self.shape = tuple(int(n) for n in shape)
+        self.num_processors = max(int(num_processors), 1)
+        self.num_slots = num_slots or 2*self.num_processors
+        self.pool = None
+        self.shm = None
+        self.slots = None
+        if self.num_processors > 1:
+            nbytes = self.num_slots * int(np.prod(self.shape)) * 4
+            self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes,1))
+            self.slots = np.ndarray((self.num_slots,)+self.shape, dtype=np.float32, buffer=self.shm.buf)
+            self.pool = Pool(self.num_processors, initializer=_init_decoder,
+                             initargs=(self.shm.name, self.slots.shape))
+            logging.info("Decoding grib2 messages with "+str(self.num_processors)+" processes")
+
+
+    def decode(self, entries):
+        """Yields the decoded float32 field of each inventory entry in order,
+        or None for entries that are None. A yielded field is only valid
+        until the next one is requested.
+        """
+
+        if self.pool is None:
+            f = None
+            try:
+                for entry in entries:
+                    if entry is None:
+                        yield None
+                        continue
+                    # Entries are grouped by file, so keep the current one open
+                    if f is None or f.name != entry['file']:
+                        if f is not None:
+                            f.close()
+                        f = open(entry['file'], 'rb')
+                    yield decode_message(f, entry)
+            finally:
+                if f is not None:
+                    f.close()
+            return
+
+        tasks = [i for i,entry in enumerate(entries) if entry is not None]
+        in_flight = deque()
+        submitted = 0
+        for i, entry in enumerate(entries):
+            # Keep every slot busy decoding ahead of the writer. The slot of a
+            # task is only reused once the writer has moved past its field.
+            while submitted < len(tasks) and len(in_flight) < self.num_slots:
+                slot = submitted % self.num_slots
+                task = entries[tasks[submitted]]
+                in_flight.append((slot, self.pool.apply_async(_decode_into_slot,
+                                  (task['file'], task['offset'], task['length'], slot))))
+                submitted += 1
+            if entry is None:
+                yield None
+                continue
+            slot, result = in_flight.popleft()
+            result.get()
+            yield self.slots[slot]
+
+
+    def close(self):
+        """Stops the worker processes and releases the shared memory."""
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if self.shm is not None:
+            self.slots = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+# Shared memory slots of a decoding worker process, set by _init_decoder.
+_decoder_shm = None
+_decoder_slots = None
+
+
+def _init_decoder(name, shape):
+    """Attaches a decoding worker process to the shared memory slots."""
+
+    global _decoder_shm, _decoder_slots
+    _decoder_shm = shared_memory.SharedMemory(name=name)
+    _decoder_slots = np.ndarray(shape, dtype=np.float32, buffer=_decoder_shm.buf)
+
+
+def _decode_into_slot(filename, offset, length, slot):
+    """Decodes the message at offset of filename into a shared memory slot."""
+
+    with open(filename, 'rb') as f:
+        _decoder_slots[slot] = decode_message(f, {'offset' : offset, 'length' : length})
+    return slot
+
+
+def decode_message(f, entry):
+    """Returns the data values of the message of inventory entry in the
+    open file object f as a float32 array.
+    """
+
+    grb = read_message(f, entry)
+    return np.ma.getdata(grb.values).astype(np.float32)
+
+
+def get_grid_metadata(grb):
+    """Returns the grid mapping metadata of grb, whether its grid is
+    projected, its grid spacing in km, and its projected x and y
+    coordinates.
+    """
+
+    dx = None
+    dy = None
+    x_proj_data = None
+    y_proj_data = None
+
+    grid_meta_dict = {}
+    if grb.gridType == "lambert":
+        isProjected = True
+        dx = grb.Dx/1000.0
+        dy = grb.Dy/1000.0
+        grid_meta_dict['SOSA__observedProperty'] = 'projection'
+        grid_meta_dict['grid_mapping_name'] = "lambert_conformal_conic" # CF-conventions name
+        grid_meta_dict['standard_parallel'] = grb.LaDInDegrees
+        grid_meta_dict['longitude_of_central_meridian'] = grb.LoVInDegrees
+        grid_meta_dict['latitude_of_projection_origin'] = grb.LaDInDegrees
+    elif grb.gridType == "mercator":
+        isProjected = True
+        dx = grb.Di/1000.0
+        dy = grb.Dj/1000.0
+        grid_meta_dict['SOSA__observedProperty'] = 'projection'
+        grid_meta_dict['grid_mapping_name'] = "mercator" # CF-conventions name
+        grid_meta_dict['standard_parallel'] = grb.LaDInDegrees
+        grid_meta_dict['longitude_of_projection_origin'] = grb.projparams['lon_0']
+        grid_meta_dict['scale_factor_at_projection_origin'] = 1
+    elif grb.gridType == "polar_stereographic":
+        isProjected = True
+        dx = grb.Dx/1000.0
+        dy = grb.Dy/1000.0
+        grid_meta_dict['SOSA__observedProperty'] = 'projection'
+        grid_meta_dict['grid_mapping_name'] = "polar_stereographic" # CF-conventions name
+        grid_meta_dict['straight_vertical_longitude_from_pole'] = grb.orientationOfTheGridInDegrees
+        grid_meta_dict['latitude_of_projection_origin'] = 90.0
+        grid_meta_dict['standard_parallel'] = grb.LaDInDegrees
+        grid_meta_dict['scale_factor_at_projection_origin'] = 1
+    elif grb.gridType == "regular_ll":
+        isProjected = False
+        grid_meta_dict['SOSA__observedProperty'] = 'projection'
+        grid_meta_dict['grid_mapping_name'] = "latitude_longitude" # CF-conventions name
+
+
+    # Get the projection x, y data in meters
+    if isProjected:
+        projstring,x_proj_data,y_proj_data = get_projection_data(grb)
+        grid_meta_dict['PROJ_string'] = projstring
+
+    return grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data
+
+
+def create_grid_variables(grb, grid_meta_dict, isProjected, dx, dy, x_proj_data, y_proj_data):
+    """Returns the latitude, longitude, projected x and y, and
+    grid mapping Camps_data objects of the grid of grb.
+    """
+
+    all_objs = []
 
     # Make longitude and latitude variables
     lat = Camps_data('latitude')
     lon = Camps_data('longitude')
     lat.dimensions = ['y', 'x']
     lon.dimensions = ['y', 'x']
-    lat_lon_data = tmp_grb.latlons()
+    lat_lon_data = grb.latlons()
     lat.data = lat_lon_data[0]
     lon.data = np.where(lat_lon_data[1]>180.0,-1.*(360.-lat_lon_data[1]),lat_lon_data[1])
     all_objs.append(lat)
@@ -375,7 +613,235 @@ def convert_grib2(control):
     #Append object to list of objects
     all_objs.append(proj)
 
-    writer.write(all_objs, output)
+    return all_objs
+
+
+def create_variable(control, info, data, lead_time, valid_time, dtype,
+                    fcst_time, grid_meta_dict, full_start, full_end, cls=Camps_data):
+    """Creates the Camps_data object of a grib2 variable.
+
+    Args:
+        control (:obj:`control_helper`): grib2_to_nc control.
+        info (dict): The variable's levelless 'name', 'level' tuple,
+            'level_units', 'units', 'period' and 'step_range' in hours.
+        data (:np.array:): Data dimensioned [time, lead, y, x].
+        lead_time (list): Lead times in hours.
+        valid_time (list): For each lead time, the array of valid times
+            as YYYYMMDDHHMM strings.
+        dtype (:np.dtype:): Type to convert the data to, or None.
+        fcst_time (int): Model cycle hour.
+        grid_meta_dict (dict): Grid mapping metadata.
+        full_start (str): First forecast reference time, YYYYMMDDHH.
+        full_end (str): Last forecast reference time, YYYYMMDDHH.
+        cls (type): Camps_data class to instantiate.
+
+    Returns:
+        (:obj:`Camps_data`): The object, or None if the variable is
+            not in netcdf.yaml or its data could not be added.
+    """
+
+    #Get standard dimension names
+    dimensions = yamlutil.read_dimensions()
+    lead_time_dim = dimensions['lead_time']
+    nctime = dimensions['time']
+    x_proj = dimensions['x_proj']
+    y_proj = dimensions['y_proj']
+
+    #Create object for variable
+    name = info['name']
+    obj = cls(name)
+
+    #Check to see if variable is in netcdf.yaml file
+    if len(obj.metadata) == 0: #if not in netcdf.yaml we cannot write -- skip variable
+        logging.warning('variable %s not in netcdf.yaml, not writing to file'%(name))
+        return None
+
+    #Convert lead_time to an array in seconds
+    lead_time = np.array([x * Time.ONE_HOUR for x in lead_time])
+
+    #Stack the valid_time array -- will be 2D -- and convert to epoch time
+    valid_time = Time.epoch_seconds(np.vstack(valid_time)).astype(int)
+
+    #Add source information from control file
+    if control.source:
+        obj.add_source(control.source)
+    #Add processes to object based on the control file settings
+    if control.preprocesses: [ obj.add_preprocess(p) for p in control.preprocesses ]
+
+    #Adding forecast model cycle time to object
+    obj.add_fcstTime(fcst_time)
+
+    #Set dimensions of variable data in object
+    obj.dimensions = [nctime, lead_time_dim, y_proj, x_proj]
+
+    # Add "grid_mapping" attribute. NOTE: The attribute value must be the variable
+    # name of the grid mapping variable.
+    obj.add_metadata('grid_mapping', grid_meta_dict['grid_mapping_name']+'_grid')
+
+    #Add Vertical coordinate(s)
+    vert_coords = info['level']
+    vert_units = info['level_units']
+    if 'Pa' in vert_units:
+        vert_type = 'plev'
+    else:
+        vert_type = 'elev'
+    obj.add_vert_coord(vert_coords[0], vert_type=vert_type)
+
+    #Add units
+    obj.metadata['units'] = info['units']
+
+    #Add period info
+    if info['period'] > 0:
+        obj.metadata['hours'] = info['period']
+
+    #Add data to object
+    try:
+        obj.add_data(data)
+        if dtype is not None:
+            obj.change_data_type(dtype)
+    except:
+        logging.warning('not an numpy array')
+        return None
+
+    #Add PhenomenonTime or PhenomenonTimePeriod
+    period = info['step_range']*Time.ONE_HOUR
+    if period > 0:
+        phenom_timePd = valid_time-period
+        phenom_timePd = np.dstack((phenom_timePd,valid_time))
+        ptime = Time.PhenomenonTimePeriod(data=phenom_timePd)
+    else:
+        ptime = Time.PhenomenonTime(data=valid_time)
+    obj.time.append(ptime)
+
+
+    #Add ForecastReferenceTime
+    ftime = Time.ForecastReferenceTime(start_time=full_start, end_time=full_end, stride=Time.ONE_DAY)
+    obj.time.append(ftime)
+
+
+    #Add LeadTime
+    ltime = Time.LeadTime(data=lead_time)
+    obj.time.append(ltime)
+
+    return obj
+
+
+def get_input_files(input_files):
+    """Returns the sorted list of grib2 files named by input_files, which
+    is a filename, a glob pattern, or a list of either.
+    """
+
+    if isinstance(input_files, str):
+        input_files = [input_files]
+    files = []
+    for pattern in input_files:
+        matches = sorted(glob.glob(pattern))
+        if len(matches) == 0:
+            raise IOError("No grib2 files match " + str(pattern))
+        files += [f for f in matches if f not in files]
+
+    return files
+
+
+def build_inventory(files, num_processors=1):
+    """Returns the inventories of every file in files concatenated in
+    order. With more than one processor the files are inventoried in
+    parallel.
+    """
+
+    if num_processors > 1 and len(files) > 1:
+        with Pool(min(num_processors, len(files))) as pool:
+            inventories = pool.map(grib2_inventory, files)
+    else:
+        inventories = [grib2_inventory(f) for f in files]
+
+    return [entry for inventory in inventories for entry in inventory]
+
+
+def message_offsets(filename):
+    """Returns the byte offset and length of every GRIB2 message in filename,
+    reading only the 16 byte indicator section of each message.
+    """
+
+    offsets = []
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 16 <= size:
+            f.seek(pos)
+            header = f.read(16)
+            if header[:4] != b'GRIB':
+                # Skip padding between messages
+                f.seek(pos)
+                chunk = f.read(65536)
+                found = chunk.find(b'GRIB', 1)
+                if found < 0:
+                    pos += max(len(chunk)-3, 1)
+                else:
+                    pos += found
+                continue
+            if header[7] != 2:
+                raise ValueError("Message at byte " + str(pos) + " of " + str(filename) + " is not GRIB2")
+            length = int.from_bytes(header[8:16], 'big')
+            offsets.append((pos, length))
+            pos += length
+
+    return offsets
+
+
+def read_message(f, entry):
+    """Reads the grib2 message of inventory entry from the open file
+    object or filename f and returns it as a pygrib message.
+    Its values are not decoded until they are accessed.
+    """
+
+    if isinstance(f, str):
+        with open(f, 'rb') as fh:
+            return read_message(fh, entry)
+    f.seek(entry['offset'])
+    return pygrib.fromstring(f.read(entry['length']))
+
+
+def grib2_inventory(filename, max_lead_hours=GRIB2_MAXIMUM_LEAD_HOURS):
+    """Returns a list with one dict per grib2 message of filename holding
+    its 'file', byte 'offset' and 'length', and the keys needed to place
+    it in the netCDF file, without decoding any data values.
+    """
+
+    inventory = []
+    with open(filename, 'rb') as f:
+        for i, (offset, length) in enumerate(message_offsets(filename)):
+            f.seek(offset)
+            grb = pygrib.fromstring(f.read(length))
+            if grb.endStep > max_lead_hours:
+                logging.warning('grb forecastTime greater than max lead time')
+                continue
+            if i % 1000 == 0:
+                logging.debug('Inventoried ' + str(i) + " grb records")
+            keys = list(grb.keys())
+            entry = {
+                'file' : filename,
+                'offset' : offset,
+                'length' : length,
+                'fcst_hash' : get_forecast_hash(grb),
+                'name' : get_levelless_forecast_hash(grb),
+                'grid' : (grb.gridType, grb.Ny, grb.Nx),
+                'hour' : grb.hour,
+                'endStep' : grb.endStep,
+                'step_range' : grb.endStep - grb.startStep,
+                'valid' : str(grb.validityDate) + str(grb.validityTime).zfill(4),
+                'units' : grb.units,
+                'level_units' : grb.unitsOfFirstFixedSurface,
+                'period' : grb.lengthOfTimeRange if 'lengthOfTimeRange' in keys else 0,
+                }
+            #Defined at a vertical level or vertical layer
+            if grb.topLevel == grb.bottomLevel:
+                entry['level'] = (grb.level,)
+            else:
+                entry['level'] = (grb.topLevel, grb.bottomLevel)
+            inventory.append(entry)
+
+    return inventory
 
 
 def get_projection_data(grb):
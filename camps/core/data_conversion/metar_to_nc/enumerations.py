@@ -1,9 +1,13 @@
+import numpy as np
+
+
 """Module: enumeration.py
 
 Methods:
     default_func
     get_station_type_enumeration
     get_enumeration_function
+    enumerate_array
     get_station_type
     get_cloud_amount_enumeration
     get_weather_type_enumeration
@@ -37,6 +41,21 @@ def get_enumeration_function(name):
     return default_func
 
 
+def enumerate_array(name, observations):
+    """Applies the enumeration function of 'name' to an array of stripped
+    observation strings at once. Each distinct string is enumerated once
+    and the results are gathered through the resulting lookup table.
+    Empty strings that are not enumerated become MISSING_VALUE.
+    """
+
+    func = get_enumeration_function(name)
+    uniques, inverse = np.unique(observations, return_inverse=True)
+    table = [func(ob) for ob in uniques]
+    table = np.array([MISSING_VALUE if ob == '' else ob for ob in table])
+
+    return table[inverse.reshape(np.shape(observations))]
+
+
 def get_station_type(station_type_num):
     """Returns the string representation of the station type."""
 
@@ -5,8 +5,11 @@ import csv
 import os
 import logging
 import pdb
+import numpy as np
 
 from .station import station
+from .station import MISSING_VALUE
+from . import enumerations
 from .qc_error import qc_error as qce
 from . import qc_error
 from ....registry import util as cfg
@@ -24,7 +27,18 @@ Class: metarreader
         parse_header
         check_latlon
 
+Class: columnar_metarreader(metarreader)
+    Methods:
+        __init__
+        read_all
+        add_block
+        select_records
+        is_closer_record
+        convert_column
+        build_stations
+
 Methods:
+    _to_float
     strip_array
 """
 
@@ -161,6 +175,208 @@ class metarreader():
                     ))
 
 
+class columnar_metarreader(metarreader):
+    """Reads a METAR formatted file for a known list of dates straight into
+    preallocated [station, time] arrays, one per observation, instead of
+    appending to per-station lists. Each hour block is parsed as a whole,
+    and enumerations are applied as lookup tables over its columns.
+
+    Attributes:
+        dates (list): Dates, YYYYMMDDHH, of the time axis.
+        time_index (dict): Column of each date in the arrays.
+        station_index (dict): Row of each station in the arrays.
+        data_types (dict): Numpy data type of each observation.
+        data (dict): [station, time] array of each observation, in the
+            order the observations appear in the file.
+    """
+
+    def __init__(self, stn_tbl, stn_lst, dates, data_types, filename=None):
+        """Initializes the station rows, time columns, and empty arrays."""
+
+        super(columnar_metarreader, self).__init__(stn_tbl, stn_lst, filename=filename)
+        self.dates = list(dates)
+        self.time_index = {date : i for i,date in enumerate(self.dates)}
+        self.station_index = {name : i for i,name in enumerate(self.station_list)}
+        self.data_types = data_types
+        self.data = {}
+
+
+    def read_all(self):
+        """Reads every hour block of the file that falls on one of the
+        dates. Dates without a block keep missing values.
+        """
+
+        read = np.zeros(len(self.dates), dtype=bool)
+        lines = iter(self._metar_file)
+        for line in lines:
+            if line.strip() == '':
+                continue
+            self.parse_header(line.split(':'))
+            self.observations = next(lines).rstrip('\n').split(':')
+            self.observations.pop(0) # This removes "CALL" from the ob name row
+            self.observations.pop()  # Remove extra column
+            self.observations = strip_array(self.observations)
+
+            rows = []
+            for row in lines:
+                if row.split(':', 1)[0].rstrip('\n') == 'ZZZZZZZZ':
+                    break
+                rows.append(row)
+
+            t = self.time_index.get(self.obs_time)
+            if t is None or read[t]:
+                logging.info("Reading METAR Obs for date = "+self.obs_time+\
+                             ": Obs not needed for input date range. Skipping these obs...")
+            else:
+                logging.info("Reading METAR Obs for date = "+self.obs_time)
+                self.add_block(self.observations, rows, t)
+                read[t] = True
+                self.read_count += 1
+            if self.obs_time >= self.dates[-1]:
+                break
+
+        for t in np.where(~read)[0]:
+            logging.warning("No METAR Obs for date "+self.dates[t]+". Data set to missing.")
+
+        self.build_stations()
+
+
+    def add_block(self, keys, rows, t):
+        """Parses the lines of one hour block, whose observations are
+        named by keys, into column t of the arrays.
+        """
+
+        num_keys = len(keys)
+        for key in keys:
+            if key not in self.data:
+                dtype = np.dtype(self.data_types[key])
+                missing = np.array(MISSING_VALUE).astype(dtype)
+                self.data[key] = np.full((len(self.station_index), len(self.dates)), missing, dtype=dtype)
+
+        # Keep the rows of stations in the station list. Each row holds the
+        # station name, an observation per key, and an empty last column.
+        stations = []
+        fields = []
+        for row in rows:
+            row = row.rstrip('\n').split(':')
+            i = self.station_index.get(row[0].strip())
+            if i is None:
+                continue
+            row = row[1:num_keys+1]
+            if len(row) < num_keys:
+                row = row + [''] * (num_keys - len(row))
+            stations.append(i)
+            fields += row
+        logging.debug(str(len(self.station_index)-len(set(stations)))+" stations have no obs for date = "+str(self.obs_time))
+        if len(stations) == 0:
+            return
+        stations = np.array(stations)
+        # Observations are stripped of surrounding whitespace only, as
+        # station.add_record strips them.
+        fields = np.char.strip(np.array(fields))
+        columns = [fields[k::num_keys] for k in range(num_keys)]
+
+        # Resolve stations with more than one record this hour
+        records = self.select_records(stations, columns, keys)
+        if records is not None:
+            stations = stations[records]
+            columns = [column[records] for column in columns]
+
+        for key, column in zip(keys, columns):
+            self.data[key][stations, t] = self.convert_column(key, column, self.data[key].dtype)
+
+
+    def select_records(self, stations, columns, keys):
+        """Returns the indices of the record kept for each station, in the
+        same manner as station.add_record keeps the closer of duplicates,
+        or None if no station has more than one record.
+        """
+
+        uniques, first, counts = np.unique(stations, return_index=True, return_counts=True)
+        if np.all(counts == 1):
+            return None
+
+        records = dict(zip(uniques[counts == 1], first[counts == 1]))
+        for r in np.where(np.isin(stations, uniques[counts > 1]))[0]:
+            i = stations[r]
+            if i in records and self.is_closer_record(records[i], r, columns, keys):
+                continue
+            records[i] = r
+
+        return np.array(sorted(records.values()))
+
+
+    def is_closer_record(self, old, new, columns, keys):
+        """Returns whether the old record of a station is closer to 50 past
+        the hour than the new one, where old and new index the rows of
+        columns. MANU records are selected over automated records.
+        See station.is_closer_time.
+        """
+
+        if 'TYPE' in keys:
+            types = columns[keys.index('TYPE')]
+            new_manual = types[new] == 'MANU'
+            old_manual = types[old] == 'MANU'
+            if new_manual != old_manual:
+                return old_manual
+
+        if 'TIME' not in keys:
+            return False
+        def minutes(time):
+            try:
+                minute = int(time[-2:])
+            except ValueError:
+                return MISSING_VALUE
+            return minute + 60 if minute < 30 else minute
+        times = columns[keys.index('TIME')]
+        new_time = minutes(times[new])
+        old_time = minutes(times[old])
+
+        return abs(old_time - 50) < abs(new_time - 50)
+
+
+    def convert_column(self, key, column, dtype):
+        """Converts an array of stripped observation strings to dtype,
+        applying the enumeration of key if it has one.
+        """
+
+        if key in enumerations.needs_enumeration:
+            return enumerations.enumerate_array(key, column).astype(dtype)
+
+        # Parse the numbers of the whole column in one pass, with empty
+        # observations as missing.
+        column = np.where(column == '', str(MISSING_VALUE), column)
+        values = np.fromstring(' '.join(column), sep=' ')
+        if len(values) != len(column):
+            logging.warning("Observations of "+key+" are not all numbers. Setting them to missing.")
+            values = np.array([_to_float(ob) for ob in column])
+        if dtype.kind != 'f':
+            values = values.astype(np.int64)
+
+        return values.astype(dtype)
+
+
+    def build_stations(self):
+        """Points the observations of each station object at its row of
+        the arrays, so station based code reads and modifies the arrays.
+        """
+
+        for name, i in self.station_index.items():
+            stn = self.station_list[name]
+            stn.observations = {key : arr[i] for key, arr in self.data.items()}
+            stn.hours = list(self.dates)
+            stn.empty_obs = False
+
+
+def _to_float(ob):
+    """Returns ob as a float, or MISSING_VALUE if it is not a number."""
+
+    try:
+        return float(ob)
+    except ValueError:
+        return float(MISSING_VALUE)
+
+
 def strip_array(arr):
     """Strips whitespace out of an array of strings.
     Will fail if not given a string list.
@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 from .qc_error import qc_error
 import pdb
 
@@ -10,6 +11,11 @@ Methods:
     check_consistency
     check_min_max
     check_bounds
+    stack_obs
+    unstack_obs
+    consistency_tolerance
+    check_consistency_matrix
+    check_bounds_matrix
 """
 
 
@@ -115,3 +121,124 @@ def check_bounds(in_arr, minimum, maximum):
             errors.append(new_error)
 
     return errors
+
+
+def stack_obs(station_list, obs_str):
+    """Returns the observation obs_str of every station in station_list
+    as a [station, time] array.
+    """
+
+    return np.array([np.asarray(station.get_obs(obs_str)) for station in station_list])
+
+
+def unstack_obs(station_list, obs_str, obs_matrix):
+    """Copies the rows of obs_matrix back into the observation obs_str
+    of each station in station_list, in place.
+    """
+
+    for station, row in zip(station_list, obs_matrix):
+        station.get_obs(obs_str)[:] = row
+
+
+def consistency_tolerance(type_matrix, tolerance):
+    """Returns the tolerance check_consistency uses at each [station, time]
+    of type_matrix, starting from tolerance, which may be a value per
+    station, and whether each tolerance is an int rather than a float.
+    """
+
+    num_stations, num_times = type_matrix.shape
+    tol = np.zeros(num_stations) + tolerance
+    is_int = np.zeros(num_stations, dtype=bool) | isinstance(tolerance, (int, np.integer))
+    if not np.isscalar(tolerance):
+        is_int = np.array([isinstance(t, (int, np.integer)) for t in tolerance])
+    tolerances = np.empty((num_stations, num_times))
+    int_tolerances = np.empty((num_stations, num_times), dtype=bool)
+    is_auto = (type_matrix >= 2) & (type_matrix <= 8)
+    for counter in range(num_times):
+        below = tol < 10
+        double = below & is_auto[:,counter]
+        reset = ~below & ~is_auto[:,counter]
+        tol[double] *= 2.0
+        is_int[double] = False
+        tol[reset] = 10
+        is_int[reset] = True
+        tolerances[:,counter] = tol
+        int_tolerances[:,counter] = is_int
+
+    return tolerances, int_tolerances
+
+
+def check_consistency_matrix(in_matrix, type_matrix, tolerance=10):
+    """Runs check_consistency on every row of the [station, time] array
+    in_matrix at once and returns a list of the errors of each station.
+    The errors, and the values set to MISSING_VALUE, are the same as those
+    of check_consistency on each station.
+    """
+
+    num_stations, num_times = in_matrix.shape
+    errors = [[] for s in range(num_stations)]
+    if num_times < 3:
+        return errors
+
+    orig = in_matrix.copy()
+    prev = orig[:,:-2]
+    cur = orig[:,1:-1]
+    nxt = orig[:,2:]
+    tolerances, int_tolerances = consistency_tolerance(type_matrix[:,:num_times-2], tolerance)
+
+    # Compare in the precision numpy uses for a scalar against a Python number
+    def within(diff):
+        if diff.dtype.kind == 'f':
+            return tolerances.astype(diff.dtype)
+        return tolerances
+    diff = np.abs(prev - cur)
+    candidates = (prev != MISSING_VALUE) & (cur != MISSING_VALUE) & (nxt != MISSING_VALUE) \
+        & (diff > within(diff))
+    diff = np.abs(((prev + nxt) / 2) - cur)
+    failed = candidates & (diff > within(diff))
+
+    missing = in_matrix.dtype.type(MISSING_VALUE)
+    for s, counter in zip(*np.nonzero(failed)):
+        i = (orig[s,counter], orig[s,counter+1], orig[s,counter+2])
+        diff = abs(((i[0] + i[2]) / 2) - i[1])
+        if int_tolerances[s,counter]:
+            tol = int(tolerances[s,counter])
+        else:
+            tol = float(tolerances[s,counter])
+        # The previous value was already set to missing if it failed
+        old_value = missing if counter > 0 and failed[s,counter-1] else orig[s,counter]
+        errors[s].append(qc_error(
+            old_data_value=old_value,
+            new_data_value=MISSING_VALUE,
+            date_of_error=int(counter),
+            explanation="Consistency check failed.  An absolute difference "
+            + "of " + str(diff) + " between the current value of " + str(i[1]) +
+            " and the average of previous value, " + str(i[0]) + ", "
+            " and the following value, " + str(i[2]) + ", was not "
+            "within " + str(tol)
+        ))
+    in_matrix[:,1:-1][failed] = MISSING_VALUE
+
+    return errors
+
+
+def check_bounds_matrix(in_matrix, minimum, maximum):
+    """Runs check_bounds on every row of the [station, time] array
+    in_matrix at once and returns a list of the errors of each station.
+    """
+
+    if minimum > maximum:
+        raise ValueError("minimum is greater than maximum")
+
+    errors = [[] for s in range(in_matrix.shape[0])]
+    failed = (in_matrix != MISSING_VALUE) & ((in_matrix < minimum) | (in_matrix > maximum))
+    for s, i in zip(*np.nonzero(failed)):
+        value = in_matrix[s,i]
+        errors[s].append(qc_error(
+            old_data_value=value, new_data_value=MISSING_VALUE,
+            explanation="The value not between " + str(minimum) +
+            " and " + str(maximum)
+        ))
+    in_matrix[failed] = MISSING_VALUE
+
+    return errors
@@ -1,13 +1,8 @@
 import logging
 import sys
 import os
-from . import qc_clouds
-from . import qc_precip
-from . import qc_temp
-from . import qc_winds
-from . import qc_pressure
-from . import qc_weather
 from . import qc_error
+from . import qc_pool
 import pdb
 import time
 
@@ -20,46 +15,19 @@ Methods:
 """
 
 
-def qc(station_dict,err_file=None):
+def qc(station_dict,err_file=None,vectorized=False):
 
     all_errors = []
 
     logging.info("Starting QC...")
     station_list = list(station_dict.values())
 
+    # Run the temperature, pressure, cloud, wind, weather, and precip QC
+    # for chunks of stations with one pool of processes.
     start = time.time()
-    logging.info("QC Temperature")
-    all_errors += qc_temp.qc_temp(station_list)
-    end = time.time()
-    logging.info(end - start)
-
-    start = time.time()
-    logging.info("QC Pressure")
-    all_errors += qc_pressure.qc_pressure(station_list)
-    end = time.time()
-    logging.info(end - start)
-
-    start = time.time()
-    logging.info("QC Clouds")
-    all_errors += qc_clouds.qc_clouds(station_list)
-    end = time.time()
-    logging.info(end - start)
-
-    start = time.time()
-    logging.info("QC Winds")
-    all_errors += qc_winds.qc_winds(station_list)
-    end = time.time()
-    logging.info(end - start)
-
-    start = time.time()
-    logging.info("QC Weather")
-    all_errors += qc_weather.qc_weather(station_list)
-    end = time.time()
-    logging.info(end - start)
-
-    start = time.time()
-    logging.info("QC Precip")
-    all_errors += qc_precip.qc_precip(station_list)
+    num_processors = int(os.getenv('NUM_PROCS', 8))
+    with qc_pool.qc_executor(station_list, num_processors, vectorized) as executor:
+        all_errors += executor.run()
     end = time.time()
     logging.info(end - start)
 
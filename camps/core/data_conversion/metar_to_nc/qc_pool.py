@@ -0,0 +1,234 @@
+import logging
+import copy
+import time
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from . import qc_clouds
+from . import qc_precip
+from . import qc_temp
+from . import qc_winds
+from . import qc_pressure
+from . import qc_weather
+
+
+"""Module: qc_pool.py
+
+Class: qc_executor
+
+    Methods:
+        __init__
+        share_observations
+        run
+        close
+        __enter__
+        __exit__
+
+Methods:
+    qc_stations
+    _each_station
+    _init_worker
+    _qc_chunk
+"""
+
+
+# Names of the QC stages, in the order they are run.
+QC_STAGES = ['Temperature', 'Pressure', 'Clouds', 'Winds', 'Weather', 'Precip']
+
+
+def qc_stations(station_list, vectorized=False):
+    """Runs every QC stage, in the order of QC_STAGES, on the stations of
+    station_list. Corrections are made in place in the station observation
+    arrays. Returns a list with, for each stage, the list of errors and
+    the seconds it took.
+
+    If vectorized, the temperature and pressure checks are run on
+    [station, time] arrays of all the stations at once, provided the
+    stations share their hours.
+    """
+
+    if vectorized and len(station_list) > 0:
+        hours = station_list[0].hours
+        vectorized = all(np.array_equal(station.hours, hours) for station in station_list)
+    if vectorized:
+        stages = [qc_temp.qc_temp_matrix, qc_pressure.qc_pressure_matrix]
+    else:
+        stages = [_each_station(qc_temp.qc_temp_st), _each_station(qc_pressure.qc_pressure_st)]
+    stages += [_each_station(qc_clouds.qc_clouds_st), qc_winds.qc_winds,
+               _each_station(qc_weather.qc_weather_st), qc_precip.qc_precip]
+
+    results = []
+    for stage in stages:
+        start = time.time()
+        errors = stage(station_list)
+        results.append(([err for err in errors if err is not None], time.time() - start))
+
+    return results
+
+
+def _each_station(qc_st):
+    """Returns a QC stage that runs qc_st on each station in turn."""
+
+    def stage(station_list):
+        errors = []
+        for station in station_list:
+            errors += qc_st(station)
+        return errors
+    return stage
+
+
+class qc_executor:
+    """Runs QC on chunks of stations with a single pool of worker processes.
+
+    The observation arrays of the stations are copied once into shared
+    memory as [station, time] arrays, and each station's observations are
+    rows of them. Workers attach to the arrays when they start, run all QC
+    stages for a chunk of stations, and make their corrections in place, so
+    only the chunk bounds and the errors are passed between processes.
+
+    Attributes:
+        station_list (list): Stations to QC.
+        num_processors (int): Number of worker processes.
+        vectorized (bool): If the temperature and pressure checks are run
+                on [station, time] arrays. See qc_stations.
+        shared (dict): Shared [station, time] array of each observation.
+    """
+
+    def __init__(self, station_list, num_processors=1, vectorized=False):
+        """Shares the station observations and starts the worker pool."""
+
+        self.station_list = station_list
+        self.num_processors = max(int(num_processors), 1)
+        self.vectorized = vectorized
+        self.pool = None
+        self.shm = {}
+        self.shared = {}
+        if self.num_processors > 1 and len(station_list) > 1:
+            if self.share_observations():
+                skeletons = []
+                for station in station_list:
+                    skeleton = copy.copy(station)
+                    skeleton.observations = {}
+                    skeletons.append(skeleton)
+                arrays = [(key, shm.name, self.shared[key].shape, self.shared[key].dtype.str)
+                          for key, shm in self.shm.items()]
+                self.pool = Pool(self.num_processors, initializer=_init_worker,
+                                 initargs=(skeletons, arrays, vectorized))
+                logging.info("QC with "+str(self.num_processors)+" processes")
+            else:
+                logging.warning("Station observations are not all the same length. QC with one process.")
+
+
+    def share_observations(self):
+        """Copies the observations of every station into shared [station, time]
+        arrays and points each station at its rows. Returns False, leaving the
+        stations unchanged, if an observation can not be stacked.
+        """
+
+        keys = list(self.station_list[0].observations.keys())
+        stacked = {}
+        for key in keys:
+            try:
+                arr = np.array([np.asarray(station.observations[key]) for station in self.station_list])
+            except (KeyError, ValueError):
+                return False
+            if arr.ndim != 2 or arr.dtype == object:
+                return False
+            stacked[key] = arr
+
+        for key, arr in stacked.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            self.shm[key] = shm
+            self.shared[key] = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            self.shared[key][:] = arr
+        for i, station in enumerate(self.station_list):
+            station.observations = {key : self.shared[key][i] for key in keys}
+
+        return True
+
+
+    def run(self, chunk_size=None):
+        """Runs all QC stages on every station and returns the errors
+        grouped by stage, in the order of QC_STAGES, and then by station.
+        Logs the seconds spent in each stage, summed over the workers.
+        """
+
+        if self.pool is None:
+            results = qc_stations(self.station_list, self.vectorized)
+        else:
+            num_stations = len(self.station_list)
+            if chunk_size is None:
+                chunk_size = max(num_stations // (4*self.num_processors), 1)
+            chunks = [(start, min(start+chunk_size, num_stations)) for start in range(0, num_stations, chunk_size)]
+            stage_errors = [[] for name in QC_STAGES]
+            stage_seconds = [0.] * len(QC_STAGES)
+            for chunk_results in self.pool.imap(_qc_chunk, chunks):
+                for s, (errors, seconds) in enumerate(chunk_results):
+                    stage_errors[s] += errors
+                    stage_seconds[s] += seconds
+            results = list(zip(stage_errors, stage_seconds))
+
+        all_errors = []
+        for name, (errors, seconds) in zip(QC_STAGES, results):
+            logging.info("QC "+name)
+            logging.info(seconds)
+            all_errors += errors
+
+        return all_errors
+
+
+    def close(self):
+        """Stops the workers and copies the observations out of shared
+        memory before releasing it, so the stations stay valid.
+        """
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        if len(self.shm) > 0:
+            private = {key : arr.copy() for key, arr in self.shared.items()}
+            for i, station in enumerate(self.station_list):
+                station.observations = {key : private[key][i] for key in private}
+            self.shared = {}
+            for shm in self.shm.values():
+                shm.close()
+                shm.unlink()
+            self.shm = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Stations of a QC worker process, whose observations are rows of the
+# shared arrays. Set by _init_worker.
+_worker_stations = None
+_worker_shm = None
+_worker_vectorized = False
+
+
+def _init_worker(skeletons, arrays, vectorized=False):
+    """Attaches a QC worker process to the shared observation arrays."""
+
+    global _worker_stations, _worker_shm, _worker_vectorized
+    _worker_vectorized = vectorized
+    _worker_shm = []
+    shared = {}
+    for key, name, shape, dtype in arrays:
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_shm.append(shm)
+        shared[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    for i, station in enumerate(skeletons):
+        station.observations = {key : arr[i] for key, arr in shared.items()}
+    _worker_stations = skeletons
+
+
+def _qc_chunk(bounds):
+    """Runs all QC stages on the stations in bounds, (start, end)."""
+
+    start, end = bounds
+    return qc_stations(_worker_stations[start:end], _worker_vectorized)
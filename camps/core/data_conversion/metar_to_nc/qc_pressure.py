@@ -13,6 +13,7 @@ from multiprocessing.dummy import Pool as ThreadPool
 Methods:
     qc_pressure
     qc_pressure_st
+    qc_pressure_matrix
 """
 
 
@@ -67,3 +68,33 @@ def qc_pressure_st(station):
     all_errors += errors
 
     return all_errors
+
+
+def qc_pressure_matrix(station_list):
+    """Runs the checks of qc_pressure_st on [station, time] arrays of all
+    the stations in station_list at once. Returns the errors in the same
+    order as qc_pressure_st on each station.
+    """
+
+    pressure = qc_general.stack_obs(station_list, "MSL")
+    altimeter = qc_general.stack_obs(station_list, "ALT")
+    station_type = qc_general.stack_obs(station_list, "TYPE")
+
+    checks = []
+    checks.append((qc_general.check_bounds_matrix(pressure, 875, 1075), 9601))
+    checks.append((qc_general.check_consistency_matrix(pressure, station_type, 3.4), 9603))
+    checks.append((qc_general.check_bounds_matrix(altimeter, 24, 32), 9602))
+    checks.append((qc_general.check_consistency_matrix(altimeter, station_type, .1), 9604))
+
+    qc_general.unstack_obs(station_list, "MSL", pressure)
+    qc_general.unstack_obs(station_list, "ALT", altimeter)
+
+    all_errors = []
+    for s, station in enumerate(station_list):
+        for station_errors, error_code in checks:
+            errors = station_errors[s]
+            qc_error.set_all_attr(errors, "error_code", error_code)
+            qc_error.set_all_attr(errors, "station_name", station.name)
+            all_errors += errors
+
+    return all_errors
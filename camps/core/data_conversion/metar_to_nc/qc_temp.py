@@ -1,5 +1,6 @@
 import logging
 import os
+import numpy as np
 from . import qc_general
 from .qc_error import qc_error
 from .qc_error import set_all_attr
@@ -20,6 +21,11 @@ Methods:
     calc_special_max
     calc_special_min
     check_dewpoint
+    qc_temp_matrix
+    synoptic_windows
+    check_6hour_max_matrix
+    check_6hour_min_matrix
+    check_dewpoint_matrix
 """
 
 
@@ -426,3 +432,345 @@ def check_dewpoint(dewpoint_arr, temperature_arr):
             dewpoint_arr[i] = temp
 
     return errors
+
+
+def qc_temp_matrix(station_list):
+    """Runs the checks of qc_temp_st on [station, time] arrays of all the
+    stations in station_list at once. The stations must share their hours.
+    Returns the errors in the same order as qc_temp_st on each station.
+    """
+
+    hours = station_list[0].hours
+    temperature = qc_general.stack_obs(station_list, 'TMP')
+    dew_point = qc_general.stack_obs(station_list, 'DEW')
+    max_temp_6_hour = qc_general.stack_obs(station_list, 'MX6')
+    min_temp_6_hour = qc_general.stack_obs(station_list, 'MN6')
+    station_type = qc_general.stack_obs(station_list, 'TYPE')
+
+    # Temperature QC
+    temp_errors = qc_general.check_consistency_matrix(temperature, station_type, 10)
+    for errors in temp_errors:
+        set_all_attr(errors, "error_code", 9901)
+
+    max_errors = check_6hour_max_matrix(
+        temperature, max_temp_6_hour, hours, station_type)
+
+    min_errors = check_6hour_min_matrix(
+        temperature, min_temp_6_hour, hours, station_type)
+
+    # Dew Point QC
+    allowances = []
+    for station in station_list:
+        allowance = 10
+        lon = station.get_obs("LON")[0]
+        season = station.get_season()
+        is_spring_or_summer = season == 'spring' or season == 'summer'
+        is_fall_or_winter = season == 'winter' or season == 'fall'
+        if lon >= 95 and lon < 30:
+            if is_spring_or_summer:
+                allowance = 15
+            elif is_fall_or_winter:
+                allowance = 12
+        allowances.append(allowance)
+    dew_errors = qc_general.check_consistency_matrix(dew_point, station_type, allowances)
+    for errors in dew_errors:
+        set_all_attr(errors, "error_code", 9802)
+        for err in errors:
+            err.date_of_error = hours[err.date_of_error]
+
+    dewpoint_errors = check_dewpoint_matrix(dew_point, temperature)
+    for errors in dewpoint_errors:
+        for err in errors:
+            err.date_of_error = hours[err.date_of_error]
+
+    qc_general.unstack_obs(station_list, 'TMP', temperature)
+    qc_general.unstack_obs(station_list, 'DEW', dew_point)
+    qc_general.unstack_obs(station_list, 'MX6', max_temp_6_hour)
+    qc_general.unstack_obs(station_list, 'MN6', min_temp_6_hour)
+
+    all_errors = []
+    for s, station in enumerate(station_list):
+        station_errors = temp_errors[s] + max_errors[s] + min_errors[s] \
+            + dew_errors[s] + dewpoint_errors[s]
+        for err in station_errors:
+            err.station_name = station.name
+        all_errors += station_errors
+
+    return all_errors
+
+
+def synoptic_windows(date_array):
+    """Returns a list of (i, indices) for each synoptic hour (00,06,12,18)z
+    at index i of date_array, where indices are the hours since the previous
+    synoptic hour, up to and including i.
+    """
+
+    windows = []
+    start = 0
+    for i, date in enumerate(date_array):
+        if (int(date[-2:]) % 6) == 0:
+            windows.append((i, np.arange(start, i+1)))
+            start = i+1
+
+    return windows
+
+
+def check_6hour_max_matrix(hourly_temp_matrix, six_hour_max_matrix,
+                           date_array, station_type):
+    """Runs check_6hour_max on every station of the [station, time] arrays
+    at once, looping over the synoptic periods rather than the hours.
+    Returns a list of the errors of each station.
+    """
+
+    num_stations = hourly_temp_matrix.shape[0]
+    errors = [[] for s in range(num_stations)]
+    carry = None
+    for i, hours in synoptic_windows(date_array):
+        date = date_array[i]
+        # The hourly temperatures of the period, after the last hour of the
+        # previous period as it was read then.
+        tmp_6hours = hourly_temp_matrix[:,hours]
+        if carry is not None:
+            tmp_6hours = np.column_stack((carry, tmp_6hours))
+        carry = tmp_6hours[:,-1].copy()
+        length = tmp_6hours.shape[1]
+
+        six_hour_temp = six_hour_max_matrix[:,i].copy()
+        is_auto = (station_type[:,i] >= 2) & (station_type[:,i] <= 8)
+        base_tolerance = np.where(is_auto, 8, 6)
+
+        # calc_special_max
+        present = tmp_6hours != MISSING_VALUE
+        extrema = np.maximum(np.where(present, tmp_6hours, -9999).max(axis=1), -9999)
+        extrema = extrema.astype(tmp_6hours.dtype)
+        temp_difference = extrema - six_hour_temp
+        num_missing = length - present.sum(axis=1)
+        is_index = present & (((temp_difference == 1)[:,None] & (tmp_6hours == extrema[:,None]))
+                              | (tmp_6hours - six_hour_temp[:,None] > 1))
+        num_indicies = is_index.sum(axis=1)
+        first = np.argmax(is_index, axis=1)
+        at_end = (first == 0) | (first == length - 1)
+        tolerance = base_tolerance + (2 * num_missing)
+
+        # Each station takes the first branch of check_6hour_max that applies
+        remaining = six_hour_temp != MISSING_VALUE
+        all_missing = remaining & (num_missing == length)
+        remaining &= ~all_missing
+        out_of_tolerance = remaining & ((six_hour_temp - extrema) > tolerance)
+        remaining &= ~out_of_tolerance
+        garbage = remaining & (temp_difference >= 2) & (num_indicies > 1)
+        remaining &= ~garbage
+        rounding = remaining & (((temp_difference == 1) & (num_indicies > 1))
+                                | ((temp_difference == 1) & (num_indicies == 1) & ~at_end))
+        remaining &= ~rounding
+        end_hour = remaining & (temp_difference > 0) & (num_indicies == 1) & at_end
+        remaining &= ~end_hour
+        inner_hour = remaining & (temp_difference >= 2) & ~at_end
+
+        for s in np.nonzero(out_of_tolerance)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9915, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The reported synoptic "
+                "6-h max is out of tolerance, "
+                "where tolerance is " + str(base_tolerance[s]) + "+(2*the "
+                "number of hours missing--" + str(num_missing[s]) +
+                "\n" + str(list(tmp_6hours[s])) + "\n"
+                ") in the synoptic period. \n"
+                "reported 6h max   : " + str(six_hour_temp[s]) + "\n"
+                "calculated 6h max : " + str(extrema[s])
+            ))
+        for s in np.nonzero(garbage)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9911, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The calculated 6-h max from the hourly "
+                "temperatures is greater than the reported "
+                "6-h max by 2 degrees and this occured "
+                "more than once during the synoptic period."
+            ))
+        for s in np.nonzero(rounding)[0]:
+            # Correct hours that were affected
+            for affected_hour in np.nonzero(is_index[s])[0]:
+                errors[s].append(qc_error(
+                    date_of_error=date, error_code=9902,
+                    old_data_value=hourly_temp_matrix[s,(i - 6) + affected_hour],
+                    new_data_value=six_hour_temp[s],
+                    explanation="The calculated 6-h max from the hourly "
+                    "temperatures is greater than the reported "
+                    "6-h max by only one degree and this occured "
+                    "more than once during the period OR this "
+                    "occured only once during the period, but not "
+                    "the first or last hour"
+                ))
+                hourly_temp_matrix[s,(i - 6) + affected_hour] = six_hour_temp[s]
+        for s in np.nonzero(end_hour)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9912, old_data_value=six_hour_temp[s],
+                new_data_value=extrema[s],
+                explanation="The calculated 6-h max from the hourly "
+                "temperatures is greater than the reported "
+                "6-h max and this occured "
+                "at the first or last hour of the synoptic period."
+            ))
+        for s in np.nonzero(inner_hour)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9914, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The calculated 6-h max from the hourly "
+                "temperatures is greater than the reported "
+                "6-h max by 2 degrees or more on any hour except "
+                "the first or last hour of the synoptic period."
+            ))
+
+        six_hour_max_matrix[all_missing | out_of_tolerance | garbage | inner_hour, i] = MISSING_VALUE
+        six_hour_max_matrix[end_hour, i] = extrema[end_hour]
+
+    return errors
+
+
+def check_6hour_min_matrix(hourly_temp_matrix, six_hour_min_matrix,
+                           date_array, station_type):
+    """Runs check_6hour_min on every station of the [station, time] arrays
+    at once, looping over the synoptic periods rather than the hours.
+    Returns a list of the errors of each station.
+    """
+
+    num_stations = hourly_temp_matrix.shape[0]
+    errors = [[] for s in range(num_stations)]
+    for i, hours in synoptic_windows(date_array):
+        date = date_array[i]
+        tmp_6hours = hourly_temp_matrix[:,hours]
+        length = tmp_6hours.shape[1]
+
+        six_hour_temp = six_hour_min_matrix[:,i].copy()
+        is_auto = (station_type[:,i] >= 2) & (station_type[:,i] <= 8)
+        base_tolerance = np.where(is_auto, 8, 6)
+
+        # calc_special_min
+        present = tmp_6hours != MISSING_VALUE
+        extrema = tmp_6hours.min(axis=1)
+        temp_difference = extrema - six_hour_temp
+        num_missing = length - present.sum(axis=1)
+        is_index = present & (((temp_difference == -1)[:,None] & (tmp_6hours == extrema[:,None]))
+                              | (tmp_6hours - six_hour_temp[:,None] < -1))
+        num_indicies = is_index.sum(axis=1)
+        first = np.argmax(is_index, axis=1)
+        at_end = (first == 0) | (first == length - 1)
+        tolerance = base_tolerance + (2 * num_missing)
+
+        # Each station takes the first branch of check_6hour_min that applies
+        remaining = six_hour_temp != MISSING_VALUE
+        all_missing = remaining & (num_missing == length)
+        remaining &= ~all_missing
+        out_of_tolerance = remaining & ((extrema - six_hour_temp) > tolerance)
+        remaining &= ~out_of_tolerance
+        garbage = remaining & (temp_difference <= -2) & (num_indicies > 1)
+        remaining &= ~garbage
+        rounding = remaining & (((temp_difference == -1) & (num_indicies > 1))
+                                | ((temp_difference == -1) & (num_indicies == 1) & ~at_end))
+        remaining &= ~rounding
+        end_hour = remaining & (temp_difference < 0) & (num_indicies == 1) & at_end
+        remaining &= ~end_hour
+        inner_hour = remaining & (temp_difference <= -2) & ~at_end
+
+        for s in np.nonzero(out_of_tolerance)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9925, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The reported synoptic"
+                "6-h min is out of tolerance, "
+                "where tolerance is " + str(base_tolerance[s]) + "+(2*the "
+                "number of hours missing--" + str(num_missing[s]) + "+"
+                ") in the synoptic period. \n"
+                "reported 6h min   : " + str(six_hour_temp[s]) + "\n"
+                "calculated 6h min : " + str(extrema[s])
+            ))
+        for s in np.nonzero(garbage)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9921, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The calculated 6-h min from the hourly "
+                "temperatures is greater than the reported "
+                "6-h min by 2 degrees and this occured "
+                "more than once during the synoptic period."
+            ))
+        for s in np.nonzero(rounding)[0]:
+            # Correct hours that were affected
+            for affected_hour in np.nonzero(is_index[s])[0]:
+                errors[s].append(qc_error(
+                    date_of_error=date, error_code=9902,
+                    old_data_value=hourly_temp_matrix[s,(i - 6) + affected_hour],
+                    new_data_value=six_hour_temp[s],
+                    explanation="The calculated 6-h min from the hourly "
+                    "temperatures is greater than the reported "
+                    "6-h min by only one degree and this occured "
+                    "more than once during the period OR this "
+                    "occured only once during the period, but not "
+                    "the first or last hour"
+                ))
+                hourly_temp_matrix[s,(i - 6) + affected_hour] = six_hour_temp[s]
+        for s in np.nonzero(end_hour)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9922, old_data_value=six_hour_temp[s],
+                new_data_value=extrema[s],
+                explanation="The calculated 6-h min from the hourly "
+                "temperatures is greater than the reported "
+                "6-h min and this occured "
+                "at the first or last hour of the synoptic period."
+            ))
+        for s in np.nonzero(inner_hour)[0]:
+            errors[s].append(qc_error(
+                date_of_error=date,
+                error_code=9924, old_data_value=six_hour_temp[s],
+                new_data_value=MISSING_VALUE,
+                explanation="The calculated 6-h min from the hourly "
+                "temperatures is greater than the reported "
+                "6-h min by 2 degrees or more on any hour except "
+                "the first or last hour of the synoptic period."
+            ))
+
+        six_hour_min_matrix[all_missing | out_of_tolerance | garbage | inner_hour, i] = MISSING_VALUE
+        six_hour_min_matrix[end_hour, i] = extrema[end_hour]
+
+    return errors
+
+
+def check_dewpoint_matrix(dewpoint_matrix, temperature_matrix):
+    """Runs check_dewpoint on every row of the [station, time] arrays at
+    once and returns a list of the errors of each station.
+    """
+
+    errors = [[] for s in range(dewpoint_matrix.shape[0])]
+    present = dewpoint_matrix != MISSING_VALUE
+    dewpoint_depression = temperature_matrix - dewpoint_matrix
+    too_dry = present & (dewpoint_matrix < -30) & (dewpoint_depression > 15)
+    too_moist = present & (dewpoint_matrix > temperature_matrix)
+    for s, i in zip(*np.nonzero(too_dry | too_moist)):
+        dewpoint = dewpoint_matrix[s,i]
+        if too_dry[s,i]:
+            errors[s].append(qc_error(
+                date_of_error=int(i),
+                error_code=9800, old_data_value=dewpoint,
+                new_data_value=MISSING_VALUE,
+                explanation="dewpoint is less than -30 degrees "
+                "and the dewpoint depression is greater than 15 degrees"
+            ))
+        if too_moist[s,i]:
+            errors[s].append(qc_error(
+                date_of_error=int(i),
+                error_code=9803, old_data_value=dewpoint,
+                new_data_value=MISSING_VALUE,
+                explanation="dewpoint is greater than temperature "
+            ))
+    dewpoint_matrix[too_dry] = MISSING_VALUE
+    dewpoint_matrix[too_moist] = temperature_matrix[too_moist]
+
+    return errors
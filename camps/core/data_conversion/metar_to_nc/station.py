@@ -2,7 +2,9 @@ import logging
 from datetime import datetime
 from datetime import timedelta
 import pdb
+import numpy as np
 from . import enumerations
+from ... import Time
 from multiprocessing import Pool
 from multiprocessing.dummy import Pool as ThreadPool
 
@@ -133,10 +135,7 @@ class station:
     def get_epoch_time(self):
         """Return hours array as seconds since the epoch."""
 
-        epoch = datetime.utcfromtimestamp(0)
-
-        def unix_time(dt): return (dt - epoch).total_seconds()
-        return [unix_time(self.parse_hour_to_datetime(i)) for i in self.hours]
+        return Time.str_to_datetime64(self.hours).astype(np.int64)
 
 
     def get_season(self, string_return=True):
@@ -13,6 +13,7 @@ import pdb
 
 from ....registry import util as cfg
 from .metarreader import metarreader
+from .metarreader import columnar_metarreader
 
 from ... import util
 from ... import Time
@@ -28,7 +29,9 @@ Methods:
     scale_observation
     fix_rounding_errors
     convert_to_numpy
+    buffer_dates
     read_obs
+    read_obs_columnar
     write_call
     write_type
     write_time
@@ -150,23 +153,27 @@ def convert_to_numpy(station_list,obs_type='METAR'):
     return station_list
 
 
+def buffer_dates(dates):
+    """Returns dates with the buffers needed to perform QC. QC requires
+    25 hours before the first date and 2 hours after the last date.
+    """
+
+    start_buffer = Time.datetime_to_str(Time.str_to_datetime(dates[0])+timedelta(hours=-25))
+    start_buffer_range = util.generate_date_range(start_buffer+'-'+dates[0]+','+'1h')
+    end_buffer = Time.datetime_to_str(Time.str_to_datetime(dates[-1])+timedelta(hours=2))
+    end_buffer_range = util.generate_date_range(dates[-1]+'-'+end_buffer+','+'1h')
+
+    return start_buffer_range[:-1]+dates+end_buffer_range[1:]
+
+
 def read_obs(input_data,dates,stn_tbl,stn_lst,qc_flag):
     """Reads the observations from input."""
 
-    one_hour = timedelta(hours=1)
     reader = metarreader(stn_tbl,stn_lst,filename=input_data)
-    start_time = Time.str_to_datetime(dates[0])
-    end_time = Time.str_to_datetime(dates[-1])
 
-    # Apply the appropriate date buffers in order to perform QC.  QC requires 25 hours
-    # before the first date and 2 hours after the last date.
+    # Apply the appropriate date buffers in order to perform QC.
     if qc_flag:
-        start_buffer = Time.datetime_to_str(Time.str_to_datetime(dates[0])+timedelta(hours=-25))
-        start_buffer_range = util.generate_date_range(start_buffer+'-'+dates[0]+','+'1h')
-        end_buffer = Time.datetime_to_str(Time.str_to_datetime(dates[-1])+timedelta(hours=2))
-        end_buffer_range = util.generate_date_range(dates[-1]+'-'+end_buffer+','+'1h')
-        dates = start_buffer_range[:-1]+dates+end_buffer_range[1:]
-        number_of_timesteps = len(dates)
+        dates = buffer_dates(dates)
 
     # Iterate through the input file.  A check is performed to make we have enough
     # data on input.
@@ -190,6 +197,31 @@ def read_obs(input_data,dates,stn_tbl,stn_lst,qc_flag):
     return reader
 
 
+def read_obs_columnar(input_data,dates,stn_tbl,stn_lst,qc_flag):
+    """Reads the observations from input into [station, time] numpy
+    arrays. The observations of the returned reader's stations are rows
+    of these arrays, so no conversion to numpy is needed afterwards.
+    """
+
+    # Apply the appropriate date buffers in order to perform QC.
+    if qc_flag:
+        dates = buffer_dates(dates)
+
+    nc_definitions = cfg.read_nc_config()
+    data_types = {}
+    for predictor, nc_name in met_to_nc.items():
+        if nc_name in nc_definitions.variables and 'data_type' in nc_definitions.variables[nc_name]:
+            data_types[predictor] = get_data_type(predictor, nc_definitions)
+
+    reader = columnar_metarreader(stn_tbl,stn_lst,dates,data_types,filename=input_data)
+    reader.read_all()
+
+    # Post-process obs
+    reader.check_latlon()
+
+    return reader
+
+
 def write_call(stations, call_var):
 
     station_name_arr = []
@@ -265,6 +265,7 @@ def write_equations(filename, control, predictors, predictands, equations):
 
     # Write equations ordered lists and metadata of predictor variables (no data or dimensions).
     predictor_var = nc.createVariable('Equations_List', 'c', ('max_eq_terms','num_char_predictors'))
+    session = writer.WriteSession(nc)
     for n,predictor in enumerate(predictors):
         name_len = len(predictor.get_variable_name())
         entry_name = predictor.get_variable_name()+' '*(max_char_predictor-name_len)
@@ -277,7 +278,7 @@ def write_equations(filename, control, predictors, predictands, equations):
         predictor.dimensions = [] #remove data dimensions
         if 'filepath' in predictor.metadata.keys():
             filepath = predictor.metadata.pop('filepath')
-        var = predictor.write_to_nc(nc)
+        var = predictor.write_to_nc(nc, session=session)
     predictor_var[-1] = "Equation_Constant"+' '*(max_char_predictor-len("Equation_Constant"))
     pred_list = predictor_var[:-1]
     setattr(predictor_var,'PROV__entity','StatPP__Methods/Stat/OrdrdInpt')
@@ -0,0 +1,248 @@
+import numpy as np
+import logging
+
+
+"""Module: lazy_array.py
+
+Classes:
+    LazyArray
+        Methods:
+            __init__
+            shape
+            ndim
+            size
+            nbytes
+            subset
+            orthogonal_key
+            read
+            is_read
+            __getitem__
+            __array__
+            __len__
+            __getattr__
+            __repr__
+"""
+
+
+class LazyArray(object):
+    """Data of a netCDF4 variable that is read from the file only when it is
+    first needed.
+
+    A LazyArray holds the filepath and name of the variable and the pending
+    index of each of its dimensions. Slicing it does not read the file, but
+    composes the slice with the pending index and returns a new LazyArray, so
+    only the part of the variable that is finally used is read. The file is
+    reopened through reader.file_pool when the data is read, so the LazyArray
+    stays valid after its file handle has been closed, and it can be pickled.
+
+    Each pending index is an int, which drops its dimension, a range, or an
+    increasing or unordered array of indices.
+
+    Attributes:
+        filepath (str): Filepath to the source netCDF4 file.
+        name (str): Name of the netCDF4 variable.
+        key (list): Pending index of each dimension of the variable.
+        dtype (:obj:`numpy.dtype`): Data type of the variable.
+    """
+
+    def __init__(self, filepath, nc_var, key=None):
+        """Initializes the LazyArray of the netCDF4 variable nc_var of the
+        file filepath, subset by the orthogonal index key if given.
+        """
+
+        self.filepath = filepath
+        self.name = nc_var.name
+        self.dtype = nc_var.dtype
+        self.key = [range(size) for size in nc_var.shape]
+        self._data = None
+        if key is not None:
+            self.key = self.subset(key).key
+
+
+    @property
+    def shape(self):
+        return tuple(len(k) for k in self.key if not isinstance(k, int))
+
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+
+    @property
+    def nbytes(self):
+        return self.size*np.dtype(self.dtype).itemsize
+
+
+    def subset(self, key):
+        """Returns a new LazyArray of the data indexed by key, without reading
+        it. Each element of key indexes one dimension of the data, in the
+        order of its dimensions, independently of the others: an int, a slice,
+        or a sequence of indices or booleans. Missing trailing elements select
+        the whole dimension.
+        """
+
+        if self._data is not None:
+            raise ValueError("LazyArray has already been read; index its data instead")
+        if not isinstance(key, (list, tuple)):
+            key = [key]
+        key = list(key)
+        if len(key) > self.ndim:
+            raise IndexError("too many indices for LazyArray of shape "+str(self.shape))
+        key = key + [slice(None)]*(self.ndim-len(key))
+
+        new_key = []
+        dims = iter(key)
+        for pending in self.key:
+            if isinstance(pending, int):
+                new_key.append(pending)
+                continue
+            k = next(dims)
+            if isinstance(k, (int, np.integer)):
+                new_key.append(int(pending[int(k)]))
+            elif isinstance(k, slice):
+                new_key.append(pending[k])
+            else:
+                k = np.asarray(k)
+                if k.dtype == bool:
+                    if k.shape != (len(pending),):
+                        raise IndexError("boolean index does not match dimension of length "+str(len(pending)))
+                    k = np.flatnonzero(k)
+                if k.ndim != 1:
+                    raise IndexError("only 1-dimensional index sequences can be applied to a LazyArray")
+                if isinstance(pending, range):
+                    pending = np.arange(pending.start, pending.stop, pending.step)
+                new_key.append(pending[k.astype(int)])
+
+        # Ranges that step backwards are kept as index arrays so they are
+        # read as increasing runs.
+        new_key = [np.arange(k.start, k.stop, k.step) if isinstance(k, range) and k.step < 0 else k
+                   for k in new_key]
+        lazy = LazyArray.__new__(LazyArray)
+        lazy.filepath = self.filepath
+        lazy.name = self.name
+        lazy.dtype = self.dtype
+        lazy.key = new_key
+        lazy._data = None
+        return lazy
+
+
+    def orthogonal_key(self, key):
+        """Returns key as a list for subset if indexing the data with key
+        by the NumPy rules gives the same result as indexing each dimension
+        independently, as subset does. Otherwise returns None.
+        """
+
+        if not isinstance(key, tuple):
+            key = (key,)
+        ellipses = [i for i,k in enumerate(key) if k is Ellipsis]
+        if any(k is None for k in key) or len(ellipses) > 1:
+            return None
+        if ellipses:
+            i = ellipses[0]
+            key = key[:i] + (slice(None),)*(self.ndim-len(key)+1) + key[i+1:]
+        scalars = [k for k in key if isinstance(k, (int, np.integer))]
+        arrays = [k for k in key if not isinstance(k, (int, np.integer, slice))]
+        # NumPy broadcasts several index sequences together, and may move the
+        # dimension of a sequence combined with ints to the front.
+        if len(arrays) > 1 or (arrays and scalars):
+            return None
+        for k in arrays:
+            if isinstance(k, np.ndarray) and k.ndim != 1:
+                return None
+            if isinstance(k, (list, tuple)) and any(isinstance(i, (list, tuple, np.ndarray)) for i in k):
+                return None
+        return list(key)
+
+
+    def read(self):
+        """Reads the pending part of the variable from the file, once, and
+        returns it as the masked array netCDF4 would.
+        """
+
+        if self._data is not None:
+            return self._data
+        from .reader import file_pool, read_hyperslab, index_to_slices
+
+        logging.debug("Reading "+self.name+" from "+self.filepath)
+        nc_var = file_pool.dataset(self.filepath).variables[self.name]
+        if self.size == 0:
+            self._data = np.ma.zeros(self.shape, dtype=self.dtype)
+            return self._data
+
+        # The first index array is read as one hyperslab per run of indices.
+        # The others are read as the hyperslab spanning them and then taken,
+        # so each read covers whole runs of the first.
+        key = []
+        takes = []
+        axis = 0
+        for k in self.key:
+            if isinstance(k, range):
+                key.append(slice(k.start, k.stop, k.step))
+            elif isinstance(k, np.ndarray) and any(isinstance(j, list) for j in key):
+                slices = index_to_slices(k)
+                if len(slices) == 1:
+                    key.append(slices[0])
+                else:
+                    low = int(k.min())
+                    key.append(slice(low, int(k.max())+1))
+                    takes.append((axis, k-low))
+            elif isinstance(k, np.ndarray):
+                key.append(list(k))
+            else:
+                key.append(k)
+            if not isinstance(k, int):
+                axis += 1
+        data = read_hyperslab(nc_var, key)
+        for axis,indices in takes:
+            data = data.take(indices, axis=axis)
+
+        self._data = data
+        return self._data
+
+
+    def is_read(self):
+        """Returns True if the data has been read from the file."""
+
+        return self._data is not None
+
+
+    def __getitem__(self, key):
+        """Indexes the data. Before the data is read, a key that indexes each
+        dimension independently returns a new LazyArray; any other key reads
+        the data and indexes it.
+        """
+
+        if self._data is None:
+            orthogonal = self.orthogonal_key(key)
+            if orthogonal is not None:
+                return self.subset(orthogonal)
+        return self.read()[key]
+
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.ma.getdata(self.read())
+        if dtype is not None:
+            return data.astype(dtype)
+        return data
+
+
+    def __len__(self):
+        return self.shape[0]
+
+
+    def __getattr__(self, name):
+        """Delegates other array attributes and methods to the read data."""
+
+        if name.startswith('_') or name in ('filepath', 'name', 'key', 'dtype'):
+            raise AttributeError(name)
+        return getattr(self.read(), name)
+
+
+    def __repr__(self):
+        return "LazyArray(" + self.filepath + ":" + self.name + ", shape=" + str(self.shape) + ")"
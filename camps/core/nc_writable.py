@@ -7,6 +7,9 @@ ABC = abc.ABCMeta('ABC', (object,), {'__slots__': ()})
 
 class nc_writable(ABC):
 
+    # Empty, so subclasses that declare __slots__ have no instance __dict__.
+    __slots__ = ()
+
     @abc.abstractmethod
     def write_to_nc(self, nc_handle):
         """Abstract method to write a netCDF Variable to the nc_handle
@@ -4,9 +4,13 @@ from netCDF4 import Dataset
 import pdb
 import logging
 import copy
+import threading
+import pickle
+from collections import OrderedDict
 
 from . import Time
 from .Camps_data import Camps_data
+from .lazy_array import LazyArray
 from .Process import Process
 from .Location import Location
 from ..registry import constants as const
@@ -17,9 +21,19 @@ from ..registry import constants as const
 Methods:
     read
     read_var
+    read_var_batch
+    read_nc_var
+    add_process_attributes
+    get_shared_time
+    get_shared_attributes
+    get_shared_coordinate
     get_var
+    configure_index
+    get_index
     get_location
     subset_time
+    read_hyperslab
+    index_to_slices
     create_time
     get_procedures
     get_times
@@ -27,11 +41,334 @@ Methods:
     removeTime
     get_metadata
     parse_list_attribute_string
+
+Classes:
+    FileHandlePool
+    CoordinateData
+    MetadataIndex
 """
 
 
 ancil_name = 'ancillary_variables'
-file_cache = {}
+
+
+class FileHandlePool(object):
+    """Bounded pool of open netCDF4.Dataset handles with least recently used
+    eviction.
+
+    Each open file has an entry dict holding its 'filehandle' along with any
+    per-file state cached by the reader, such as its 'location'. When opening
+    a file would exceed max_open_files, or the total size of the open files
+    would exceed max_bytes, the least recently used handles are closed.
+
+    Attributes:
+        max_open_files (int): Maximum number of open handles.
+        max_bytes (int): Maximum total on-disk size of the open files, or
+                None for no limit.
+        hits (int): Number of requests served by an open handle.
+        misses (int): Number of requests that opened a file.
+        evictions (int): Number of handles closed to stay within the limits.
+    """
+
+
+    def __init__(self, max_open_files=32, max_bytes=None):
+        self.max_open_files = max_open_files
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+
+    def configure(self, max_open_files=None, max_bytes=None):
+        """Changes the pool limits, evicting handles if needed."""
+
+        with self._lock:
+            if max_open_files is not None:
+                self.max_open_files = max_open_files
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+
+    def get(self, filepath):
+        """Returns the entry dict for filepath, opening the file if needed."""
+
+        with self._lock:
+            if filepath in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(filepath)
+                return self._entries[filepath]
+
+            self.misses += 1
+            nc = Dataset(filepath, mode='r', format="NETCDF4")
+            try:
+                nbytes = os.path.getsize(filepath)
+            except OSError:
+                nbytes = 0
+            entry = {'filehandle' : nc, 'nbytes' : nbytes}
+            self._entries[filepath] = entry
+            self.nbytes += nbytes
+            self._evict(keep=filepath)
+            return entry
+
+
+    def dataset(self, filepath):
+        """Returns an open netCDF4.Dataset for filepath."""
+
+        return self.get(filepath)['filehandle']
+
+
+    def close(self, filepath):
+        """Closes the handle for filepath if it is open."""
+
+        with self._lock:
+            entry = self._entries.pop(filepath, None)
+            if entry is not None:
+                self._close_entry(entry)
+
+
+    def close_all(self):
+        """Closes every open handle."""
+
+        with self._lock:
+            while self._entries:
+                filepath, entry = self._entries.popitem(last=False)
+                self._close_entry(entry)
+
+
+    def stats(self):
+        """Returns a dict of the pool counters."""
+
+        return {'open_files' : len(self._entries), 'nbytes' : self.nbytes,
+                'hits' : self.hits, 'misses' : self.misses, 'evictions' : self.evictions}
+
+
+    def _evict(self, keep=None):
+        """Closes least recently used handles until within the limits.
+        The handle for keep is never closed.
+        """
+
+        def over_limit():
+            if len(self._entries) > self.max_open_files:
+                return True
+            return self.max_bytes is not None and self.nbytes > self.max_bytes
+
+        for filepath in list(self._entries.keys()):
+            if not over_limit():
+                break
+            if filepath == keep:
+                continue
+            entry = self._entries.pop(filepath)
+            self._close_entry(entry)
+            self.evictions += 1
+            logging.debug("Evicted netCDF handle for " + filepath)
+
+
+    def _close_entry(self, entry):
+        self.nbytes -= entry['nbytes']
+        try:
+            entry['filehandle'].close()
+        except RuntimeError:
+            pass # Already closed
+
+
+    def __contains__(self, filepath):
+        return filepath in self._entries
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_all()
+
+
+class CoordinateData(object):
+    """In-memory copy of a netCDF4 coordinate variable. Locations hold these
+    rather than netCDF4 Variables so they remain usable after the file handle
+    they were read from is closed.
+    """
+
+
+    def __init__(self, nc_variable):
+        self.name = nc_variable.name
+        self.dimensions = nc_variable.dimensions
+        self.data = nc_variable[:]
+        self.attributes = {a : nc_variable.getncattr(a) for a in nc_variable.ncattrs()}
+
+
+    def ncattrs(self):
+        return list(self.attributes.keys())
+
+
+    def getncattr(self, name):
+        return self.attributes[name]
+
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+    def __len__(self):
+        return len(self.data)
+
+
+file_pool = FileHandlePool()
+
+
+class MetadataIndex(object):
+    """In-memory index of the vertical coordinates and primary variables of
+    a netCDF4 file. get_var uses it to resolve requests with dictionary
+    lookups instead of scanning every variable and attribute in the file.
+
+    Attributes:
+        levels (dict): Names of single level coordinates keyed by (units, value).
+        layers (dict): Names of 'pressure layer bounds' coordinates keyed by
+                (units, value1, value2).
+        variables (dict): Records of primary variables keyed by
+                (SOSA__observedProperty, vertical_coord). Each record is a
+                dict holding the variable 'name' and any of its 'leadtime',
+                'hours' and 'cell_methods' attributes.
+    """
+
+    version = 1
+    suffix = '.camps_index'
+    record_attributes = ['leadtime', 'hours', 'cell_methods']
+
+
+    def __init__(self, nc=None):
+        self.levels = {}
+        self.layers = {}
+        self.variables = {}
+        if nc is not None:
+            self.build(nc)
+
+
+    def build(self, nc):
+        """Scans the variables and attributes of nc once."""
+
+        primary = set(nc.getncattr('primary_variables').split())
+        for name,nc_var in nc.variables.items():
+            attrs = nc_var.__dict__
+            if attrs.get('axis') == 'Z' and 'units' in attrs:
+                units = attrs['units']
+                if attrs.get('long_name') == 'pressure layer bounds':
+                    value = np.ma.getdata(nc_var[:])
+                    key = (units, value[0,0].item(), value[0,1].item())
+                    self.layers.setdefault(key, []).append(name)
+                elif nc_var.size == 1:
+                    key = (units, np.ma.getdata(nc_var[:]).ravel()[0].item())
+                    self.levels.setdefault(key, []).append(name)
+            if name not in primary:
+                continue
+            try:
+                key = (attrs['SOSA__observedProperty'], attrs[const.VERT_COORD])
+            except KeyError:
+                continue
+            record = {'name' : name}
+            for attr in self.record_attributes:
+                if attr in attrs:
+                    record[attr] = attrs[attr]
+            self.variables.setdefault(key, []).append(record)
+
+
+    def find_levels(self, units, value1, value2=None):
+        """Returns names of vertical coordinates matching units and value(s)."""
+
+        if value2 is None:
+            return self.levels.get((units, value1), [])
+        return self.layers.get((units, value1, value2), [])
+
+
+    def find_variables(self, observed_property, vert_coord, **attributes):
+        """Returns names of primary variables matching the observed property,
+        vertical coordinate and remaining attribute values.
+        """
+
+        names = []
+        for record in self.variables.get((observed_property, vert_coord), []):
+            if all(k in record and record[k] == v for k,v in attributes.items()):
+                names.append(record['name'])
+        return names
+
+
+    def save(self, path, source):
+        """Writes the index to a sidecar file, tagged with the size and
+        modification time of the source file.
+        """
+
+        stat = os.stat(source)
+        state = {'version' : self.version, 'size' : stat.st_size, 'mtime' : stat.st_mtime,
+                 'levels' : self.levels, 'layers' : self.layers, 'variables' : self.variables}
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump(state, f)
+        except (IOError, OSError) as err:
+            logging.warning("Could not write metadata index " + path + ": " + str(err))
+
+
+    @classmethod
+    def load(cls, path, source):
+        """Reads an index from a sidecar file. Returns None if the sidecar
+        does not exist or is out of date with the source file.
+        """
+
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+        except (IOError, OSError, pickle.UnpicklingError, EOFError):
+            return None
+        stat = os.stat(source)
+        if state.get('version') != cls.version or state.get('size') != stat.st_size \
+                or state.get('mtime') != stat.st_mtime:
+            return None
+        index = cls()
+        index.levels = state['levels']
+        index.layers = state['layers']
+        index.variables = state['variables']
+        return index
+
+
+index_cache = {}
+index_sidecar = False
+
+
+def configure_index(sidecar=False):
+    """Sets whether metadata indexes are persisted as sidecar files next to
+    the netCDF files they describe, so later runs can skip the scan.
+    """
+
+    global index_sidecar
+    index_sidecar = sidecar
+
+
+def get_index(filepath):
+    """Returns the MetadataIndex for filepath, building it the first time
+    the file is used.
+    """
+
+    if filepath in index_cache:
+        return index_cache[filepath]
+
+    index = None
+    sidecar = filepath + MetadataIndex.suffix
+    if index_sidecar:
+        index = MetadataIndex.load(sidecar, filepath)
+    if index is None:
+        index = MetadataIndex(file_pool.dataset(filepath))
+        if index_sidecar:
+            index.save(sidecar, filepath)
+    index_cache[filepath] = index
+    return index
+
 
 def read(*filenames):
     """This function reads the netCDF4 files in an inputted list and
@@ -53,11 +390,10 @@ def read(*filenames):
 
     variables_dict = {}
     for filename in filenames:
-        nc = Dataset(filename, mode='r', format="NETCDF4")
+        nc = file_pool.dataset(filename)
         variables_dict = nc.variables
 
         primary_list = nc.primary_variables.split()
-        nc.close()
         for var_name in primary_list:
             if var_name in ['x','y','latitude','longitude','station'] or 'grid' in var_name:
                 w_obj = Camps_data(var_name)
@@ -90,14 +426,10 @@ def read_var(filepath, name=None, lead_time=None, forecast_time=None, retrieve_m
         w_obj (Camps_data)
     """
 
-    #Handle caching of the filehandle, so you don't need to open/close many times.
-    if filepath in file_cache:
-        nc = file_cache[filepath]['filehandle']
-    else:
-        nc = Dataset(filepath, mode='r', format="NETCDF4")
-        file_cache[filepath] = {'filehandle':nc}
+    #Handles are kept open in the file pool, so you don't need to open/close many times.
+    nc = file_pool.dataset(filepath)
 
-    if name is None: nc_vars = get_var(nc, metadata_dict)
+    if name is None: nc_vars = get_var(nc, metadata_dict, get_index(filepath))
     else: nc_vars = [nc.variables[name]]
 
     if nc_vars is None: return None
@@ -105,151 +437,265 @@ def read_var(filepath, name=None, lead_time=None, forecast_time=None, retrieve_m
     elif len(nc_vars)>1 and retrieve_mult!=True:
         logging.error("more than 1 variable returned in get_var. Check desired metadata")
         raise ValueError
+    #If lead_time is not None then it needs to be in seconds here
+    if lead_time is not None:
+        lead_time = lead_time*3600
+
     w_objs = []
     for nc_var in nc_vars:
-        logging.info("Retrieving "+nc_var.name) 
-        #If lead_time is not None then it needs to be in seconds here
-        if lead_time is not None:
-            lead_time = lead_time*3600
+        w_obj = read_nc_var(filepath, nc, nc_var, lead_time, forecast_time)
+        if w_obj is None: return None
+        w_objs.append(w_obj)
 
-        ancil_vars = nc_var.getncattr(ancil_name).split(' ')
-        aux_coord_vars = nc_var.getncattr(const.COORD).split(' ')
+    if len(w_objs)==1: return w_objs[0]
+    elif len(w_objs)>1 and retrieve_mult==True: return w_objs
 
-        name = nc_var.getncattr("SOSA__observedProperty")
-        w_obj = Camps_data(name, autofill=False)
 
-        #Fill metadata dictionary
-        metadata_exceptions = ['_FillValue']
-        metadata_keys = nc_var.ncattrs()
-        for key in metadata_keys:
-            if key not in metadata_exceptions:
-                value = nc_var.getncattr(key)
-                w_obj.add_metadata(key, value)
+def read_var_batch(filepath, requests, lead_time=None, forecast_time=None):
+    """Constructs Camps_data objects for many primary netCDF4 variables of the
+    same file in one call. The file's metadata index, Location, time variables
+    and procedure attributes are parsed once and shared by all the requests,
+    and the data of each variable is read with a single hyperslab read.
 
-        #Fill in list of preprocesses from two sources: the read variable's
-        #preprocesses and processes
-        try:
-            p_string = nc_var.getncattr('PROV__wasInformedBy')
-            procedures = parse_list_attribute_string(p_string)
-            for ip, p in enumerate(procedures):
-                p = str(p)
-                w_obj.add_preprocess(p)
-                attributes = nc.variables[p].ncattrs()
-                for attr in attributes:
-                    if attr not in list(w_obj.preprocesses[ip].attributes.keys()):
-                        w_obj.preprocesses[ip].add_attribute(attr, nc.variables[p].getncattr(attr))
-        except AttributeError:
-            pass
-        p_string = nc_var.getncattr('SOSA__usedProcedure')
+    Args:
+        filepath (str): Filepath to source netCDF4 file.
+        requests (dict): Maps a key chosen by the caller to the search metadata
+            of a variable, as it would be passed to read_var as keyword arguments.
+            The metadata may instead hold the exact 'name' of the variable, and
+            may hold the 'lead_time' of that request.
+        lead_time (optional, int): lead time in hours applied to every request
+            that does not set its own.
+        forecast_time (optional, int or list): forecast reference time(s) in epoch
+            seconds applied to every request.
+
+    Returns:
+        (dict): The Camps_data object, or None if not found, for each key in requests.
+    """
+
+    nc = file_pool.dataset(filepath)
+    index = get_index(filepath)
+
+    shared = {}
+    w_objs = {}
+    for key,metadata_dict in requests.items():
+        request_lead = metadata_dict.get('lead_time', lead_time)
+        if 'lead_time' in metadata_dict:
+            metadata_dict = {k : v for k,v in metadata_dict.items() if k != 'lead_time'}
+        if request_lead is not None:
+            request_lead = request_lead*3600
+        if 'name' in metadata_dict:
+            nc_vars = [nc.variables[metadata_dict['name']]]
+        else:
+            nc_vars = get_var(nc, metadata_dict, index)
+        if not nc_vars:
+            w_objs[key] = None
+            continue
+        if len(nc_vars)>1:
+            logging.error("more than 1 variable returned in get_var. Check desired metadata")
+            raise ValueError
+        w_objs[key] = read_nc_var(filepath, nc, nc_vars[0], request_lead, forecast_time, shared)
+
+    return w_objs
+
+
+def read_nc_var(filepath, nc, nc_var, lead_time=None, forecast_time=None, shared=None):
+    """Constructs and returns a Camps_data object of the primary netCDF4
+    variable nc_var, or None if the requested times are not found.
+
+    Args:
+        filepath (str): Filepath to source netCDF4 file.
+        nc (:obj:`NetCDF4.Dataset`): Open source netCDF4 file.
+        nc_var (:obj:`NetCDF4.Dataset.Variable`): Variable to read.
+        lead_time (optional, int): lead time in seconds.
+        forecast_time (optional, int or list): forecast reference time(s) in epoch seconds.
+        shared (optional, dict): Parsed time variables, coordinates and procedure
+            attributes of nc that may be reused between calls.
+
+    Returns:
+        w_obj (Camps_data)
+    """
+
+    logging.info("Retrieving "+nc_var.name)
+    if shared is None:
+        shared = {}
+
+    ancil_vars = nc_var.getncattr(ancil_name).split(' ')
+    aux_coord_vars = nc_var.getncattr(const.COORD).split(' ')
+
+    name = nc_var.getncattr("SOSA__observedProperty")
+    w_obj = Camps_data(name, autofill=False)
+
+    #Fill metadata dictionary
+    metadata_exceptions = ['_FillValue']
+    metadata_keys = nc_var.ncattrs()
+    for key in metadata_keys:
+        if key not in metadata_exceptions:
+            value = nc_var.getncattr(key)
+            w_obj.add_metadata(key, value)
+
+    #Fill in list of preprocesses from two sources: the read variable's
+    #preprocesses and processes
+    try:
+        p_string = nc_var.getncattr('PROV__wasInformedBy')
         procedures = parse_list_attribute_string(p_string)
         for ip, p in enumerate(procedures):
             p = str(p)
             w_obj.add_preprocess(p)
-            attributes = nc.variables[p].ncattrs()
-            for attr in attributes:
-                if attr not in list(w_obj.preprocesses[ip].attributes.keys()):
-                    w_obj.preprocesses[ip].add_attribute(attr, nc.variables[p].getncattr(attr))
-
-        #Grab the netCDF4 time variables and then, create and insert time
-        #objects into the camps data object.
-        t_names = []
-        for v in ancil_vars:
-            if 'Time' in v or '_time' in v:
-                nc_time = nc.variables[v]
-                t_obj = create_time(nc_time, lead_time, forecast_time)
-                w_obj.time.append(t_obj)
-                t_names.append(t_obj.name)
-
-        #Check if lead_time is in the LeadTime object for a forecast
-        #netCDF4 variable.  But first check if forecast reference time exists.
-        #If either do not, return None.
-        if forecast_time is not None and w_obj.is_model():
-            i = t_names.index('FcstRefTime')
-            if isinstance(forecast_time,list):
-                j = np.where(np.isin(w_obj.time[i].data[:],forecast_time))[0]
-                if len(j)==0:
-                    logging.info("Specified forecast reference times not found.")
-                    return None
-            else:
-                try:
-                    j = list(w_obj.time[i].data[:]).index(forecast_time)
-                except ValueError:
-                    logging.info("Specified forecast reference time not found.")
-                    return None
-            if lead_time is not None:
-                i = t_names.index('lead_times')
-                try:
-                    j = list(w_obj.time[i].data[:]).index(lead_time)
-                except ValueError:
-                    logging.info("Specified lead time not found")
-                    return None
-
-        #Get coordinates
-        coord_vars = []
-        try:
-            coord_vars = [x.strip(' ') for x in nc_var.getncattr('coordinates').split(' ')]
-        except:
-            pass # No coordinate attribute in nc_var
-
-        #Get locations, be it stations or gridpoints.
-        location = get_location(filepath, nc, coord_vars)
-        w_obj.location = location
-        #Fill out the camps data objects properties dictionary.
-        try:
-            nc_coord = nc.variables[w_obj.vertical_coord]
-        except:
-            logging.warning("can't find vertical coordinate information for " + w_obj.name)
-        try: #first treat as bounded level, will error out if it is a single level
-            w_obj.properties['coord_val1'] = np.array(nc_coord[:].data[0][0])
-            w_obj.properties['coord_val2'] = np.array(nc_coord[:].data[0][1])
-        except: #if it is not bounded then it is a single level
-            w_obj.properties['coord_val'] = nc_coord[0]
-
-        #If 'hours' is an attribute of the netCDF4 variable,
-        #insert its key/value pair into the properties dictionary
-        #of the camps data object.
-        if 'hours' in metadata_keys:
-            value = nc_var.getncattr('hours')
-            w_obj.properties['hours'] = value
-
-        #'leadtime' is an attribute of a forecast netCDF4 variable.
-        #Insert its key/value pair into the properties dictionary
-        #of the camps data object.
-        if 'leadtime' in metadata_keys:
-            value = nc_var.getncattr('leadtime')
-            w_obj.properties['reserved2'] = value
-        #----------------------------------------------------------------------------------------
-
-        #Add Dimensions.  Must be added before the data is added.
-        w_obj.dimensions = list(nc_var.dimensions) #change to list so we can edit this
-
-        #Store the netCDF4 variable data.  If lead time or forecast reference time exist,
-        #slice along that time before storing in the camps data object.
-        if lead_time is None and forecast_time is None:
-            w_obj.data = nc_var[:]
+            add_process_attributes(w_obj.preprocesses, ip, get_shared_attributes(nc, p, shared))
+    except AttributeError:
+        pass
+    p_string = nc_var.getncattr('SOSA__usedProcedure')
+    procedures = parse_list_attribute_string(p_string)
+    for ip, p in enumerate(procedures):
+        p = str(p)
+        w_obj.add_preprocess(p)
+        add_process_attributes(w_obj.preprocesses, ip, get_shared_attributes(nc, p, shared))
+
+    #Grab the netCDF4 time variables and then, create and insert time
+    #objects into the camps data object.
+    t_names = []
+    for v in ancil_vars:
+        if 'Time' in v or '_time' in v:
+            t_obj = get_shared_time(nc, v, shared)
+            w_obj.time.append(t_obj)
+            t_names.append(t_obj.name)
+
+    #Check if lead_time is in the LeadTime object for a forecast
+    #netCDF4 variable.  But first check if forecast reference time exists.
+    #If either do not, return None.
+    if forecast_time is not None and w_obj.is_model():
+        i = t_names.index('FcstRefTime')
+        if isinstance(forecast_time,list):
+            j = np.where(np.isin(w_obj.time[i].data[:],forecast_time))[0]
+            if len(j)==0:
+                logging.info("Specified forecast reference times not found.")
+                return None
         else:
-            w_obj = subset_time(w_obj, nc_var, lead_time, forecast_time)
+            try:
+                j = list(w_obj.time[i].data[:]).index(forecast_time)
+            except ValueError:
+                logging.info("Specified forecast reference time not found.")
+                return None
+        if lead_time is not None:
+            i = t_names.index('lead_times')
+            try:
+                j = list(w_obj.time[i].data[:]).index(lead_time)
+            except ValueError:
+                logging.info("Specified lead time not found")
+                return None
+
+    #Get coordinates
+    coord_vars = []
+    try:
+        coord_vars = [x.strip(' ') for x in nc_var.getncattr('coordinates').split(' ')]
+    except:
+        pass # No coordinate attribute in nc_var
 
-        w_objs.append(w_obj)
+    #Get locations, be it stations or gridpoints.
+    location = get_location(filepath, nc, coord_vars)
+    w_obj.location = location
+    #Fill out the camps data objects properties dictionary.
+    try:
+        nc_coord = nc.variables[w_obj.vertical_coord]
+    except:
+        logging.warning("can't find vertical coordinate information for " + w_obj.name)
+    try: #first treat as bounded level, will error out if it is a single level
+        coord_data = get_shared_coordinate(nc_coord, shared)
+        w_obj.properties['coord_val1'] = np.array(coord_data.data[0][0])
+        w_obj.properties['coord_val2'] = np.array(coord_data.data[0][1])
+    except: #if it is not bounded then it is a single level
+        w_obj.properties['coord_val'] = nc_coord[0]
+
+    #If 'hours' is an attribute of the netCDF4 variable,
+    #insert its key/value pair into the properties dictionary
+    #of the camps data object.
+    if 'hours' in metadata_keys:
+        value = nc_var.getncattr('hours')
+        w_obj.properties['hours'] = value
+
+    #'leadtime' is an attribute of a forecast netCDF4 variable.
+    #Insert its key/value pair into the properties dictionary
+    #of the camps data object.
+    if 'leadtime' in metadata_keys:
+        value = nc_var.getncattr('leadtime')
+        w_obj.properties['reserved2'] = value
+    #----------------------------------------------------------------------------------------
+
+    #Add Dimensions.  Must be added before the data is added.
+    w_obj.dimensions = list(nc_var.dimensions) #change to list so we can edit this
+
+    #Store the netCDF4 variable data lazily; it is read on first access.  If lead time
+    #or forecast reference time exist, slice along that time before storing in the camps
+    #data object.
+    w_obj.data = LazyArray(filepath, nc_var)
+    if lead_time is not None or forecast_time is not None:
+        w_obj = subset_time(w_obj, nc_var, lead_time, forecast_time)
+
+    return w_obj
+
+
+def add_process_attributes(processes, i, attributes):
+    """Adds the attributes that processes[i] does not have yet to it. The
+    process is interned and shared, so it is replaced in processes by the
+    interned Process with the added attributes.
+    """
 
-    if len(w_objs)==1: return w_objs[0]
-    elif len(w_objs)>1 and retrieve_mult==True: return w_objs
+    process = processes[i]
+    added = {attr:value for attr,value in attributes.items() if attr not in process.attributes}
+    if added:
+        processes[i] = process.with_attributes(**added)
+
+
+def get_shared_time(nc, name, shared):
+    """Returns a copy of the Time object for the netCDF4 time variable name,
+    creating it only the first time it is requested for shared.
+    """
 
+    times = shared.setdefault('times', {})
+    if name not in times:
+        times[name] = create_time(nc.variables[name])
+    t_obj = copy.copy(times[name])
+    t_obj.data = t_obj.data.copy()
+    t_obj.metadata = t_obj.metadata.copy()
+    return t_obj
+
+
+def get_shared_attributes(nc, name, shared):
+    """Returns the attributes of the netCDF4 variable name as a dict,
+    reading them only the first time they are requested for shared.
+    """
+
+    attributes = shared.setdefault('attributes', {})
+    if name not in attributes:
+        attributes[name] = nc.variables[name].__dict__
+    return attributes[name]
+
+
+def get_shared_coordinate(nc_coord, shared):
+    """Returns the data of the netCDF4 coordinate variable nc_coord,
+    reading it only the first time it is requested for shared.
+    """
+
+    coords = shared.setdefault('coords', {})
+    if nc_coord.name not in coords:
+        coords[nc_coord.name] = nc_coord[:]
+    return coords[nc_coord.name]
 
 
 # Function to retrieve a desired variable based on supplied metadata
-def get_var(nc, metadata_dict):
+def get_var(nc, metadata_dict, index=None):
     """ Retrieve variables from netcdf dataset object (nc) based on supplied
-    metadata (metadata_dict).
+    metadata (metadata_dict). The variables are looked up in index, the
+    MetadataIndex of nc, which is built if not supplied.
     """
 
+    if index is None:
+        index = MetadataIndex(nc)
+
     if 'vert_coord2' not in metadata_dict.keys():
-        levs = nc.get_variables_by_attributes(units=metadata_dict['vert_units'],axis='Z')
-        levs = [lev for lev in levs if lev.size==1]
-        levs = [lev.name for lev in levs if lev[:]==metadata_dict['vert_coord1']]
+        levs = index.find_levels(metadata_dict['vert_units'], metadata_dict['vert_coord1'])
     else:
-        levs = nc.get_variables_by_attributes(units=metadata_dict['vert_units'],axis='Z',long_name='pressure layer bounds')
-        levs = [lev.name for lev in levs if lev[0,0]==metadata_dict['vert_coord1'] and lev[0,1]==metadata_dict['vert_coord2']]
+        levs = index.find_levels(metadata_dict['vert_units'], metadata_dict['vert_coord1'], metadata_dict['vert_coord2'])
 
     # Construct a coordinate attribute string based on determined level and whether desired variable is grid or station data
     if len(levs)==0: return None
@@ -258,41 +704,32 @@ def get_var(nc, metadata_dict):
         raise ValueError
     vert_coord = levs[0]
 
-    # Create dictionary to populate with search criteria for get_variables_by attributes function
+    # Create dictionary to populate with search criteria other than the observed property and the coordinates
     variable_search_dict = {}
-    variable_search_dict['SOSA__observedProperty'] = metadata_dict['property']
-    variable_search_dict[const.VERT_COORD] = vert_coord
     if 'reserved2' in metadata_dict.keys():
         variable_search_dict['leadtime'] = metadata_dict['reserved2']
 
     # Search for desired variable based on the observed Property, the coordinates, and the duration.
-    #if 'duration_method' in metadata_dict.keys():
-    #    variable_search_dict['hours']=metadata_dict['duration']
-    #    variable_search_dict['cell_methods']='default_time_coordinate_size: '+metadata_dict['duration_method']
-    #    potential_variables = nc.get_variables_by_attributes(**variable_search_dict)
-    #else
-    #    potential_variables = nc.get_variables_by_attributes(**variable_search_dict)
-    #    potential_variables = [v for v in potential_variables if 'instant' in v.name]
     if 'duration' in metadata_dict.keys():
         if metadata_dict['duration']!=0:
             variable_search_dict['hours']=metadata_dict['duration']
             variable_search_dict['cell_methods']='phenomenonTime: '+metadata_dict['duration_method']
-            potential_variables = nc.get_variables_by_attributes(**variable_search_dict)
+            names = index.find_variables(metadata_dict['property'], vert_coord, **variable_search_dict)
         elif metadata_dict['duration']==0:
-            potential_variables = nc.get_variables_by_attributes(**variable_search_dict)
-            potential_variables = [v for v in potential_variables if 'instant' in v.name]
+            names = index.find_variables(metadata_dict['property'], vert_coord, **variable_search_dict)
+            names = [n for n in names if 'instant' in n]
     else:
-        potential_variables = nc.get_variables_by_attributes(**variable_search_dict)
-    potential_variables = [var for var in potential_variables if var.name in nc.getncattr('primary_variables').split()]
-    return potential_variables
+        names = index.find_variables(metadata_dict['property'], vert_coord, **variable_search_dict)
+    return [nc.variables[n] for n in names]
 
 
 def get_location(filename, nc, coord_vars):
     """Create a location object for a camps data object from
     the location information in a netCDF4 file.
     """
-    if file_cache[filename] and 'location' in file_cache[filename]:
-        return copy.copy(file_cache[filename]['location'])
+    entry = file_pool.get(filename)
+    if 'location' in entry:
+        return copy.copy(entry['location'])
 
     locations = []
     for c in coord_vars:
@@ -304,16 +741,15 @@ def get_location(filename, nc, coord_vars):
             continue
         coord_len = len(nc_coord[:])
         if coord_len > 2: # location data
-            locations.append(nc_coord)
+            locations.append(CoordinateData(nc_coord))
             if 'stations' in nc_coord.dimensions:
-                add_coord = nc.variables['stations']
-                if add_coord not in locations:
-                    locations.append(add_coord)
+                if 'stations' not in [l.name for l in locations]:
+                    locations.append(CoordinateData(nc.variables['stations']))
             
 
     location_obj = Location(*locations)
     if location_obj.location_data:
-        file_cache[filename]['location'] = copy.copy(location_obj)
+        entry['location'] = copy.copy(location_obj)
 
     return location_obj
 
@@ -341,7 +777,6 @@ def subset_time(w_obj, nc_var, lead_time, time):
     #lead time was requested, throw warning and return
     if not w_obj.is_model() and lead_time is not None:
         logging.warning("Attempt was made to subset by lead_time on non-model data")
-        w_obj.data = nc_var[:]
         return w_obj
 
     #Initialize lead time index and phenomenon (or forecast reference) time index for slicing.
@@ -365,19 +800,24 @@ def subset_time(w_obj, nc_var, lead_time, time):
         p_time = w_obj.get_phenom_time()
         p_time_index = p_time.get_index(time)
 
+    #Record the requested times in the lazy data, so only the hyperslabs
+    #holding them are read from the file
+    key = None
     if w_obj.is_model() and w_obj.is_vector():
         if p_time_index is not None:
-            data = nc_var[:][p_time_index,:]
+            key = [p_time_index]
     elif w_obj.is_model():
         if l_time_index is not None and p_time_index is not None:
-            data = nc_var[:][p_time_index,l_time_index,:,:]
+            key = [p_time_index,l_time_index]
         elif l_time_index is not None:
-            data = nc_var[:][:,l_time_index,:,:]
+            key = [slice(None),l_time_index]
         elif p_time_index is not None:
-            data = nc_var[:][p_time_index,:,:,:]
-    elif w_obj.is_vector():
-        data = nc_var[:][p_time_index,:]
-    w_obj.data = data
+            key = [p_time_index]
+    elif w_obj.is_vector() and p_time_index is not None:
+        key = [p_time_index]
+    data = w_obj.get_lazy_data()
+    filepath = data.filepath if isinstance(data, LazyArray) else nc_var.group().filepath()
+    w_obj.data = LazyArray(filepath, nc_var, key)
 
     # Subset the time objects
     for t in w_obj.time:
@@ -397,13 +837,63 @@ def subset_time(w_obj, nc_var, lead_time, time):
                 slice_arr[fcst_time_index] = slice(p_time_index[0], p_time_index[-1]+1)
 
         if t.name == 'phenomenonTimes':
-            t.data = t.data[slice_arr].ravel()
+            t.data = t.data[tuple(slice_arr)].ravel()
         else:
-            t.data = t.data[slice_arr]
+            t.data = t.data[tuple(slice_arr)]
 
     return w_obj #this return is not necessary.
 
 
+def read_hyperslab(nc_var, key):
+    """Reads nc_var[key] from the file without reading the full variable.
+
+    Args:
+        nc_var (obj:`NetCDF4.Dataset.Variable`): netCDF4 variable to read.
+        key (list): Index for the leading dimensions of nc_var. Each element
+                is an int, a slice, or a sequence of indices. At most one
+                element may be a sequence; it is read as a single strided
+                hyperslab if evenly spaced, or else as one hyperslab per
+                contiguous run of indices.
+
+    Returns:
+        (:np.ma.array:): The data, shaped as if nc_var[:][key] had been read.
+    """
+
+    key = list(key) + [slice(None)]*(len(nc_var.shape)-len(key))
+    seq_dims = [i for i,k in enumerate(key) if isinstance(k, (np.ndarray, list, tuple))]
+    if len(seq_dims) == 0:
+        return nc_var[tuple(key)]
+    if len(seq_dims) > 1:
+        raise ValueError("read_hyperslab supports at most one index sequence")
+
+    dim = seq_dims[0]
+    # Integer indices before dim drop dimensions from the result
+    axis = dim - len([k for k in key[:dim] if isinstance(k, (int, np.integer))])
+    pieces = []
+    for s in index_to_slices(key[dim]):
+        key[dim] = s
+        pieces.append(nc_var[tuple(key)])
+    if len(pieces) == 1:
+        return pieces[0]
+    return np.ma.concatenate(pieces, axis=axis)
+
+
+def index_to_slices(indices):
+    """Converts a sequence of indices into a list of slices. Evenly spaced,
+    increasing indices become one strided slice. Otherwise there is one
+    slice per contiguous run of indices, in the original order.
+    """
+
+    indices = [int(i) for i in np.asarray(indices).ravel()]
+    if len(indices) == 1:
+        return [slice(indices[0], indices[0]+1)]
+    steps = np.diff(indices)
+    if steps[0] > 0 and np.all(steps == steps[0]):
+        return [slice(indices[0], indices[-1]+1, int(steps[0]))]
+    runs = np.split(indices, np.flatnonzero(steps != 1)+1)
+    return [slice(int(run[0]), int(run[-1])+1) for run in runs]
+
+
 def create_time(nc_variable, lead_time=None, fcst_time=None):
     """Create a Time object for the camps data object from a netCDF4 time variable.
 
@@ -0,0 +1,220 @@
+import copy
+from types import MappingProxyType
+from collections.abc import MutableMapping
+
+
+"""Module: template_dict.py
+
+Methods:
+    freeze
+
+Classes:
+    TemplateDict
+        Methods:
+            __init__
+            _materialize
+            __getitem__
+            __setitem__
+            __delitem__
+            __iter__
+            _iter_overlay
+            __len__
+            __contains__
+            get
+            keys
+            items
+            values
+            pop
+            update
+            copy
+            __copy__
+            __deepcopy__
+            __reduce__
+            __repr__
+"""
+
+
+def freeze(mapping):
+    """Returns a read-only view of a private copy of mapping, to be shared
+    as a template.
+    """
+
+    return MappingProxyType(dict(mapping))
+
+
+class TemplateDict(MutableMapping):
+    """Dictionary of a shared, frozen template and the entries of this
+    dictionary that override or add to it (copy on write).
+
+    Camps_data objects of the same variable start with identical metadata
+    and properties from netcdf.yaml. Each holds a TemplateDict of the shared
+    template, so creating and copying them does not copy the dictionaries,
+    and each stores only the entries it changes. Removing an entry makes a
+    full private copy first, so the order of the entries is always that of
+    a dict that was changed the same way.
+
+    Attributes:
+        _template (:obj:`MappingProxyType`): The shared, read-only template.
+        _overrides (dict): Entries set on this dictionary, or None.
+        _full (dict): Private copy of all entries, made when an entry is
+            removed, or None.
+    """
+
+    __slots__ = ('_template', '_overrides', '_full')
+
+    def __init__(self, template=None):
+        """Initializes the TemplateDict sharing template, a mapping made
+        read-only with freeze. Any other mapping is frozen first.
+        """
+
+        if template is None:
+            template = {}
+        if not isinstance(template, MappingProxyType):
+            template = freeze(template)
+        self._template = template
+        self._overrides = None
+        self._full = None
+
+
+    def _materialize(self):
+        """Makes the full private copy of the entries."""
+
+        if self._full is None:
+            self._full = dict(self._template)
+            if self._overrides:
+                self._full.update(self._overrides)
+            self._overrides = None
+        return self._full
+
+
+    def __getitem__(self, key):
+        if self._full is not None:
+            return self._full[key]
+        if self._overrides and key in self._overrides:
+            return self._overrides[key]
+        return self._template[key]
+
+
+    def __setitem__(self, key, value):
+        if self._full is not None:
+            self._full[key] = value
+        elif self._overrides is None:
+            self._overrides = {key : value}
+        else:
+            self._overrides[key] = value
+
+
+    def __delitem__(self, key):
+        del self._materialize()[key]
+
+
+    def __iter__(self):
+        if self._full is not None:
+            return iter(self._full)
+        if not self._overrides:
+            return iter(self._template)
+        return self._iter_overlay()
+
+
+    def _iter_overlay(self):
+        template = self._template
+        yield from template
+        for key in self._overrides:
+            if key not in template:
+                yield key
+
+
+    def __len__(self):
+        if self._full is not None:
+            return len(self._full)
+        if not self._overrides:
+            return len(self._template)
+        return len(self._template) + sum(1 for key in self._overrides if key not in self._template)
+
+
+    def __contains__(self, key):
+        if self._full is not None:
+            return key in self._full
+        return key in self._template or (self._overrides is not None and key in self._overrides)
+
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def keys(self):
+        if self._full is not None:
+            return self._full.keys()
+        if not self._overrides:
+            return self._template.keys()
+        return super().keys()
+
+
+    def items(self):
+        if self._full is not None:
+            return self._full.items()
+        if not self._overrides:
+            return self._template.items()
+        return super().items()
+
+
+    def values(self):
+        if self._full is not None:
+            return self._full.values()
+        if not self._overrides:
+            return self._template.values()
+        return super().values()
+
+
+    def pop(self, key, *default):
+        if self._full is None and key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        if self._full is None and key not in self._template:
+            return self._overrides.pop(key)
+        return self._materialize().pop(key, *default)
+
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+    def copy(self):
+        """Returns a shallow copy sharing the template."""
+
+        new = TemplateDict(self._template)
+        if self._overrides is not None:
+            new._overrides = dict(self._overrides)
+        if self._full is not None:
+            new._full = dict(self._full)
+        return new
+
+
+    def __copy__(self):
+        return self.copy()
+
+
+    def __deepcopy__(self, memo):
+        """The template is immutable and shared; only the entries of this
+        dictionary are deep copied.
+        """
+
+        new = TemplateDict(self._template)
+        if self._overrides is not None:
+            new._overrides = copy.deepcopy(self._overrides, memo)
+        if self._full is not None:
+            new._full = copy.deepcopy(self._full, memo)
+        return new
+
+
+    def __reduce__(self):
+        return (TemplateDict, (dict(self.items()),))
+
+
+    def __repr__(self):
+        return repr(dict(self.items()))
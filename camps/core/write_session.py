@@ -0,0 +1,126 @@
+import numpy as np
+
+
+"""Module: write_session.py
+
+Classes:
+    WriteSession
+        Methods:
+            __init__
+            canonical
+            metadata_key
+            nc_key
+            index_basename
+            next_name
+            find
+            add
+"""
+
+
+class WriteSession(object):
+    """Index of the Camps_data variables written into one netCDF Dataset,
+    used by Camps_data.write_to_nc to name variables and to find a variable
+    identical in substance to one already written.
+
+    Variables are indexed by their basename, whether they are primary
+    (dimensioned by stations), their ancillary variables, and a canonical
+    key of the metadata attributes that identify them. The variables already
+    in the Dataset under a basename are indexed the first time the basename
+    is written, so naming and lookup take constant time per variable.
+
+    Attributes:
+        nc_handle (:obj:`Dataset`): The netCDF file handle.
+        counters (dict): Next numeric suffix of each basename.
+        index (dict): Name of the netCDF variable of each key.
+    """
+
+    # Metadata attributes that identify a variable, compared in the order
+    # of the attribute checks of the original write_to_nc.
+    key_attributes = ['SOSA__observedProperty', 'standard_name', 'long_name', 'units',
+                      'coordinates', 'filepath', 'smooth', 'FcstTime_hour', 'x', 'y',
+                      'level', 'leadtime']
+
+    def __init__(self, nc_handle):
+        """Starts an empty session on nc_handle."""
+
+        self.nc_handle = nc_handle
+        self.counters = {}
+        self.index = {}
+
+
+    @staticmethod
+    def canonical(value):
+        """Returns a hashable form of an attribute value that is the same
+        for the value in memory and as read back from the netCDF file.
+        """
+
+        if value is None or isinstance(value, str):
+            return value
+        arr = np.asarray(value)
+        if arr.dtype.kind in 'USO':
+            return str(value)
+        return tuple(arr.ravel().tolist())
+
+
+    def metadata_key(self, metadata, ancillary_variables, is_primary):
+        """Returns the key of a variable from its metadata dict."""
+
+        values = tuple(self.canonical(metadata.get(attr)) for attr in self.key_attributes)
+        return (is_primary, ancillary_variables, values)
+
+
+    def nc_key(self, nc_var):
+        """Returns the key of a variable in the netCDF file."""
+
+        attrs = nc_var.ncattrs()
+        values = tuple(self.canonical(nc_var.getncattr(attr)) if attr in attrs else None
+                       for attr in self.key_attributes)
+        ancillary_variables = nc_var.getncattr('ancillary_variables') \
+            if 'ancillary_variables' in attrs else None
+        return ('stations' in nc_var.dimensions, ancillary_variables, values)
+
+
+    def index_basename(self, basename):
+        """Indexes the variables already in the file named basename followed
+        by an optional number, and sets the counter of the basename.
+        """
+
+        variables = self.nc_handle.variables
+        number = 0
+        name = basename
+        while name in variables:
+            key = self.nc_key(variables[name])
+            self.index.setdefault((basename,) + key, name)
+            number += 1
+            name = basename + str(number)
+        self.counters[basename] = number
+
+
+    def next_name(self, basename):
+        """Returns the name the next variable with basename will be written as."""
+
+        if basename not in self.counters:
+            self.index_basename(basename)
+        number = self.counters[basename]
+        name = basename + str(number) if number > 0 else basename
+        while name in self.nc_handle.variables:
+            number += 1
+            name = basename + str(number)
+        self.counters[basename] = number
+        return name
+
+
+    def find(self, basename, key):
+        """Returns the name of the variable written with basename and key,
+        or None.
+        """
+
+        if basename not in self.counters:
+            self.index_basename(basename)
+        return self.index.get((basename,) + key)
+
+
+    def add(self, basename, name, nc_var):
+        """Indexes the netCDF variable nc_var just written as name."""
+
+        self.index.setdefault((basename,) + self.nc_key(nc_var), name)
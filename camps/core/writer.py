@@ -6,10 +6,15 @@ import numpy as np
 import logging
 import random
 import uuid
+import queue
+import traceback
+import multiprocessing
 from netCDF4 import Dataset
 
 from ..registry import util as util
 from .Camps_data import Camps_data
+from .lazy_array import LazyArray
+from .write_session import WriteSession
 
 """
 Module to handle writing Camps netCDF data
@@ -17,7 +22,7 @@ Module to handle writing Camps netCDF data
 
 
 def write(camps_data, filename, write_components=False, 
-          global_attrs={}, overwrite=True):
+          global_attrs={}, overwrite=True, profile=None):
     """Writes a list of Camps_data to NetCDF file.
     camps_data is expected to be a list of Camps_data objects.
     filename is the filename to write to.
@@ -31,6 +36,9 @@ def write(camps_data, filename, write_components=False,
         global_attrs (dict): Dict of global attributes for NetCDF file.
         overwrite (bool): If true, write a new file regardless of whether a file
             already exists, otherwise append to existing file if possible.
+        profile (str or dict): Name of an I/O profile in netcdf.yaml, or a
+            profile dict, setting the chunking and compression of the data
+            variables. See get_io_profile.
 
     Returns:
         True if successful, False otherwise.
@@ -43,6 +51,8 @@ def write(camps_data, filename, write_components=False,
         camps_data = [camps_data]
 
     start_time = time.time()
+    profile = get_io_profile(profile)
+    read_lazy_data(camps_data, filename)
 
     if overwrite:
         mode = 'w'
@@ -66,8 +76,9 @@ def write(camps_data, filename, write_components=False,
     #Write the data by calling its write_to_nc function
     primary_vars = []
 
+    session = WriteSession(nc)
     for da in camps_data:
-        name = da.write_to_nc(nc, write_components)
+        name = da.write_to_nc(nc, write_components, profile, session)
         primary_vars.append(name)
 
     global_attrs['primary_variables'] = ' '.join(primary_vars)
@@ -84,6 +95,234 @@ def write(camps_data, filename, write_components=False,
     logging.info("writing complete. Closing nc file: "+filename)
 
 
+class WriteBehindWriter(object):
+    """Writes Camps_data objects into a netCDF file from a dedicated writer
+    process, so they are compressed and written while the caller computes
+    the next ones.
+
+    Objects passed to write are queued to the writer process, which owns the
+    Dataset and writes each as it arrives. The queue holds at most max_queue
+    objects; write blocks while it is full, so the caller can get at most
+    max_queue objects ahead of the writer. The file is synced after every
+    variable, so the variables written before a failure are kept.
+
+    Attributes:
+        filename (str): NetCDF filename.
+        max_queue (int): Maximum number of objects waiting to be written.
+        primary_vars (list): Names of the written variables, set by close.
+
+    Example:
+        with WriteBehindWriter(filename, profile='fast-write') as bw:
+            for obj in compute():
+                bw.write(obj)
+    """
+
+    def __init__(self, filename, write_components=False, global_attrs={},
+                 overwrite=True, profile=None, max_queue=8):
+        """Starts the writer process, which opens filename and writes the
+        global attributes. The arguments are those of writer.write.
+        """
+
+        logging.info("\nWriting behind to "+filename+"\n")
+        self.filename = filename
+        self.max_queue = max(int(max_queue), 1)
+        self.primary_vars = None
+        global_attrs = dict(global_attrs)
+        global_attrs['file_id'] = str(uuid.uuid4())
+        self.queue = multiprocessing.Queue(self.max_queue)
+        self.results = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_write_behind,
+            args=(self.queue, self.results, filename, write_components,
+                  global_attrs, overwrite, get_io_profile(profile)))
+        # A daemon, so a caller that fails without closing does not hang on exit;
+        # the variables written so far are already synced to the file.
+        self.process.daemon = True
+        self.process.start()
+
+
+    def write(self, camps_data):
+        """Queues a Camps_data, or a list of them, to be written. Blocks while
+        the queue is full.
+
+        Raises:
+            RuntimeError: If the writer process has failed.
+        """
+
+        if type(camps_data) is not list:
+            camps_data = [camps_data]
+        # The writer process must not read through the file handles it
+        # inherited, so lazy data is read here before it is queued.
+        read_lazy_data(camps_data)
+        for da in camps_data:
+            while True:
+                self._check()
+                try:
+                    self.queue.put(da, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+
+
+    def close(self):
+        """Waits for the queued objects to be written, writes the primary
+        variables attribute and closes the file. Returns the names of the
+        written variables.
+
+        Raises:
+            RuntimeError: If the writer process has failed.
+        """
+
+        if self.process is None:
+            return self.primary_vars
+        while self.process.is_alive():
+            try:
+                self.queue.put(None, timeout=1)
+                break
+            except queue.Full:
+                continue
+        result = self._result()
+        self.process.join()
+        self.process = None
+        if isinstance(result, str) or result is None:
+            self._abandon()
+            raise RuntimeError("Writing " + self.filename + " failed in the writer process:\n" + str(result))
+        self.primary_vars = result
+        logging.info("writing complete. Closing nc file: "+self.filename)
+        return self.primary_vars
+
+
+    def _check(self):
+        """Raises if the writer process has stopped before close."""
+
+        if not self.process.is_alive() or not self.results.empty():
+            result = self._result()
+            self.process.join()
+            self.process = None
+            self._abandon()
+            raise RuntimeError("Writing " + self.filename + " failed in the writer process:\n" + str(result))
+
+
+    def _abandon(self):
+        """Drops the objects still queued after the writer process failed, so
+        exiting does not wait to send them.
+        """
+
+        self.queue.cancel_join_thread()
+        self.queue.close()
+
+
+    def _result(self):
+        """Returns what the writer process sent back: the list of written
+        variables, or the traceback of its failure. None if it sent nothing.
+        """
+
+        while True:
+            try:
+                return self.results.get(timeout=1)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    try:
+                        return self.results.get(timeout=1)
+                    except queue.Empty:
+                        return None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.process is not None:
+            self.close()
+
+
+def _write_behind(in_queue, results, filename, write_components,
+                  global_attrs, overwrite, profile):
+    """Writer process of WriteBehindWriter. Writes each Camps_data taken from
+    in_queue until it gets None, then puts the list of written variables on
+    results. On failure, puts the traceback instead.
+    """
+
+    nc = None
+    try:
+        if overwrite:
+            mode = 'w'
+        else:
+            mode = 'a'
+        nc = Dataset(filename, mode=mode, format="NETCDF4")
+        global_attrs['primary_variables'] = ''
+        write_global_attributes(nc, global_attrs)
+        write_prefixes(nc)
+
+        session = WriteSession(nc)
+        primary_vars = []
+        start_time = time.time()
+        while True:
+            da = in_queue.get()
+            if da is None:
+                break
+            name = da.write_to_nc(nc, write_components, profile, session)
+            primary_vars.append(name)
+            nc.setncattr('primary_variables', ' '.join(primary_vars))
+            nc.sync()
+        nc.close()
+        nc = None
+
+        elapsed_time = time.time() - start_time
+        logging.debug("elapsed time in writer process:" + str(elapsed_time))
+        results.put(primary_vars)
+    except Exception:
+        results.put(traceback.format_exc())
+        if nc is not None:
+            nc.close()
+
+
+def read_lazy_data(camps_data, filename=None):
+    """Reads the data of the Camps_data objects that has not been read from
+    file yet. If filename is given, only the data read lazily from filename,
+    which is about to be written, is read.
+    """
+
+    for da in camps_data:
+        lazy = da.get_lazy_data()
+        if not isinstance(lazy, LazyArray):
+            continue
+        if filename is None or os.path.abspath(lazy.filepath) == os.path.abspath(filename):
+            da.read_data()
+
+
+def get_io_profile(profile=None):
+    """Returns the I/O profile dict that sets how data variables are chunked
+    and compressed.
+
+    Args:
+        profile (str or dict): Name of a profile in the io_profiles section of
+            netcdf.yaml, or a dict of profile settings that overrides those of
+            the default profile. None selects the default profile.
+
+    Returns:
+        dict: The profile settings.
+
+    Raises:
+        ValueError: If there is no profile with the given name.
+    """
+
+    profiles = util.read_io_profiles()
+    settings = dict(profiles['default'])
+    if profile is None:
+        return settings
+    if isinstance(profile, dict):
+        settings.update(profile)
+        return settings
+    if profile not in profiles:
+        logging.error("I/O profile " + str(profile) + " is not defined in netcdf.yaml")
+        logging.error("Defined profiles are: " + ', '.join(profiles.keys()))
+        raise ValueError("Unknown I/O profile " + str(profile))
+    settings.update(profiles[profile])
+    return settings
+
+
 def get_primary_variables(w_list):
     """Return space-separated primary variables.
 
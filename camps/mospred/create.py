@@ -248,10 +248,10 @@ def calculate(filepaths, time, predictor, station_list=None, station_defs=None):
     #Add source to metadata if it is not in there.
     if isinstance(ret_obj,Camps_data):
         processes = []
-        for process in ret_obj.processes:
+        for i,process in enumerate(ret_obj.processes):
             processes.append(process.name)
             if 'Calc' in process.name:
-                process.add_attribute('source', predictor['search_metadata']['source'])
+                ret_obj.processes[i] = process.with_attributes(source=predictor['search_metadata']['source'])
     return ret_obj
 
 
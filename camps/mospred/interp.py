@@ -2,30 +2,68 @@ import sys
 import os
 import logging
 import pdb
+import hashlib
+import tempfile
 import numpy as np
+from collections import OrderedDict
 from netCDF4 import Dataset
-from scipy.interpolate import griddata
+from scipy.spatial import Delaunay
+from scipy.sparse import coo_matrix, csr_matrix
 from pyproj import Proj
 
 from ..registry import util as cfg
 from ..core.Camps_data import Camps_data
+from ..core import reader
+from ..core.lazy_array import LazyArray
 
 
 """Module: interp.py
 
 Methods:
+    configure_engine
     interp_setup
+    grid_window
     interp
+    linear_weights
     bilinear_interp
     budget_interp
+    budget_preprocess
     biquadratic_interp
     nearest_neighbor_interp
     get_projparams
     reproject
+    bilinear_stencil
+    biquadratic_stencil
+    nearest_neighbor_stencil
+    sparse_interp
+    sparse_budget_interp
+    bilinear_operator
+    biquadratic_operator
+    nearest_neighbor_operator
+    operator_arrays
     test
+
+Classes:
+    StencilCache
 """
 
 
+# Interpolation engine used by interp_setup for the bilinear, budget,
+# biquadratic and nearest methods. 'gather' indexes the neighbouring grid
+# points of every station, 'sparse' applies each method as a sparse
+# [stations x gridpoints] operator.
+interp_engine = 'gather'
+
+
+def configure_engine(engine='gather'):
+    """Sets the interpolation engine used by interp_setup."""
+
+    global interp_engine
+    if engine not in ['gather', 'sparse']:
+        raise ValueError("Unknown interpolation engine "+str(engine))
+    interp_engine = engine
+
+
 def interp_setup(w_obj, xi_x, xi_y, interp_method):
     """Performs interpolation of gridded model data onto stations.
     Interpolation method is set in the predictors conrol file.
@@ -35,8 +73,9 @@ def interp_setup(w_obj, xi_x, xi_y, interp_method):
     x = w_obj.location.get_x()
     y = w_obj.location.get_y()
 
-    # Extract model_values
-    model_values = w_obj.data
+    # Extract model_values. Data not yet read from file stays lazy, so the
+    # interpolation methods read only the part of the grid they use.
+    model_values = w_obj.get_lazy_data()
     if len(model_values.shape) > 3:
         model_values = model_values[:,:,:,0]
 
@@ -46,20 +85,33 @@ def interp_setup(w_obj, xi_x, xi_y, interp_method):
     #--------------------------------------------------------------------------
     # Perform interpolation
     #--------------------------------------------------------------------------
+    sparse = interp_engine == 'sparse'
     if 'bilinear' in interp_method:
-        data = bilinear_interp(model_values, xind, yind)
+        if sparse:
+            data = sparse_interp(model_values, xind, yind, 'bilinear')
+        else:
+            data = bilinear_interp(model_values, xind, yind)
         w_obj.add_process('BiLinInterp')
     elif 'budget' in interp_method:
-        data = budget_interp(model_values.harden_mask(),xind,yind)
+        if sparse:
+            data = sparse_budget_interp(grid_window(model_values)[0].harden_mask(),xind,yind)
+        else:
+            data = budget_interp(grid_window(model_values)[0].harden_mask(),xind,yind)
         w_obj.add_process('BudgetInterp')
     elif 'biquadratic' in interp_method:
-        data = biquadratic_interp(model_values, xind, yind)
+        if sparse:
+            data = sparse_interp(model_values, xind, yind, 'biquadratic')
+        else:
+            data = biquadratic_interp(model_values, xind, yind)
         w_obj.add_process('BiQuadInterp')
     elif 'nearest' in interp_method:
-        data = nearest_neighbor_interp(model_values, xind, yind)
+        if sparse:
+            data = sparse_interp(model_values, xind, yind, 'nearest')
+        else:
+            data = nearest_neighbor_interp(model_values, xind, yind)
         w_obj.add_process('NearestInterp')
     elif 'linear' in interp_method:
-        data = interp(x,y, model_values.harden_mask(), xi_x,xi_y)
+        data = interp(x,y, grid_window(model_values)[0].harden_mask(), xi_x,xi_y)
         w_obj.add_process('LinInterp')
     else: 
         logging.warning('Must pass valid interpolation method')
@@ -74,11 +126,48 @@ def interp_setup(w_obj, xi_x, xi_y, interp_method):
     return w_obj
 
 
+def grid_window(model_values, st=None, rows=(), cols=()):
+    """Returns the part of the [days, y, x] grid model_values spanning the
+    grid rows and columns in the index arrays rows and cols, and the stencil
+    st with its grid indices shifted into that part.
+
+    Only model_values not yet read from file, a LazyArray, is windowed: just
+    the box of grid points the stencil uses is read. Without rows and cols,
+    or for an array in memory, the whole grid is returned with st unchanged.
+    """
+
+    if isinstance(model_values, LazyArray) and model_values.is_read():
+        model_values = model_values.read()
+    if not isinstance(model_values, LazyArray):
+        return model_values, st
+    rows = np.concatenate([np.ravel(r) for r in rows]) if len(rows) else np.array([], dtype=int)
+    cols = np.concatenate([np.ravel(c) for c in cols]) if len(cols) else np.array([], dtype=int)
+    if st is None or rows.size == 0 or cols.size == 0:
+        return model_values.read(), st
+
+    y0 = int(rows.min())
+    x0 = int(cols.min())
+    window = model_values[:,y0:int(rows.max())+1,x0:int(cols.max())+1].read()
+    st = dict(st)
+    for k in ['yi', 'yi1', 'yi2', 'yiM1', 'col_y']:
+        if k in st:
+            st[k] = st[k] - y0
+    for k in ['xi', 'xi1', 'col_x']:
+        if k in st:
+            st[k] = st[k] - x0
+
+    return window, st
+
+
 def interp(x, y, model_values, xi_x, xi_y):
-    """Performs a simple linear interpolation using griddata function
+    """Performs a simple linear interpolation on the Delaunay triangulation
+    of the unmasked grid points, as scipy.interpolate.griddata does.
+    The triangulation and the barycentric weights of the stations are
+    cached by linear_weights, so only the weights are applied unless the
+    grid, the mask or the stations change.
     x - the x coordinate values in projected grid
     y - the y coordinate values in projected grid
-    model_values - grid point values for observations
+    model_values - grid point values for observations, [y, x] or [days, y, x]
     station_lat - 1 or 2 dimensional array of latitude points
     station_lon - 1 or 2 dimensional array of longitude points
     """
@@ -89,72 +178,103 @@ def interp(x, y, model_values, xi_x, xi_y):
 
     # Form the location array for stations
     # and form the totally maske array to be returned
-    # when no data is available or griddata routine 
+    # when no data is available or the triangulation
     # returns a ValueError exception.
     stn_locs = np.array((xi_x, xi_y)).T
     n_stns = stn_locs.shape[0]
-    values = np.ones((n_stns,), dtype=np.int) * 9999.
+    values = np.full((n_stns,), 9999.)
     no_values_array = np.ma.array(values, mask=True)
 
-    # Flatten data array
+    if model_values.ndim == 3:
+        return np.ma.array([interp(x, y, day_values, xi_x, xi_y) for day_values in model_values])
+
     mask = np.ma.getmaskarray(model_values)
     data = np.ma.getdata(model_values)
-    model_values_1d = data[~mask].flatten()
-    if model_values_1d.size == 0:
+    if mask.all():
         return no_values_array
 
-    # Create 2d grid of x and y coordinates
-    # e.g. xx will have shape (len(x),len(y))
-    xx, yy = np.meshgrid(x,y)
-
-    # Must make then make them 1d
-    x_1d = xx[~mask].flatten()
-    y_1d = yy[~mask].flatten()
-
-    # Stack and transpose grid x and y. griddata expects shape (n, D)
-    # Where n in size of array and D is number of dimensions...
-    points = np.array((x_1d, y_1d)).T
-
     #--------------------------------------------------------------------------
     # Perform interpolation onto stations
     #--------------------------------------------------------------------------
     try:
-        grid_z0 = griddata(points, model_values_1d, stn_locs, method='linear')
+        weights = linear_weights(x, y, mask, stn_locs)
     except ValueError:
-        logging.error("Could not complete griddata routine.")
-        logging.error("Shape of points" + str( points.shape))
-        logging.error("shape of model values" + str(model_values_1d.shape))
+        logging.error("Could not complete triangulation routine.")
+        logging.error("Shape of points" + str((np.count_nonzero(~mask), 2)))
+        logging.error("shape of model values" + str(data.shape))
         raise
     except:
         raise
+    vals = data.ravel()[weights['vertices']]
+    grid_z0 = np.where(weights['inside'], (vals*weights['weights']).sum(axis=1), np.nan)
     #--------------------------------------------------------------------------
 
     return np.ma.array(grid_z0)
 
 
-def bilinear_interp(model_values,xind,yind):
-    """Performs a bilinear interpolation scheme from a grid to stations."""
+# Triangulations of the unmasked grid points and the barycentric weights of
+# the stations in them, most recently used last.
+linear_weights_cache = OrderedDict()
+max_linear_weights = 8
 
-    # Convert to indices for data points and get distances
-    # between grid points and data points
-    xi = xind.astype(int)
-    yi = yind.astype(int)
-    dx = xind-xi
-    dy = yind-yi
 
-    # Get 'next' index in each direction
-    xi1 = xi+1
-    yi1 = yi+1
+def linear_weights(x, y, mask, stn_locs):
+    """Returns the grid point indices, barycentric weights and inside-hull
+    flags of the stations at stn_locs in the Delaunay triangulation of the
+    unmasked points of the grid with coordinates x and y. Results are cached
+    by a digest of the grid, mask and stations.
+    """
 
-    # Adjust end points of indices
-    xi[xi<0] = 0
-    yi[yi<0] = 0
-    xi[xi>model_values.shape[2]-2] = model_values.shape[2]-2
-    yi[yi>model_values.shape[1]-2] = model_values.shape[1]-2
+    digest = hashlib.sha1()
+    for arr in [x, y, stn_locs]:
+        arr = np.ascontiguousarray(arr, dtype=np.float64)
+        digest.update(str(arr.shape).encode())
+        digest.update(arr.tobytes())
+    digest.update(str(mask.shape).encode())
+    digest.update(np.packbits(mask).tobytes())
+    key = digest.hexdigest()
+    if key in linear_weights_cache:
+        linear_weights_cache.move_to_end(key)
+        return linear_weights_cache[key]
+
+    # Create 2d grid of x and y coordinates and keep the unmasked points.
+    xx, yy = np.meshgrid(x,y)
+    valid = np.flatnonzero(~mask)
+    points = np.array((xx.ravel()[valid], yy.ravel()[valid])).T
+    logging.info("Triangulating "+str(valid.size)+" grid points for linear interpolation")
+    tri = Delaunay(points)
 
-    # Get 'next' index in each direction
-    xi1 = xi+1
-    yi1 = yi+1
+    # Barycentric coordinates of each station in its simplex.
+    n_stns = stn_locs.shape[0]
+    simplex = tri.find_simplex(stn_locs)
+    inside = simplex >= 0
+    T = tri.transform[simplex[inside]]
+    c = np.einsum('nij,nj->ni', T[:,:2,:], stn_locs[inside]-T[:,2,:])
+    weights = np.zeros((n_stns,3))
+    weights[inside,:2] = c
+    weights[inside,2] = 1. - c.sum(axis=1)
+    vertices = np.zeros((n_stns,3), dtype=int)
+    vertices[inside] = valid[tri.simplices[simplex[inside]]]
+
+    entry = {'vertices':vertices, 'weights':weights, 'inside':inside}
+    linear_weights_cache[key] = entry
+    while len(linear_weights_cache) > max_linear_weights:
+        linear_weights_cache.popitem(last=False)
+
+    return entry
+
+
+def bilinear_interp(model_values,xind,yind):
+    """Performs a bilinear interpolation scheme from a grid to stations."""
+
+    st = stencil_cache.get('bilinear', model_values.shape[1:], xind, yind)
+    model_values, st = grid_window(model_values, st, [st['yi'], st['yi1']], [st['xi'], st['xi1']])
+    xi = st['xi']
+    yi = st['yi']
+    xi1 = st['xi1']
+    yi1 = st['yi1']
+    dx = st['dx']
+    dy = st['dy']
 
     # Perform bilinear interpolation
     data = model_values[:,yi,xi] + \
@@ -171,10 +291,20 @@ def budget_interp(a,xind,yind):
     1:1 exact as NCEP's IPLIB budget interpolation routine, polates3.f90
     """
 
-    # IMPORTANT: 2D grids in CAMPS are ordered j/y,i/x
-    ny = a.shape[1]
-    nx = a.shape[2]
+    # Setup output data array using xind shape info.
+    # Pass pre-processed data array into bilinear interpolation function
+    data = bilinear_interp(budget_preprocess(a), xind, yind)
+    data[data<0.0] = 0.0
+    return data
 
+
+def budget_preprocess(a):
+    """Returns a copy of the [days, y, x] grid a prepared for budget
+    interpolation, with every non-positive grid point replaced by minus
+    the mean of its 4 neighbours inside the grid.
+    """
+
+    # IMPORTANT: 2D grids in CAMPS are ordered j/y,i/x
     adata = np.ma.getdata(a)
     amask = np.ma.getmaskarray(a)
 
@@ -183,63 +313,49 @@ def budget_interp(a,xind,yind):
     awdata = np.ma.getdata(awork)
     awmask = np.ma.getmaskarray(awork)
 
-    # Pre-process input 2D grid
-    it = np.nditer([adata,awdata],flags=['multi_index',],op_flags=[['readonly'],['readwrite']])
-    for a1,aw1 in it:
-        d = it.multi_index[0]
-        j = it.multi_index[1]
-        i = it.multi_index[2]
-        asum = 0.
-        acount = 0
-        if a1[...] <= 0.0:
-            if j+1 in range(ny):
-                asum += adata[d,j+1,i]
-                acount += 1
-            if j-1 in range(ny):
-                asum += adata[d,j-1,i]
-                acount += 1
-            if i+1 in range(nx):
-                asum += adata[d,j,i+1]
-                acount += 1
-            if i-1 in range(nx):
-                asum += adata[d,j,i-1]
-                acount += 1
-            if acount > 0:
-                aw1[...] = -1.0*(asum/np.float32(acount))
+    # Neighbour sums and counts are built from shifted views of the whole
+    # [days, y, x] array and are accumulated in the same order and precision
+    # as the per-point form,
+    # (0. + adata[d,j+1,i] + adata[d,j-1,i] + ...)/np.float32(count).
+    acc_type = (0. + adata.dtype.type(0)).dtype
+    asum = np.zeros(adata.shape, dtype=acc_type)
+    acount = np.zeros(adata.shape, dtype=np.int64)
+    asum[:,:-1,:] += adata[:,1:,:]  # j+1
+    acount[:,:-1,:] += 1
+    asum[:,1:,:] += adata[:,:-1,:]  # j-1
+    acount[:,1:,:] += 1
+    asum[:,:,:-1] += adata[:,:,1:]  # i+1
+    acount[:,:,:-1] += 1
+    asum[:,:,1:] += adata[:,:,:-1]  # i-1
+    acount[:,:,1:] += 1
+    fill = (adata <= 0.0) & (acount > 0)
+    awdata[fill] = -1.0*(asum[fill]/acount[fill].astype(np.float32))
+
+    return np.ma.array(awdata,mask=awmask)
 
-    # Setup output data array using xind shape info.
-    # Pass pre-processed data array into bilinear interpolation function
-    data = bilinear_interp(np.ma.array(awdata,mask=awmask), xind, yind)
-    data[data<0.0] = 0.0
-    return data
-    
 
 def biquadratic_interp(model_values,xind,yind):
 
-    #Convert to indices for data points and get distances
-    #between grid points and data points
+    st = stencil_cache.get('biquadratic', model_values.shape[1:], xind, yind)
+    inner = st['inner_ind']
+    bound = st['bound_ind']
+    model_values, st = grid_window(model_values, st,
+                                   [st['yiM1'][inner], st['yi2'][inner], st['yi'][bound], st['yi1'][bound]],
+                                   [st['xi'][inner]-1, st['xi'][inner]+2, st['xi'][bound], st['xi1'][bound]])
     ndays = model_values.shape[0]
-    dx = xind.round(0)-xind
-    dy = yind.round(0)-yind
-    xi = xind.astype(int)
-    yi = yind.astype(int)
-
-    #Adjust end points of indices
-    xi[xi<0] = 0
-    yi[yi<0] = 0
-    xi[xi>model_values.shape[2]-2] = model_values.shape[2]-2
-    yi[yi>model_values.shape[1]-2] = model_values.shape[1]-2
-
-    #Get several 'adjacent' indices.
-    xi1 = xi+1
-    yi1 = yi+1
-    yi2 = yi+2
-    yiM1 = yi-1
+    xi = st['xi']
+    yi = st['yi']
+    xi1 = st['xi1']
+    yi1 = st['yi1']
+    yi2 = st['yi2']
+    yiM1 = st['yiM1']
+    dx = st['dx']
+    dy = st['dy']
+    FCT = st['FCT']
+    FET = st['FET']
 
-    FCT = (dy**2-dy)/4
-    FET = (dx**2-dx)/4
     # For points not along the grid boundary, perform biquadratic interpolation
-    inner_ind = np.where((xi!=0) & (yi!=0) & (yi!=model_values.shape[0]-2) & (xi!=model_values.shape[1]-2))[0]
+    inner_ind = st['inner_ind']
     D = []
     for j in range(4):
         X = xi[inner_ind] - 1 + j
@@ -250,7 +366,7 @@ def biquadratic_interp(model_values,xind,yind):
     data[:,inner_ind] = D[1]+(D[2]-D[1])*dx[inner_ind]+(D[0]+D[3]-D[1]-D[2])*FET[inner_ind]
 
     # For points along the grid boundary, perform bilinear interpolation
-    bound_ind = np.where((xi==0) | (yi==0) | (xi==model_values.shape[1]-2) | (yi==model_values.shape[0]-2))[0]
+    bound_ind = st['bound_ind']
     data[:,bound_ind] = model_values[:,yi[bound_ind],xi[bound_ind]] + \
     (model_values[:,yi[bound_ind],xi1[bound_ind]] - model_values[:,yi[bound_ind],xi[bound_ind]])*dx[bound_ind] + \
     (model_values[:,yi1[bound_ind],xi[bound_ind]] - model_values[:,yi[bound_ind],xi[bound_ind]])*dy[bound_ind] + \
@@ -262,41 +378,377 @@ def biquadratic_interp(model_values,xind,yind):
 
 def nearest_neighbor_interp(model_values,xind,yind):
 
-    # Round index values to nearest grid point
-    xi = np.round(xind).astype(int)
-    yi = np.round(yind).astype(int)
+    st = stencil_cache.get('nearest', model_values.shape[1:], xind, yind)
+    valid = st['valid_ind']
+    model_values, st = grid_window(model_values, st, [st['yi'][valid]], [st['xi'][valid]])
+    xi = st['xi']
+    yi = st['yi']
+    valid_ind = st['valid_ind']
 
     ndays = model_values.shape[0]
 
     # Perform nearest neighbor interpolation, leaving points outside of grid boundary as missing.
     data = np.ma.ones((ndays,xi.size))*9999
-    valid_ind = np.where((xi>=0) & (yi>=0) & (xi<model_values.shape[1]) & (yi<model_values.shape[0]))[0]
     data[:,valid_ind] = model_values[:,yi[valid_ind],xi[valid_ind]]
 
     return data
 
 
+def bilinear_stencil(xind, yind, grid_shape):
+    """Returns the grid indices and offsets used by bilinear_interp
+    for stations at grid coordinates xind, yind on a [y, x] grid.
+    """
+
+    # Convert to indices for data points and get distances
+    # between grid points and data points
+    xi = xind.astype(int)
+    yi = yind.astype(int)
+    dx = xind-xi
+    dy = yind-yi
+
+    # Adjust end points of indices
+    xi[xi<0] = 0
+    yi[yi<0] = 0
+    xi[xi>grid_shape[1]-2] = grid_shape[1]-2
+    yi[yi>grid_shape[0]-2] = grid_shape[0]-2
+
+    # Get 'next' index in each direction
+    xi1 = xi+1
+    yi1 = yi+1
+
+    return {'xi':xi, 'yi':yi, 'xi1':xi1, 'yi1':yi1, 'dx':dx, 'dy':dy}
+
+
+def biquadratic_stencil(xind, yind, grid_shape):
+    """Returns the grid indices, offsets and weights used by
+    biquadratic_interp for stations at grid coordinates xind, yind
+    on a [y, x] grid.
+    """
+
+    #Convert to indices for data points and get distances
+    #between grid points and data points
+    dx = xind.round(0)-xind
+    dy = yind.round(0)-yind
+    xi = xind.astype(int)
+    yi = yind.astype(int)
+
+    #Adjust end points of indices
+    xi[xi<0] = 0
+    yi[yi<0] = 0
+    xi[xi>grid_shape[1]-2] = grid_shape[1]-2
+    yi[yi>grid_shape[0]-2] = grid_shape[0]-2
+
+    #Get several 'adjacent' indices.
+    xi1 = xi+1
+    yi1 = yi+1
+    yi2 = yi+2
+    yiM1 = yi-1
+
+    FCT = (dy**2-dy)/4
+    FET = (dx**2-dx)/4
+
+    # Points not along the grid boundary are interpolated biquadratically,
+    # points along it bilinearly.
+    inner_ind = np.where((xi!=0) & (yi!=0) & (yi!=grid_shape[0]-2) & (xi!=grid_shape[1]-2))[0]
+    bound_ind = np.where((xi==0) | (yi==0) | (xi==grid_shape[1]-2) | (yi==grid_shape[0]-2))[0]
+
+    return {'xi':xi, 'yi':yi, 'xi1':xi1, 'yi1':yi1, 'yi2':yi2, 'yiM1':yiM1,
+            'dx':dx, 'dy':dy, 'FCT':FCT, 'FET':FET,
+            'inner_ind':inner_ind, 'bound_ind':bound_ind}
+
+
+def nearest_neighbor_stencil(xind, yind, grid_shape):
+    """Returns the grid indices used by nearest_neighbor_interp
+    for stations at grid coordinates xind, yind on a [y, x] grid.
+    """
+
+    # Round index values to nearest grid point
+    xi = np.round(xind).astype(int)
+    yi = np.round(yind).astype(int)
+
+    # Points outside of the grid boundary are left missing.
+    valid_ind = np.where((xi>=0) & (yi>=0) & (xi<grid_shape[1]) & (yi<grid_shape[0]))[0]
+
+    return {'xi':xi, 'yi':yi, 'valid_ind':valid_ind}
+
+
+def sparse_interp(model_values, xind, yind, method):
+    """Interpolates the [days, y, x] grid model_values to stations by
+    applying the sparse [stations x gridpoints] operator of method,
+    'bilinear', 'biquadratic' or 'nearest', to all days with a single
+    gather of the grid points it uses and a single sparse-dense product.
+
+    As with the gather interpolation routines, a station is masked on the
+    days any grid point of its stencil is masked, and stations outside of
+    the grid are extrapolated from the clamped bilinear and biquadratic
+    stencils. Stations with no grid points, those outside of the grid for
+    'nearest', are set to 9999.
+    """
+
+    st = stencil_cache.get(method+'_operator', model_values.shape[1:], xind, yind)
+    model_values, st = grid_window(model_values, st, [st['col_y']], [st['col_x']])
+    W = csr_matrix((st['data'], st['indices'], st['indptr']), shape=tuple(st['shape']))
+
+    # Only the grid points used by some station are read from the grid.
+    values = np.ma.getdata(model_values)[:,st['col_y'],st['col_x']].astype(np.float64)
+    mask = np.ma.getmask(model_values)
+    if mask is not np.ma.nomask:
+        mask = mask[:,st['col_y'],st['col_x']]
+    missing = np.zeros((values.shape[0], W.shape[0]), dtype=bool)
+    if mask is not np.ma.nomask and mask.any():
+        # Weights can be zero or negative, so stations are masked by the
+        # pattern of the operator rather than by the weight left unmasked.
+        values[mask] = 0.
+        pattern = csr_matrix((np.ones(st['data'].size), st['indices'], st['indptr']), shape=W.shape)
+        missing = np.asarray(pattern.dot(mask.T.astype(np.float64))).T > 0
+    data = np.asarray(W.dot(values.T)).T
+
+    data[:,np.diff(st['indptr'])==0] = 9999.
+    data[missing] = 9999.
+
+    return np.ma.array(data, mask=missing)
+
+
+def sparse_budget_interp(a, xind, yind):
+    """Budget interpolation with the sparse bilinear operator."""
+
+    data = sparse_interp(budget_preprocess(a), xind, yind, 'bilinear')
+    data[data<0.0] = 0.0
+    return data
+
+
+def bilinear_operator(xind, yind, grid_shape):
+    """Returns the arrays of the sparse [stations x gridpoints] operator
+    performing the interpolation of bilinear_interp.
+    """
+
+    st = bilinear_stencil(xind, yind, grid_shape)
+    xi, yi, xi1, yi1, dx, dy = [st[k] for k in ['xi','yi','xi1','yi1','dx','dy']]
+    nx = grid_shape[1]
+    cols = [yi*nx+xi, yi*nx+xi1, yi1*nx+xi, yi1*nx+xi1]
+    weights = [1-dx-dy+dx*dy, dx-dx*dy, dy-dx*dy, dx*dy]
+    rows = [np.arange(xi.size)]*4
+
+    return operator_arrays(rows, cols, weights, xi.size, grid_shape)
+
+
+def biquadratic_operator(xind, yind, grid_shape):
+    """Returns the arrays of the sparse [stations x gridpoints] operator
+    performing the interpolation of biquadratic_interp.
+    """
+
+    st = biquadratic_stencil(xind, yind, grid_shape)
+    xi, yi, xi1, yi1, yi2, yiM1 = [st[k] for k in ['xi','yi','xi1','yi1','yi2','yiM1']]
+    dx, dy, FCT, FET = [st[k] for k in ['dx','dy','FCT','FET']]
+    inner = st['inner_ind']
+    bound = st['bound_ind']
+    nx = grid_shape[1]
+    rows = []
+    cols = []
+    weights = []
+
+    # Inner points weight a 4x4 block: 4 rows of a quadratic in y,
+    # combined by a quadratic in x.
+    y_rows = [yiM1[inner], yi[inner], yi1[inner], yi2[inner]]
+    y_weights = [FCT[inner], 1-dy[inner]-FCT[inner], dy[inner]-FCT[inner], FCT[inner]]
+    x_weights = [FET[inner], 1-dx[inner]-FET[inner], dx[inner]-FET[inner], FET[inner]]
+    for i in range(4):
+        X = xi[inner] - 1 + i
+        for j in range(4):
+            rows.append(inner)
+            cols.append(y_rows[j]*nx+X)
+            weights.append(x_weights[i]*y_weights[j])
+
+    # Boundary points are interpolated bilinearly.
+    bdx = dx[bound]
+    bdy = dy[bound]
+    for Y,X,w in [(yi,xi,1-bdx-bdy+bdx*bdy), (yi,xi1,bdx-bdx*bdy),
+                  (yi1,xi,bdy-bdx*bdy), (yi1,xi1,bdx*bdy)]:
+        rows.append(bound)
+        cols.append(Y[bound]*nx+X[bound])
+        weights.append(w)
+
+    return operator_arrays(rows, cols, weights, xi.size, grid_shape)
+
+
+def nearest_neighbor_operator(xind, yind, grid_shape):
+    """Returns the arrays of the sparse [stations x gridpoints] operator
+    performing the interpolation of nearest_neighbor_interp.
+    """
+
+    st = nearest_neighbor_stencil(xind, yind, grid_shape)
+    valid = st['valid_ind']
+    cols = st['yi'][valid]*grid_shape[1]+st['xi'][valid]
+
+    return operator_arrays([valid], [cols], [np.ones(valid.size)], st['xi'].size, grid_shape)
+
+
+def operator_arrays(rows, cols, weights, nstations, grid_shape):
+    """Assembles lists of row index, column index and weight arrays into
+    the CSR arrays of a [stations x gridpoints] operator, summing weights
+    of repeated entries. The operator's columns are limited to the grid
+    points used by some station, whose y and x indices are returned as
+    'col_y' and 'col_x'.
+    """
+
+    cols = np.concatenate(cols)
+    used, cols = np.unique(cols, return_inverse=True)
+    op = coo_matrix((np.concatenate(weights), (np.concatenate(rows), cols.ravel())),
+                    shape=(nstations, used.size)).tocsr()
+    op.sum_duplicates()
+
+    return {'data':op.data, 'indices':op.indices, 'indptr':op.indptr,
+            'shape':np.array(op.shape),
+            'col_y':used//int(grid_shape[1]), 'col_x':used%int(grid_shape[1])}
+
+
+class StencilCache(object):
+    """Cache of the grid indices and weights used to interpolate from a
+    grid to stations, built once per interpolation method, grid and
+    station list and reused for every predictor and lead time of a run.
+
+    Stations are identified by their coordinates in grid space, which
+    are fixed by the PROJ string, grid spacing and station list, so
+    the key of a stencil is the method, the [y, x] grid shape, and a
+    digest of the station grid coordinates. If cache_dir is set the
+    stencils are also saved there as .npz files and reused by later runs.
+
+    Attributes:
+        cache_dir (str): Directory to save stencils to, or None.
+        hits (int): Number of requests served by a cached stencil.
+        misses (int): Number of requests that built or loaded a stencil.
+    """
+
+    builders = {
+        'bilinear' : bilinear_stencil,
+        'biquadratic' : biquadratic_stencil,
+        'nearest' : nearest_neighbor_stencil,
+        'bilinear_operator' : bilinear_operator,
+        'biquadratic_operator' : biquadratic_operator,
+        'nearest_operator' : nearest_neighbor_operator,
+    }
+
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._stencils = {}
+
+
+    def configure(self, cache_dir=None):
+        """Sets the directory stencils are saved to and loaded from."""
+
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+
+
+    def key(self, method, grid_shape, xind, yind):
+        """Returns the key of the stencil of method for stations at
+        grid coordinates xind, yind on a grid of shape grid_shape.
+        """
+
+        digest = hashlib.sha1()
+        digest.update(str(tuple(int(n) for n in grid_shape)).encode())
+        digest.update(np.ascontiguousarray(xind, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(yind, dtype=np.float64).tobytes())
+        return method + '_' + digest.hexdigest()
+
+
+    def get(self, method, grid_shape, xind, yind):
+        """Returns the stencil dict of method, building it if needed."""
+
+        key = self.key(method, grid_shape, xind, yind)
+        if key in self._stencils:
+            self.hits += 1
+            return self._stencils[key]
+
+        self.misses += 1
+        stencil = self.load(key)
+        if stencil is None:
+            logging.info("Building "+method+" interpolation stencil for grid of shape "+str(tuple(grid_shape)))
+            stencil = self.builders[method](np.asarray(xind), np.asarray(yind), grid_shape)
+            self.save(key, stencil)
+        self._stencils[key] = stencil
+        return stencil
+
+
+    def load(self, key):
+        """Returns the stencil saved under key in cache_dir, or None."""
+
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, key+'.npz')
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as npz:
+                stencil = {k : npz[k] for k in npz.files}
+        except (IOError, OSError, ValueError):
+            logging.warning("Could not read interpolation stencil "+path)
+            return None
+        logging.info("Loaded interpolation stencil "+path)
+        return stencil
+
+
+    def save(self, key, stencil):
+        """Saves stencil under key in cache_dir, if set."""
+
+        if self.cache_dir is None:
+            return
+        path = os.path.join(self.cache_dir, key+'.npz')
+        # Write to a temporary file first so concurrent runs never
+        # read a partially written stencil.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **stencil)
+            os.replace(tmp_path, path)
+        except (IOError, OSError):
+            logging.warning("Could not save interpolation stencil "+path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+    def clear(self):
+        """Drops the stencils held in memory."""
+
+        self._stencils.clear()
+
+
+    def stats(self):
+        """Returns a dict of cache statistics."""
+
+        return {'stencils' : len(self._stencils),
+                'hits' : self.hits,
+                'misses' : self.misses}
+
+
+stencil_cache = StencilCache()
+
+
 def get_projparams(filepath):
     """Gets projection metadata for variable and formats it correctly
     as a dictionary, to be passed into Proj function.
     """
 
-    with Dataset(filepath, mode='r', format="NETCDF4") as nc:
-        vnames = list(nc.variables.keys())
-        pname = [n for n in vnames if 'grid' in n]
-        var = nc.variables[pname[0]]
-        pobj = Camps_data(pname, autofill=False)
-        # Fill metadata dict
-        metadata_exceptions = ['_FillValue']
-        metadata_keys = var.ncattrs()
-        for key in metadata_keys:
-            if key not in metadata_exceptions:
-                value = var.getncattr(key)
-                pobj.add_metadata(key, value)
-        LL_lat = nc.variables['latitude'][0,0]
-        LL_lon = nc.variables['longitude'][0,0]
-        dx = nc.variables['x'].grid_spacing
-        dy = nc.variables['y'].grid_spacing
+    nc = reader.file_pool.dataset(filepath)
+    vnames = list(nc.variables.keys())
+    pname = [n for n in vnames if 'grid' in n]
+    var = nc.variables[pname[0]]
+    pobj = Camps_data(pname, autofill=False)
+    # Fill metadata dict
+    metadata_exceptions = ['_FillValue']
+    metadata_keys = var.ncattrs()
+    for key in metadata_keys:
+        if key not in metadata_exceptions:
+            value = var.getncattr(key)
+            pobj.add_metadata(key, value)
+    LL_lat = nc.variables['latitude'][0,0]
+    LL_lon = nc.variables['longitude'][0,0]
+    dx = nc.variables['x'].grid_spacing
+    dy = nc.variables['y'].grid_spacing
 
     projparams = {}
     for item in pobj.PROJ_string.split(" "):
@@ -11,6 +11,9 @@ kernels are available.  Some are applied more than once.
 Methods:
     smooth_var
     smooth
+    smooth_box
+    window_sum
+    smooth_kernel
 """
 
 
@@ -34,15 +37,106 @@ def smooth_var(w_obj, args):
     w_obj.add_metadata('smooth',args)
 
 
-def smooth(arr, smooth_type):
+def smooth(arr, smooth_type, engine='box'):
     """Given a 2D array arr, smooth with smooth_type.
     Smooth_type can be 5, 9, 25, 81, or 169.
     Smooth_type of 5, 9, and 25 are applied once
     with square smoothing kernels of 5, 9, and 25 equally
     weighted points, respectively.  A smooth_type
-    of 81 is applying the 9-point kernel twice and
+    of 81 is applying the 25-point kernel twice and
     a smooth_type of 169 corresponds to applying
     the same kernel thrice.
+
+    Args:
+        arr (:np.array:): Data dimensioned [days, y, x].
+        smooth_type (int): 5, 9, 25, 81, or 169.
+        engine (str): 'box' to use smooth_box, or 'kernel' to use
+            smooth_kernel.
+
+    Returns:
+        (:np.ma.array:): The smoothed data.
+    """
+
+    if engine == 'box':
+        return smooth_box(arr, smooth_type)
+    elif engine == 'kernel':
+        return smooth_kernel(arr, smooth_type)
+    raise ValueError("Unknown smoothing engine "+str(engine))
+
+
+def smooth_box(arr, smooth_type):
+    """Smooths arr with box filters built from summed-area tables.
+    The sum over each smoothing window is the difference of two cumulative
+    sums taken along x and then along y, so memory use stays a small
+    multiple of the size of arr whatever the size of the kernel.
+
+    Like smooth_kernel, points of the kernel outside of the grid are left out
+    of the mean and masked points count as zero. A point is masked if every
+    point of its kernel is masked. The 81 and 169 point smoothers apply the
+    25 point kernel two and three times, respectively.
+    """
+
+    smooth_type = int(smooth_type)
+    allowable_smoothing = [5,9,25,81,169]
+    assert smooth_type in allowable_smoothing
+    assert len(arr.shape) == 3
+
+    if smooth_type in [81,169]:
+        passes = 2 if smooth_type == 81 else 3
+        out = arr
+        for n in range(passes):
+            out = smooth_box(out, 25)
+        return out
+
+    if smooth_type == 5 or smooth_type==9:
+        window = 1
+    elif smooth_type == 25:
+        window = 2
+
+    mask = np.ma.getmaskarray(arr)
+    data = np.where(mask, 0., np.ma.getdata(arr)).astype(np.float64)
+    valid = (~mask).astype(np.float64)
+    ny = arr.shape[1]
+    nx = arr.shape[2]
+    cnt_y = window_sum(np.ones(ny), window, 0)
+    cnt_x = window_sum(np.ones(nx), window, 0)
+
+    # The 5 point kernel is the 3 points along y plus the 3 points
+    # along x, less the center point counted by both.
+    if smooth_type == 5:
+        sum_arr = window_sum(data, window, 1) + window_sum(data, window, 2) - data
+        valid_arr = window_sum(valid, window, 1) + window_sum(valid, window, 2) - valid
+        cnt_arr = cnt_y[:,None] + cnt_x[None,:] - 1
+    else:
+        sum_arr = window_sum(window_sum(data, window, 2), window, 1)
+        valid_arr = window_sum(window_sum(valid, window, 2), window, 1)
+        cnt_arr = cnt_y[:,None] * cnt_x[None,:]
+
+    return np.ma.array(sum_arr/cnt_arr, mask=valid_arr<0.5)
+
+
+def window_sum(arr, window, axis):
+    """Returns the sum of arr over [i-window, i+window] along axis for
+    every index i, leaving out indices outside of the array.
+    """
+
+    n = arr.shape[axis]
+    shape = list(arr.shape)
+    shape[axis] = 1
+    csum = np.concatenate((np.zeros(shape), np.cumsum(arr, axis=axis)), axis=axis)
+    upper = np.minimum(np.arange(n)+window+1, n)
+    lower = np.maximum(np.arange(n)-window, 0)
+    return np.take(csum, upper, axis=axis) - np.take(csum, lower, axis=axis)
+
+
+def smooth_kernel(arr, smooth_type):
+    """Given a 2D array arr, smooth with smooth_type by gathering
+    every point of the kernel into an array of shape arr.shape+(L,L).
+    Smooth_type can be 5, 9, 25, 81, or 169.
+
+    Note:
+        The 169 point smoother returns the result of the second pass
+        of the 25 point kernel.
     """
 
     smooth_type = int(smooth_type)
@@ -57,9 +151,9 @@ def smooth(arr, smooth_type):
     # For 81 and 169 point smoothing, apply 25 point smoothing 2x or
     # 3x respectively.
     if smooth_type in [81,169]:
-        out = smooth(arr, 25)
-        out = smooth(out, 25)
-        if smooth_type == 169: smooth(out, 25)
+        out = smooth_kernel(arr, 25)
+        out = smooth_kernel(out, 25)
+        if smooth_type == 169: smooth_kernel(out, 25)
         return out
 
     if smooth_type == 5 or smooth_type==9:
@@ -115,12 +115,11 @@ def grid_binary(c_obj, operator_str, threshold, unit):
     for index, proc in enumerate(c_obj.processes):
         if 'BinaryGrid' in proc.name:
             break
-    bgrid = c_obj.processes[index]
-    bgrid.add_attribute('operator', operator_str)
-    bgrid.add_attribute('threshold_value', threshold)
-    bgrid.add_attribute('threshold_units', unit)
+    # The process is interned and shared, so it is replaced by the one
+    # with the threshold attributes.
+    c_obj.processes[index] = c_obj.processes[index].with_attributes(
+        operator=operator_str, threshold_value=threshold, threshold_units=unit)
     # The data of grid binary has no units.
-    c_obj.units = 'dimensionless'
     c_obj.metadata.update( {'units' : 'dimensionless'} )
 
 
@@ -148,6 +148,13 @@ def read_prefixes():
     return read_nc_meta()['prefixes']
 
 
+def read_io_profiles():
+    """Reads and returns the chunking and compression profiles used
+    when writing data variables."""
+
+    return read_nc_meta()['io_profiles']
+
+
 def read_variables():
     """returns structured configuration of all CAMPS supported variables."""
 
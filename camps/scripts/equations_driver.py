@@ -158,17 +158,15 @@ def get_predictors(pred_file, times, fcst_ref_time, control, lead_times, station
                 smooth, arg = procedures.get_procedure(entry_dict['Procedure'][indices[0]])
                 pred_dict['smooth'] = int(arg[0])
 
-        # Loop through lead times and fetch metadata and data for given predictor
-        for i,L in enumerate(leads):
-            lead = parse_pred.lead_time(L)
-            pred_dict['reserved2'] = lead
-            logging.info('pred_dict is:'+str(pred_dict))
-
-            # Fetch predictor
-            vars_arr = []
-            for filepath in control.predictor_data_file:
-                var = reader.read_var(filepath=filepath, forecast_time=times,**pred_dict)
-                vars_arr.append(var)
+        # Fetch metadata and data of all lead times of the predictor from each file in one call
+        leads = [parse_pred.lead_time(L) for L in leads]
+        requests = {i : dict(pred_dict, reserved2=lead) for i,lead in enumerate(leads)}
+        logging.info('pred_dict is:'+str(pred_dict)+' for lead times '+str(leads))
+        fetched = [reader.read_var_batch(filepath, requests, forecast_time=times) for filepath in control.predictor_data_file]
+
+        # Loop through lead times and stack data for given predictor
+        for i,lead in enumerate(leads):
+            vars_arr = [f[i] for f in fetched]
             if None in vars_arr:
                 logging.warning('Could not fetch all '+pred_dict['property']+'  predictors for lead time '+str(lead))
                 logging.warning(str(vars_arr))
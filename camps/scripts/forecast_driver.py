@@ -101,15 +101,14 @@ def main(control_file=None):
         # Adjust entry_dict for fetch
         pred_dict['reserved1'] = 'vector'
 
-        # loop through lead times and fetch
-        for i,L in enumerate(leads):
-            lead = parse_pred.lead_time(L)
-            pred_dict['reserved2'] = lead
-            # Fetch predictors for each date and then stack data
-            pred_arr = []
-            for filepath in control.predictor_data_path:
-                variable = reader.read_var(filepath=filepath, forecast_time=times,**pred_dict)
-                pred_arr.append(variable)
+        # Fetch all lead times of the predictor from each file in one call
+        leads = [parse_pred.lead_time(L) for L in leads]
+        requests = {i : dict(pred_dict, reserved2=lead) for i,lead in enumerate(leads)}
+        fetched = [reader.read_var_batch(filepath, requests, forecast_time=times) for filepath in control.predictor_data_path]
+
+        # loop through lead times and stack data
+        for i,lead in enumerate(leads):
+            pred_arr = [f[i] for f in fetched]
             if None in pred_arr:
                 logging.warning('Could not fetch all '+pred_dict['property']+' predictors for lead time '+str(lead))
                 logging.warning(str(pred_arr))
@@ -158,8 +157,9 @@ def main(control_file=None):
     valid_min = None
     valid_max = None
     eq_dict['stations'] = np.array(util.station_trunc(eq_dict['stations']))
+    # Apply all equations at once
+    forecasts, eq_st_index = apply_equations(eq_dict, predictors, stations, len(predictands))
     for p in range(len(predictands)):
-        # Loop through stations
         output_name = predictands[p].name
         output_data = np.ma.zeros(predictands[p].data.shape)
         # Attempt to get a valid min and max for predictand. If no valid min, set to 0. If no valid max, pass.
@@ -171,30 +171,8 @@ def main(control_file=None):
             valid_max = predictands[p].valid_max
         except:
             pass
-        for ns,s in enumerate(stations):
-            st_index = np.where(eq_dict['stations'] == s)[0]
-            try:
-                st_index = st_index[0]
-            except:
-                continue
-            const = eq_dict['equations'][st_index,-1,p]
-            coefs = eq_dict['equations'][st_index,0:-1,p]
-
-            assert len(coefs)==len(predictors),"number of coefficients and number of predictors must be equal"
-            tot = np.ma.zeros(predictands[p].data[:,st_index].size)
-            # Loop through coefs
-            for nf,coef in enumerate(coefs):
-                # Use coef, const, and predictor data to calculate new forecast
-                pred_index = np.where(predictors[nf].location.get_stations() == s)[0][0]
-                if len(predictors[nf].data.shape) > 2:
-                    datapoint = predictors[nf].data[:,pred_index,0]
-                else:
-                    datapoint = predictors[nf].data[:,pred_index]
-                tot+= datapoint * coef
-            tot += const
-            logging.info(str(predictands[p].data[:,st_index])+' at '+str(s))
-            logging.info(str(tot)+' at '+str(s))
-            output_data[:,st_index] = tot[:]
+        output_data[:,eq_st_index] = forecasts[:,:,p]
+        logging.info(output_name+' forecasts created for '+str(len(eq_st_index))+' stations')
         if valid_min:
             output_data[output_data<valid_min] = np.ma.masked
         if valid_max:
@@ -229,7 +207,65 @@ def main(control_file=None):
     outputs.append(lon_obj)
     # Write forecasts to output file
     logging.info('Writing to '+control.output_file)
-    write(outputs, control.output_file)
+    write(outputs, control.output_file, profile=getattr(control, 'io_profile', None))
+
+
+def apply_equations(eq_dict, predictors, stations, num_predictands):
+    """Applies the equations for every station and predictand at once.
+    Each predictor is aligned to the equation station order once and stacked
+    into a [time, station, predictor] array, which is contracted against
+    MOS_Equations with a single einsum.
+
+    Returns:
+        forecasts (:np.ma.array:): Forecasts dimensioned [time, station, predictand].
+        eq_st_index (:np.array:): Index into the equation stations of each
+            forecast station. Stations without an equation are left out.
+    """
+
+    equations = eq_dict['equations']
+    assert equations.shape[1]-1 == len(predictors),"number of coefficients and number of predictors must be equal"
+
+    # Equation index of each station, keeping stations that have an equation
+    eq_index = station_index_map(eq_dict['stations'])
+    eq_st_index = np.array([eq_index.get(s, -1) for s in stations], dtype=int)
+    eq_st_index = eq_st_index[eq_st_index >= 0]
+    eq_stations = [eq_dict['stations'][i] for i in eq_st_index]
+
+    # Stack predictors into [time, station, predictor], aligned to eq_stations
+    num_times = predictors[0].data.shape[0]
+    pred_data = np.zeros((num_times,len(eq_st_index),len(predictors)), dtype='float64')
+    pred_mask = np.zeros((num_times,len(eq_st_index)), dtype=bool)
+    for nf,pred in enumerate(predictors):
+        pred_index = station_index_map(pred.location.get_stations())
+        locs = np.array([pred_index.get(s, -1) for s in eq_stations], dtype=int)
+        data = pred.data
+        if len(data.shape) > 2:
+            data = data[:,:,0]
+        values = data[:,np.where(locs >= 0, locs, 0)]
+        pred_data[:,:,nf] = np.ma.getdata(values)
+        pred_mask |= np.ma.getmaskarray(values)
+        pred_mask[:,locs < 0] = True
+
+    # Coefficients are dimensioned [station, predictor, predictand]
+    coefs = equations[eq_st_index,0:-1,0:num_predictands]
+    const = equations[eq_st_index,-1,0:num_predictands]
+    eq_mask = np.any(np.ma.getmaskarray(coefs), axis=1) | np.ma.getmaskarray(const)
+    coefs = np.ma.filled(coefs, 0).astype('float64')
+    const = np.ma.filled(const, 0).astype('float64')
+
+    forecasts = np.einsum('tsk,skp->tsp', pred_data, coefs, optimize=True) + const
+    mask = pred_mask[:,:,None] | eq_mask[None,:,:]
+
+    return (np.ma.array(forecasts, mask=mask), eq_st_index)
+
+
+def station_index_map(stations):
+    """Returns a dict mapping each station to the index of its first occurrence."""
+
+    index = {}
+    for i,s in enumerate(stations):
+        index.setdefault(s, i)
+    return index
 
 
 def read_equations(filename):
@@ -263,7 +299,7 @@ def process_vars(selected_stations, vars_arr, lats, lons):
         lats = np.array(lats)[indices2]
         lons = np.array(lons)[indices2]
     for i,var in enumerate(vars_arr):
-        var.data = var.data[:,indices]
+        var.slice_data((slice(None),indices))
         if i==0:
             stacked_var = copy.copy(var)
         else:
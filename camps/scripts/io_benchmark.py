@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+import sys
+import os
+import time
+import shutil
+import tempfile
+import argparse
+import logging
+import numpy as np
+from netCDF4 import Dataset
+
+from ..core import reader
+from ..core import writer
+from ..registry import util as cfg
+
+
+"""Module: io_benchmark.py
+
+Rewrites the primary variables of a CAMPS netCDF file with each I/O profile
+in netcdf.yaml and reports the write and read throughput of each.
+
+Usage:
+    python -m camps.scripts.io_benchmark input.nc [-p profile ...] [-r repeats]
+
+Methods:
+    main
+    benchmark_profile
+    read_patterns
+    time_reads
+"""
+
+
+def main():
+    """Runs the benchmark for each profile and prints a table of results."""
+
+    parser = argparse.ArgumentParser(description="Write and read throughput of the CAMPS I/O profiles.")
+    parser.add_argument('input', help="CAMPS netCDF file whose primary variables are rewritten")
+    parser.add_argument('-p', '--profiles', nargs='+', default=None,
+                        help="Profiles to benchmark. Default is all in netcdf.yaml")
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help="Number of times each read pattern is timed; the best is reported")
+    parser.add_argument('-d', '--directory', default=None,
+                        help="Directory for the rewritten files. Default is a temporary directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    profiles = args.profiles
+    if profiles is None:
+        profiles = list(cfg.read_io_profiles().keys())
+
+    directory = args.directory
+    cleanup = directory is None
+    if cleanup:
+        directory = tempfile.mkdtemp(prefix='camps_io_')
+
+    camps_data = reader.read(args.input)
+    reader.file_pool.close(args.input)
+    nbytes = sum(d.data.nbytes for d in camps_data if d.data is not None)
+
+    results = []
+    try:
+        for profile in profiles:
+            filename = os.path.join(directory, profile + '.nc')
+            results.append(benchmark_profile(camps_data, filename, profile, args.repeats))
+    finally:
+        if cleanup:
+            shutil.rmtree(directory)
+
+    mb = 1024.0 * 1024.0
+    print("Input: " + args.input + " (" + '%.1f' % (nbytes/mb) + " MB of data)")
+    header = ['profile', 'file MB', 'write MB/s', 'read MB/s', 'timeseries ms', 'field ms']
+    print(' '.join('%16s' % h for h in header))
+    for result in results:
+        seconds, read_bytes = result['reads']['full']
+        row = [result['profile'], '%.2f' % (result['size']/mb), '%.1f' % (nbytes/mb/result['write']),
+               '%.1f' % (read_bytes/mb/seconds)]
+        for pattern in ['timeseries', 'field']:
+            row.append('%.2f' % (1000*result['reads'][pattern][0]))
+        print(' '.join('%16s' % r for r in row))
+
+
+def benchmark_profile(camps_data, filename, profile, repeats=3):
+    """Writes camps_data to filename with profile and times the reads of
+    read_patterns.
+
+    Returns:
+        dict: The profile name, write time in seconds, file size in bytes, and
+            the best time and bytes read of each read pattern.
+    """
+
+    start = time.time()
+    writer.write(camps_data, filename, profile=profile)
+    write_time = time.time() - start
+
+    reads = time_reads(filename, repeats)
+
+    return {'profile' : profile, 'write' : write_time,
+            'size' : os.path.getsize(filename), 'reads' : reads}
+
+
+def read_patterns(nc_var):
+    """Returns the index of each read pattern benchmarked for a variable.
+
+    full:       The whole variable.
+    timeseries: Every time and lead time of one station or grid point.
+    field:      Every station or grid point of one time and lead time.
+    """
+
+    spatial = ['x', 'y', 'stations']
+    timeseries = tuple(0 if d in spatial else slice(None) for d in nc_var.dimensions)
+    field = tuple(slice(None) if d in spatial else 0 for d in nc_var.dimensions)
+
+    return {'full' : Ellipsis, 'timeseries' : timeseries, 'field' : field}
+
+
+def time_reads(filename, repeats=3):
+    """Times each read pattern over the primary variables of filename, with
+    a fresh file handle each time so no chunks are cached.
+
+    Returns:
+        dict: The best time in seconds and bytes read of each pattern.
+    """
+
+    nc = Dataset(filename)
+    names = [n for n in nc.primary_variables.split()
+             if n in nc.variables and len(nc.variables[n].dimensions) > 1]
+    patterns = list(read_patterns(nc.variables[names[0]]).keys()) if names else []
+    nc.close()
+
+    reads = {}
+    for pattern in patterns:
+        best = None
+        for repeat in range(repeats):
+            nc = Dataset(filename)
+            read_bytes = 0
+            start = time.time()
+            for name in names:
+                nc_var = nc.variables[name]
+                data = nc_var[read_patterns(nc_var)[pattern]]
+                read_bytes += np.asarray(data).nbytes
+            seconds = time.time() - start
+            nc.close()
+            if best is None or seconds < best:
+                best = seconds
+        reads[pattern] = (max(best, 1e-9), read_bytes)
+
+    return reads
+
+
+if __name__ == '__main__':
+    main()
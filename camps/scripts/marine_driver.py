@@ -163,7 +163,7 @@ def main():
 
     # Write list of Camps data objects to netCDF4 file
     extra_globals = get_globals()
-    writer.write(camps_data, filename, extra_globals)
+    writer.write(camps_data, filename, extra_globals, profile=getattr(control, 'io_profile', None))
 
     if log_file:
         out_log.close()
@@ -73,12 +73,17 @@ def main():
     stn_lst,stn_tbl = util.read_station_table(station_table,stn_lst)
 
     # This will read the CSV files and put them into stations
-    reader = read_obs(input_data,dates,stn_tbl,stn_lst,qc_flag)
+    if getattr(control, 'columnar_reader', False):
+        # Stations are read straight into numpy arrays
+        reader = read_obs_columnar(input_data,dates,stn_tbl,stn_lst,qc_flag)
+        stations = reader.station_list
+    else:
+        reader = read_obs(input_data,dates,stn_tbl,stn_lst,qc_flag)
 
-    # Convert all arrays to numpy arrays
-    logging.info("Converting station arrays to numpy arrays")
-    stations = reader.station_list
-    stations = convert_to_numpy(stations)
+        # Convert all arrays to numpy arrays
+        logging.info("Converting station arrays to numpy arrays")
+        stations = reader.station_list
+        stations = convert_to_numpy(stations)
     fix_rounding_errors(stations)
 
     # Optionally pickle and save
@@ -88,7 +93,7 @@ def main():
 
     # Check if QC is to be performed
     if control.qc_flag:
-        stations = qc_main.qc(stations,err_file)
+        stations = qc_main.qc(stations,err_file,getattr(control, 'vectorized_qc', False))
         # Take off the start and end times from the arrays
         remove_time_buffer(stations)
 
@@ -117,6 +122,19 @@ def main():
     logging.info("start time: " + start_time)
     logging.info("end time:   " + end_time)
 
+    if qc_flag:
+        extra_globals = {"source": "Data from METAR with MDL Quality Control"}
+    else:
+        extra_globals = {"source": "Data from METAR (No MDL Quality Control)"}
+
+    # In write-behind mode, each observation is written by a writer process
+    # while the next is constructed.
+    write_behind = None
+    if getattr(control, 'write_behind', False):
+        write_behind = writer.WriteBehindWriter(filename, extra_globals,
+                                                profile=getattr(control, 'io_profile', None),
+                                                max_queue=getattr(control, 'write_queue_size', 8))
+
     met_to_nc = cfg.read_metar_nc_lookup()
     for metar_name in obs:
         # Set the observation name to the standard CAMPS name
@@ -172,35 +190,44 @@ def main():
         if len(camps_obj.data.shape)>1:
             camps_obj.data = np.transpose(camps_obj.data)
 
-        camps_data.append(camps_obj)
+        if write_behind is not None:
+            unscale_precip(camps_obj)
+            write_behind.write(camps_obj)
+        else:
+            camps_data.append(camps_obj)
 
     camps_obj = pack_station_names(list(stations.keys()))
     camps_obj.add_source('METAR')
     camps_data.append(camps_obj)
 
-    if qc_flag:
-        extra_globals = {"source": "Data from METAR with MDL Quality Control"}
-    else:
-        extra_globals = {"source": "Data from METAR (No MDL Quality Control)"}
-
-    # TEMPORARY: Need to perform 2 actions here. We should do this elsewhere, but here for now...
-    #
-    # 1) Unscale precip obs. Precip obs in MDL hourly table are units of hundreths of inches
-    #    (i.e. 1.00 inches is 100).
-    # 2) Trace amounts in the MDL hourly table are coded as -4.  Here we need to set these
-    #    to a "defined" trace amount as float of value 0.004.
     for c in camps_data:
-        if "precipitation_amount" in c.standard_name:
-            c.data = np.where(np.logical_and(c.data>=0.0,c.data<9999.),c.data/100.0,c.data)
-            c.data = np.where(c.data==-4,np.float32(0.004),c.data)
-    # TEMPORARY
+        unscale_precip(c)
 
     # Write into netCDF4 file
-    writer.write(camps_data, filename, extra_globals)
+    if write_behind is not None:
+        write_behind.write(camps_data)
+        write_behind.close()
+    else:
+        writer.write(camps_data, filename, extra_globals, profile=getattr(control, 'io_profile', None))
     if log_file:
         out_log.close()
 
 
+def unscale_precip(camps_obj):
+    """TEMPORARY: Need to perform 2 actions here. We should do this elsewhere, but here for now...
+
+    1) Unscale precip obs. Precip obs in MDL hourly table are units of hundreths of inches
+       (i.e. 1.00 inches is 100).
+    2) Trace amounts in the MDL hourly table are coded as -4.  Here we need to set these
+       to a "defined" trace amount as float of value 0.004.
+    """
+
+    c = camps_obj
+    if "precipitation_amount" in c.standard_name:
+        c.data = np.where(np.logical_and(c.data>=0.0,c.data<9999.),c.data/100.0,c.data)
+        c.data = np.where(c.data==-4,np.float32(0.004),c.data)
+
+
 def check_num_procs(num_procs):
     """Returns the minimum of the requested number of processors
     and the available number of processors.
@@ -20,8 +20,8 @@ from ..mospred import interp as interp
 
 from ..core import Time as Time
 from ..core import Camps_data as Camps_data
-from ..core.writer import write
-from ..core.reader import read_var
+from ..core.writer import write, WriteBehindWriter
+from ..core.reader import read_var, read_var_batch, file_pool, configure_index
 from ..core import util as util
 from ..registry.constants import international_units
 
@@ -96,6 +96,13 @@ def main():
         logging.error("Logging setup failed")
         raise
 
+    # Set the limits of the pool of open netCDF file handles
+    file_pool.configure(max_open_files=getattr(control, 'max_open_files', None),
+                        max_bytes=getattr(control, 'max_open_bytes', None))
+    configure_index(sidecar=getattr(control, 'metadata_index_sidecar', False))
+    interp.stencil_cache.configure(cache_dir=getattr(control, 'stencil_cache_dir', None))
+    interp.configure_engine(getattr(control, 'interp_engine', 'gather'))
+
     #---------------------------------------------------------------------------
     # Get station information and lat/lon info and create camps objects for each
     #---------------------------------------------------------------------------
@@ -144,6 +151,10 @@ def main():
         # Retrieve predictands and write to file
         get_predictands(pred_file, date_range_list, selected_stations, selected_station_defs, control,lons,lats, lead_times, fcst_ref_time)
 
+    logging.info("netCDF file pool: "+str(file_pool.stats()))
+    logging.info("Interpolation stencil cache: "+str(interp.stencil_cache.stats()))
+    file_pool.close_all()
+
 
 
 def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, selected_stations, selected_station_defs, xi_x, xi_y, lead_times, lat_obj, lon_obj, station_obj):
@@ -200,8 +211,20 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
     computed_vars = [[] for _ in range(len(control.predictor_data_path))]
     input_len = len(control.predictor_data_path)
     time_dim_name = cfg.read_dimensions()['time']
+    io_profile = getattr(control, 'io_profile', None)
+    streamed = False
     for file_ind, input_file in enumerate(control.predictor_data_path):
 
+        # In write-behind mode, predictors that are not combined with those of other
+        # input files are finalized and written by a writer process as they are computed.
+        write_behind = None
+        outfile = get_streamed_outfile(control, file_ind, input_len)
+        if getattr(control, 'write_behind', False) and outfile is not None:
+            write_behind = WriteBehindWriter(outfile, control.components, profile=io_profile,
+                                             max_queue=getattr(control, 'write_queue_size', 8))
+            num_written = 0
+            streamed = True
+
         #--------------------------------------------------------------------------
         # Main loop to fetch/create, apply procedures, and interpolate predictors
         # onto stations
@@ -234,12 +257,18 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
             logging.info("Processing date range beginning on date: "+str(Time.epoch_to_datetime(times[0]))[:10])
 
 
+            # Fetch the exact variables asked for from the file in one call.
+            # Their data is read lazily, as each predictor is processed.
+            requests = {}
+            for n,pred in enumerate(formatted_predictors):
+                pred['search_metadata']['reserved1'] = 'grid'
+                requests[n] = pred['search_metadata']
+            fetched = read_var_batch(input_file, requests, forecast_time=times)
+
             # Loop through predictors
             for n,pred in enumerate(formatted_predictors):
                 logging.info("Property: "+ str(pred['search_metadata']['property']))
-                pred['search_metadata']['reserved1'] = 'grid'
-                # Try to fetch the exact variable asked for
-                variable = read_var(filepath=input_file, forecast_time=times,**pred['search_metadata'])
+                variable = fetched[n]
 
                 # If the call to fetch doesn't find the variable,
                 # then see if it can be calculated.
@@ -251,7 +280,21 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
                     variable = procedures.apply_procedures(variable, pred['procedures'], xi_x, xi_y)
                     # Add leadtime to the camps object.
                     variable.add_metadata('leadtime', pred['leadTime'])
-                    computed_vars[file_ind].append(variable)
+                    if write_behind is not None:
+                        try:
+                            finalize_predictor(variable, num_written, leads_list, time_dim_name)
+                            write_behind.write(check_units([variable]))
+                        except:
+                            write_behind.close()
+                            raise
+                        num_written += 1
+                    else:
+                        computed_vars[file_ind].append(variable)
+
+        if write_behind is not None:
+            write_behind.write([lat_obj, lon_obj, station_obj])
+            write_behind.close()
+            continue
 
 
         # Check if outfile in control is a list. If yes, determine that length of list
@@ -260,7 +303,7 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
             if len(control.predictor_outfile)==input_len:
                 # Set current output file
                 outfile = control.predictor_outfile[file_ind]
-                finalize_predictors(outfile, computed_vars[file_ind], lat_obj, lon_obj, station_obj, leads_list, time_dim_name, control.components)
+                finalize_predictors(outfile, computed_vars[file_ind], lat_obj, lon_obj, station_obj, leads_list, time_dim_name, control.components, getattr(control, 'io_profile', None))
             elif len(control.predictor_outfile)>1 and len(control.predictor_outfile)!=input_len:
                 # If length of output file list greater than 1 but not equal to length of input file list:
                 # raise error
@@ -268,6 +311,8 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
 
 
     # Check if outfile is a list of length 1 or a string.
+    if streamed:
+        return
     if ((isinstance(control.predictor_outfile,list) and len(control.predictor_outfile)==1) or (isinstance(control.predictor_outfile,str))):
         if isinstance(control.predictor_outfile,list):
             outfile = control.predictor_outfile[0]
@@ -281,23 +326,47 @@ def get_predictors(control, predictor_file, fcst_ref_time, date_range_list, sele
              for m,pred in enumerate(preds):
                  combined_predictors[m] += pred
              
-        finalize_predictors(outfile, combined_predictors, lat_obj, lon_obj, station_obj, leads_list, time_dim_name, control.components)
+        finalize_predictors(outfile, combined_predictors, lat_obj, lon_obj, station_obj, leads_list, time_dim_name, control.components, getattr(control, 'io_profile', None))
+
+
+
+def get_streamed_outfile(control, file_ind, input_len):
+    """Returns the output file of the predictors of input file file_ind if they
+    are written on their own, or None if they are combined with the predictors
+    of the other input files.
+    """
+
+    outfile = control.predictor_outfile
+    if isinstance(outfile,list) and len(outfile)>1:
+        if len(outfile)==input_len:
+            return outfile[file_ind]
+        return None
+    if input_len==1:
+        if isinstance(outfile,list):
+            return outfile[0]
+        return outfile
+    return None
+
+
+def finalize_predictor(pred, n, leads_list, time_dim_name):
+    """Prepares the n-th predictor of an output file to be written."""
 
+    pred.properties['reserved2'] = leads_list[n%len(leads_list)]
+    if 'filepath' in list(pred.metadata.keys()):
+        fp = pred.metadata.pop('filepath')
+    pred.dimensions.insert(0, time_dim_name)
 
 
-def finalize_predictors(outfile,combined_predictors,lat_obj,lon_obj,station_obj,leads_list,time_dim_name,components):
+def finalize_predictors(outfile,combined_predictors,lat_obj,lon_obj,station_obj,leads_list,time_dim_name,components,io_profile=None):
 
     for n,pred in enumerate(combined_predictors):
-        pred.properties['reserved2'] = leads_list[n%len(leads_list)]
-        if 'filepath' in list(pred.metadata.keys()):
-            fp = pred.metadata.pop('filepath')
-        pred.dimensions.insert(0, time_dim_name)
+        finalize_predictor(pred, n, leads_list, time_dim_name)
     combined_predictors = check_units(combined_predictors)
 
     combined_predictors.append(lat_obj)
     combined_predictors.append(lon_obj)
     combined_predictors.append(station_obj)
-    write(combined_predictors, outfile, components)
+    write(combined_predictors, outfile, components, profile=io_profile)
 
 
 
@@ -412,7 +481,7 @@ def get_predictands(predictand_file, date_range_list, selected_stations, selecte
         predictands.append(lon_obj)
 
         #write list of predictands to netcdf file
-        write(predictands, control.predictand_outfile, control.components)
+        write(predictands, control.predictand_outfile, control.components, profile=getattr(control, 'io_profile', None))
     else:
         logging.error('\n\n\nNO predictand data fetched or created for given date ranges and strides!!\n\n')
 
@@ -449,10 +518,15 @@ def process_vars(selected_stations, var_list, lats, lons):
         # Loop over array of times and then stack the variables together
         phenom_times = []
         for i,var in enumerate(vars_arr):
-            if var.data.shape[1]==len(indices2):
-                var.data = var.data[:,indices2][:,uniq_ind]
-            elif var.data.shape[1]==len(indices):
-                var.data = var.data[:,indices][:,uniq_ind]
+            # Data not yet read from file is sliced lazily, so only the
+            # selected stations and times are read.
+            nstations = var.get_lazy_data().shape[1]
+            if nstations==len(indices2):
+                var.slice_data((slice(None),indices2))
+                var.slice_data((slice(None),uniq_ind))
+            elif nstations==len(indices):
+                var.slice_data((slice(None),indices))
+                var.slice_data((slice(None),uniq_ind))
             if var.location is not None:
                 var.location.set_stations(stations)
 
@@ -463,7 +537,7 @@ def process_vars(selected_stations, var_list, lats, lons):
                 phenom_inds = np.where(~np.isin(var.get_phenom_time().data,phenom_times))[0]
                 if len(phenom_inds)==0: continue
                 else:
-                    var.data = var.data[phenom_inds,:]
+                    var.slice_data((phenom_inds,slice(None)))
                     var.get_phenom_time().data = var.get_phenom_time().data[phenom_inds]
                     stacked_data += var
                     phenom_times.extend(var.get_phenom_time().data)
@@ -562,14 +636,11 @@ def check_units(pred):
             logging.info("pred units, "+p_units+", do not match unit standards, "+int_units+". Converting.")
             p_data = np.ma.array(p_data).astype(np.float)
             p_data[:] = convert_units(p_data,p_name,p_units,int_units,Q)
-            p.units = int_units
             p.metadata['units'] = int_units
             if hasattr(p,'valid_max'):
-                p.valid_max = float(convert_units(p.valid_max,p_name,p_units,int_units,Q))
-                p.metadata['valid_max'] = p.valid_max
+                p.metadata['valid_max'] = float(convert_units(p.valid_max,p_name,p_units,int_units,Q))
             if hasattr(p,'valid_min'):
-                p.valid_min = float(convert_units(p.valid_min,p_name,p_units,int_units,Q))
-                p.metadata['valid_min'] = p.valid_min
+                p.metadata['valid_min'] = float(convert_units(p.valid_min,p_name,p_units,int_units,Q))
         p.data = np.ma.array(p_data, mask=p_mask)
 
     return pred
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from camps.mospred import interp
+
+
+"""Regression tests of the array-based budget interpolation in
+camps.mospred.interp against the per-point np.nditer implementation
+it replaced.
+"""
+
+
+def reference_budget_preprocess(a):
+    """The per-point pre-processing of the original budget_interp."""
+
+    ny = a.shape[1]
+    nx = a.shape[2]
+
+    adata = np.ma.getdata(a)
+
+    awork = np.ma.copy(a)
+    awork.soften_mask()
+    awdata = np.ma.getdata(awork)
+    awmask = np.ma.getmaskarray(awork)
+
+    it = np.nditer([adata,awdata],flags=['multi_index',],op_flags=[['readonly'],['readwrite']])
+    for a1,aw1 in it:
+        d = it.multi_index[0]
+        j = it.multi_index[1]
+        i = it.multi_index[2]
+        asum = 0.
+        acount = 0
+        if a1[...] <= 0.0:
+            if j+1 in range(ny):
+                asum += adata[d,j+1,i]
+                acount += 1
+            if j-1 in range(ny):
+                asum += adata[d,j-1,i]
+                acount += 1
+            if i+1 in range(nx):
+                asum += adata[d,j,i+1]
+                acount += 1
+            if i-1 in range(nx):
+                asum += adata[d,j,i-1]
+                acount += 1
+            if acount > 0:
+                aw1[...] = -1.0*(asum/np.float32(acount))
+
+    return np.ma.array(awdata,mask=awmask)
+
+
+def reference_bilinear_interp(model_values,xind,yind):
+    """The original bilinear_interp."""
+
+    xi = xind.astype(int)
+    yi = yind.astype(int)
+    dx = xind-xi
+    dy = yind-yi
+
+    xi[xi<0] = 0
+    yi[yi<0] = 0
+    xi[xi>model_values.shape[2]-2] = model_values.shape[2]-2
+    yi[yi>model_values.shape[1]-2] = model_values.shape[1]-2
+
+    xi1 = xi+1
+    yi1 = yi+1
+
+    data = model_values[:,yi,xi] + \
+              (model_values[:,yi,xi1]-model_values[:,yi,xi])*dx + \
+              (model_values[:,yi1,xi]-model_values[:,yi,xi])*dy + \
+              (model_values[:,yi,xi]+model_values[:,yi1,xi1]-model_values[:,yi1,xi]-model_values[:,yi,xi1])*dx*dy
+
+    return data
+
+
+def reference_budget_interp(a,xind,yind):
+    """The original budget_interp."""
+
+    data = reference_bilinear_interp(reference_budget_preprocess(a), xind, yind)
+    data[data<0.0] = 0.0
+    return data
+
+
+def precip_grid(shape, dtype, seed=0):
+    """Returns a [days, y, x] masked grid of precipitation amounts with
+    zeros, negative values and a few masked points.
+    """
+
+    rng = np.random.default_rng(seed)
+    data = rng.gamma(0.5, 2.0, size=shape)
+    data[rng.random(shape) < 0.4] = 0.
+    data[rng.random(shape) < 0.05] = -1.
+    mask = rng.random(shape) < 0.05
+    return np.ma.array(data.astype(dtype), mask=mask)
+
+
+def assert_identical(result, expected):
+    assert result.dtype == expected.dtype
+    assert np.array_equal(np.ma.getdata(result), np.ma.getdata(expected))
+    assert np.array_equal(np.ma.getmaskarray(result), np.ma.getmaskarray(expected))
+
+
+SHAPES = [(3, 17, 23), (2, 1, 9), (2, 8, 1), (1, 1, 1)]
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('shape', SHAPES)
+def test_budget_preprocess(dtype, shape):
+    a = precip_grid(shape, dtype)
+    assert_identical(interp.budget_preprocess(a), reference_budget_preprocess(a))
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('shape', SHAPES)
+def test_budget_interp(dtype, shape):
+    a = precip_grid(shape, dtype, seed=1)
+    rng = np.random.default_rng(2)
+    xind = rng.uniform(-1., shape[2], 40)
+    yind = rng.uniform(-1., shape[1], 40)
+    interp.stencil_cache.clear()
+    assert_identical(interp.budget_interp(a, xind.copy(), yind.copy()),
+                     reference_budget_interp(a, xind.copy(), yind.copy()))
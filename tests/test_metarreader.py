@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from camps.core.data_conversion.metar_to_nc import util
+from camps.core.data_conversion.metar_to_nc.station import MISSING_VALUE
+
+
+"""Regression tests of the columnar METAR reader of
+camps.core.data_conversion.metar_to_nc against the record based reader,
+on a small synthetic MDL hourly file.
+"""
+
+
+KEYS = ['TYPE','LAT','LON','TIME','TMP','DEW','PRWX1','PRWX2','PRWX3','VIS','WDR','WSP','GST',
+        'MSL','ALT','CA1','CH1','CA2','CH2','CA3','CH3','CA4','CH4','CA5','CH5','CA6','CH6',
+        '1PCP','3PCP','6PCP','24PP','SUN','MX6','MN6','X24','N24','SND','SNF','SAE','SEE',
+        'SAW','SEW']
+
+DATES = ['2018010100', '2018010101', '2018010102']
+
+STATIONS = {'KAAA' : (40.00, -75.00), 'KBBB' : (41.50, -80.25),
+            'KCCC' : (35.10, -100.70), 'KDDD' : (47.60, -122.30)}
+
+
+def record(name, hour, **values):
+    """Returns the line of one record, with observations not in values
+    set from the hour.
+    """
+
+    lat, lon = STATIONS.get(name, (0., 0.))
+    fields = {'TYPE' : 'AO2', 'LAT' : '%.2f' % lat, 'LON' : '%.2f' % lon,
+              'TIME' : '%02d52' % ((hour + 23) % 24), 'TMP' : str(20 + hour),
+              'DEW' : '%.2f' % (10.5 + hour), 'PRWX1' : 'RA', 'CA1' : 'BKN', 'CH1' : '35',
+              'VIS' : '10.00', 'WDR' : '270', 'WSP' : '12', 'MSL' : '1013.25', 'ALT' : '29.92'}
+    fields.update(values)
+    return ':'.join([name + '   '] + [fields.get(k, '') for k in KEYS]) + ':'
+
+
+def hour_blocks():
+    """Returns the lines of the file, one block per date."""
+
+    lines = []
+    for hour, date in enumerate(DATES):
+        lines.append(' ' * 30 + date + ' MDL HOURLY')
+        lines.append(':'.join(['CALL '] + [' %s ' % k for k in KEYS]) + ':')
+        # Fields padded with spaces, and a weather code with a space inside,
+        # which is not a valid code.
+        lines.append(record('KAAA', hour, TMP=' %d ' % (30 + hour), PRWX1='- RA', CA1=' OVC '))
+        # Empty numeric and enumerated fields, and an empty station type.
+        lines.append(record('KBBB', hour, TMP='', PRWX1='', CA1='', TYPE='' if hour == 1 else 'AUTO'))
+        # A station of unknown type.
+        lines.append(record('KCCC', hour, TYPE='UNKN'))
+        # Duplicate records: a manual record is kept over an automated one,
+        # then the record closer to 50 past the hour.
+        if hour == 0:
+            lines.append(record('KDDD', hour, TYPE='AO2', TIME='2345', TMP='1'))
+            lines.append(record('KDDD', hour, TYPE='MANU', TIME='2320', TMP='2'))
+        elif hour == 1:
+            lines.append(record('KDDD', hour, TIME='0020', TMP='3'))
+            lines.append(record('KDDD', hour, TIME='0055', TMP='4'))
+            lines.append(record('KDDD', hour, TIME='0040', TMP='5'))
+        # A station that is not in the station list.
+        lines.append(record('KZZZ', hour))
+        lines.append('ZZZZZZZZ')
+    return lines
+
+
+@pytest.fixture
+def metar_file(tmp_path):
+    path = tmp_path / 'metar.txt'
+    path.write_text('\n'.join(hour_blocks()) + '\n')
+    return str(path)
+
+
+def station_table():
+    return {name : {'lat' : lat, 'lon' : lon} for name, (lat, lon) in STATIONS.items()}
+
+
+def test_columnar_reader(metar_file):
+    stn_lst = sorted(STATIONS)
+    expected = util.read_obs(metar_file, DATES, station_table(), stn_lst, False)
+    expected = util.convert_to_numpy(expected.station_list)
+    result = util.read_obs_columnar(metar_file, DATES, station_table(), stn_lst, False).station_list
+
+    assert sorted(result) == sorted(expected)
+    for name in stn_lst:
+        assert sorted(result[name].observations) == sorted(expected[name].observations)
+        for key, obs in expected[name].observations.items():
+            # convert_to_numpy leaves a list it cannot convert, as the
+            # missing value of a missing hour is for a one byte type.
+            if isinstance(obs, list):
+                obs = np.array(obs).astype(result[name].observations[key].dtype)
+            assert result[name].observations[key].dtype == obs.dtype, (name, key)
+            np.testing.assert_array_equal(result[name].observations[key], obs, err_msg=name+' '+key)
+
+
+def test_columnar_reader_fields(metar_file):
+    stations = util.read_obs_columnar(metar_file, DATES, station_table(), sorted(STATIONS), False).station_list
+
+    np.testing.assert_array_equal(stations['KAAA'].get_obs('TMP'), [30, 31, 32])
+    np.testing.assert_array_equal(stations['KAAA'].get_obs('PRWX1'), [MISSING_VALUE]*3)
+    np.testing.assert_array_equal(stations['KAAA'].get_obs('CA1'), [8, 8, 8])
+    np.testing.assert_array_equal(stations['KBBB'].get_obs('TMP'), [MISSING_VALUE]*3)
+    np.testing.assert_array_equal(stations['KBBB'].get_obs('TYPE'), [6, 9, 6])
+    np.testing.assert_array_equal(stations['KCCC'].get_obs('TYPE'), [9, 9, 9])
+    np.testing.assert_array_equal(stations['KDDD'].get_obs('TMP'), [2, 4, MISSING_VALUE])
+
+
+def test_columnar_reader_unknown_duplicates(tmp_path):
+    """Duplicate records of a station of unknown type are resolved like any
+    other. The record based reader appends both, so it is not compared.
+    """
+
+    lines = [' ' * 30 + DATES[0] + ' MDL HOURLY',
+             ':'.join(['CALL '] + [' %s ' % k for k in KEYS]) + ':',
+             record('KCCC', 0, TYPE='UNKN', TIME='2310', TMP='1'),
+             record('KCCC', 0, TYPE='UNKN', TIME='2348', TMP='2'),
+             'ZZZZZZZZ']
+    path = tmp_path / 'metar.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    stations = util.read_obs_columnar(str(path), DATES[:1], station_table(), ['KCCC'], False).station_list
+
+    np.testing.assert_array_equal(stations['KCCC'].get_obs('TMP'), [2])
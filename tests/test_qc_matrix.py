@@ -0,0 +1,153 @@
+import copy
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from camps.core import Time
+from camps.core.data_conversion.metar_to_nc import qc_general, qc_pressure, qc_temp
+from camps.core.data_conversion.metar_to_nc.station import station
+
+
+"""Regression tests of the [station, time] temperature and pressure QC of
+camps.core.data_conversion.metar_to_nc against the per-station checks
+they replaced.
+"""
+
+
+MISSING_VALUE = 9999
+
+
+def random_stations(seed, start='2020070103', num_stations=40, num_hours=60):
+    """Returns stations sharing num_hours hours from start, with the
+    observations read for temperature and pressure QC, in the types the
+    METAR reader gives them.
+
+    The reported 6-h extremes are the extremes of the hourly temperatures
+    since the last synoptic hour, moved by up to 3 degrees or by 12, so
+    every branch of the 6-h max and min checks is taken.
+    """
+
+    rng = np.random.default_rng(seed)
+    first = Time.str_to_datetime(start)
+    hours = [Time.datetime_to_str(first + timedelta(hours=h)) for h in range(num_hours)]
+    synoptic = np.array([int(h[-2:]) % 6 == 0 for h in hours])
+    offsets = np.array([-12, -3, -2, -1, 0, 0, 0, 1, 1, 2, 3, 12])
+
+    stations = []
+    for s in range(num_stations):
+        # Temperatures in a narrow range repeat within a synoptic period,
+        # with jumps for the consistency check.
+        tmp = rng.integers(60, 66, num_hours) + rng.integers(-1, 2, num_hours) * rng.integers(0, 15, num_hours)
+        tmp[rng.random(num_hours) < 0.1] = MISSING_VALUE
+        dew = tmp - rng.integers(-3, 20, num_hours)
+        dew[rng.random(num_hours) < 0.05] = -35
+        dew[(rng.random(num_hours) < 0.1) | (tmp == MISSING_VALUE)] = MISSING_VALUE
+
+        max_6h = np.full(num_hours, MISSING_VALUE)
+        min_6h = np.full(num_hours, MISSING_VALUE)
+        start_hour = 0
+        for i in np.nonzero(synoptic)[0]:
+            window = tmp[start_hour:i+1]
+            window = window[window != MISSING_VALUE]
+            if len(window) > 0 and rng.random() > 0.1:
+                max_6h[i] = window.max() + rng.choice(offsets)
+                min_6h[i] = window.min() + rng.choice(offsets)
+            start_hour = i + 1
+
+        stn = station('K%03d' % s)
+        stn.hours = list(hours)
+        stn.empty_obs = False
+        stn.observations = {
+            'TYPE' : rng.integers(1, 10, num_hours).astype('int8'),
+            'LAT' : np.full(num_hours, 40., dtype='float32'),
+            'LON' : np.full(num_hours, rng.choice([80., 100.]), dtype='float32'),
+            'TMP' : tmp.astype('int16'),
+            'DEW' : dew.astype('float32'),
+            'MX6' : max_6h.astype('int16'),
+            'MN6' : min_6h.astype('int16'),
+            'X24' : np.full(num_hours, MISSING_VALUE, dtype='int16'),
+            'N24' : np.full(num_hours, MISSING_VALUE, dtype='int16'),
+            'MSL' : np.where(rng.random(num_hours) < 0.05, MISSING_VALUE,
+                             1010 + rng.normal(0, 5, num_hours) + (rng.random(num_hours) < 0.02) * 100).round(1).astype('float32'),
+            'ALT' : np.where(rng.random(num_hours) < 0.05, MISSING_VALUE,
+                             29.9 + rng.normal(0, .1, num_hours)).round(2).astype('float32'),
+        }
+        stations.append(stn)
+    return stations
+
+
+def error_records(errors):
+    return [(err.station_name, err.error_code, err.date_of_error, str(err.old_data_value),
+             str(err.new_data_value), err.explanation) for err in errors]
+
+
+def assert_same_observations(result, expected):
+    for res, exp in zip(result, expected):
+        for key, obs in exp.observations.items():
+            assert res.observations[key].dtype == obs.dtype, (exp.name, key)
+            np.testing.assert_array_equal(res.observations[key], obs, err_msg=exp.name+' '+key)
+
+
+@pytest.mark.parametrize('start', ['2020070100', '2020070103', '2020123121'])
+@pytest.mark.parametrize('seed', range(4))
+def test_qc_temp_matrix(seed, start):
+    expected = random_stations(seed, start)
+    result = copy.deepcopy(expected)
+    expected_errors = []
+    for stn in expected:
+        expected_errors += qc_temp.qc_temp_st(stn)
+
+    result_errors = qc_temp.qc_temp_matrix(result)
+
+    assert error_records(result_errors) == error_records(expected_errors)
+    assert_same_observations(result, expected)
+
+
+def test_qc_temp_matrix_branches():
+    """Every error of the 6-h max and min checks occurs in the data of
+    test_qc_temp_matrix.
+    """
+
+    codes = set()
+    for seed in range(4):
+        codes.update(err.error_code for err in qc_temp.qc_temp_matrix(random_stations(seed)))
+    assert {9901, 9802, 9800, 9803, 9902, 9911, 9912, 9914, 9915, 9921, 9922, 9924, 9925} <= codes
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_qc_pressure_matrix(seed):
+    expected = random_stations(seed)
+    result = copy.deepcopy(expected)
+    expected_errors = []
+    for stn in expected:
+        expected_errors += qc_pressure.qc_pressure_st(stn)
+
+    result_errors = qc_pressure.qc_pressure_matrix(result)
+
+    assert error_records(result_errors) == error_records(expected_errors)
+    assert {9601, 9603, 9604} <= set(err.error_code for err in result_errors)
+    assert_same_observations(result, expected)
+
+
+@pytest.mark.parametrize('tolerance', [10, 3.4, .1, 2])
+@pytest.mark.parametrize('dtype', ['int16', 'float32', 'float64'])
+def test_check_consistency_matrix(tolerance, dtype):
+    """The tolerance of check_consistency changes with the station type
+    from one hour to the next, so check it against each starting value.
+    """
+
+    rng = np.random.default_rng(5)
+    data = (rng.normal(0, 4 * tolerance, (40, 60))).round(1).astype(dtype)
+    data[rng.random(data.shape) < 0.1] = MISSING_VALUE
+    types = rng.integers(1, 10, data.shape).astype('int8')
+
+    expected = data.copy()
+    expected_errors = [qc_general.check_consistency(row, type_row, tolerance)
+                       for row, type_row in zip(expected, types)]
+    result = data.copy()
+    result_errors = qc_general.check_consistency_matrix(result, types, tolerance)
+
+    assert [error_records(e) for e in result_errors] == [error_records(e) for e in expected_errors]
+    assert sum(len(e) for e in expected_errors) > 0
+    np.testing.assert_array_equal(result, expected)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from camps.mospred import smooth
+
+
+"""Regression tests of the summed-area-table smoothing of
+camps.mospred.smooth.smooth_box against the kernel based smooth_kernel
+it replaced.
+"""
+
+
+def masked_grid(shape, seed=0, masked=0.15):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(280., 8., size=shape)
+    return np.ma.array(data, mask=rng.random(shape) < masked)
+
+
+def assert_same(result, expected):
+    np.testing.assert_array_equal(np.ma.getmaskarray(result), np.ma.getmaskarray(expected))
+    valid = ~np.ma.getmaskarray(expected)
+    np.testing.assert_allclose(np.ma.getdata(result)[valid], np.ma.getdata(expected)[valid],
+                               rtol=1.e-12, atol=1.e-9)
+
+
+SHAPES = [(2, 17, 23), (1, 5, 6), (2, 2, 9), (2, 8, 2), (1, 2, 2)]
+
+
+@pytest.mark.parametrize('smooth_type', [9, 25, 81])
+@pytest.mark.parametrize('shape', SHAPES)
+def test_smooth_box(smooth_type, shape):
+    arr = masked_grid(shape)
+    assert_same(smooth.smooth(arr, smooth_type),
+                smooth.smooth_kernel(arr, smooth_type))
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_smooth_box_169(shape):
+    """smooth_kernel stops after two passes of the 25 point kernel for 169
+    point smoothing; smooth_box applies the three documented passes.
+    """
+
+    arr = masked_grid(shape)
+    expected = smooth.smooth_kernel(smooth.smooth_kernel(smooth.smooth_kernel(arr, 25), 25), 25)
+    assert_same(smooth.smooth(arr, 169), expected)
+
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_smooth_box_5(shape):
+    """A point whose 5 kernel points are all masked is masked by smooth_box,
+    where smooth_kernel returns 0. All other points agree.
+    """
+
+    arr = masked_grid(shape, seed=1, masked=0.4)
+    result = smooth.smooth(arr, 5)
+    expected = smooth.smooth_kernel(arr, 5)
+    masked = np.ma.getmaskarray(result)
+    np.testing.assert_array_equal(np.ma.getdata(expected)[masked], 0.)
+    assert not np.ma.getmaskarray(expected)[~masked].any()
+    np.testing.assert_allclose(np.ma.getdata(result)[~masked], np.ma.getdata(expected)[~masked],
+                               rtol=1.e-12, atol=1.e-9)
+
+
+def test_smooth_box_unmasked():
+    arr = np.random.default_rng(2).normal(size=(3, 20, 30))
+    assert_same(smooth.smooth(arr, 25), smooth.smooth_kernel(np.ma.array(arr), 25))
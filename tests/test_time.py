@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from camps.core import Time
+
+
+"""Regression tests of the array time conversions of camps.core.Time
+against the conversions of a single time.
+"""
+
+
+def time_strings(seed=0, count=500):
+    """Returns strings of form YYYYMM[DD[HH[MM]]] of every length from 6
+    to 12, including those that cut a field short.
+    """
+
+    rng = np.random.default_rng(seed)
+    strings = ['20201231235', '202012312', '2020123', '20200229', '202012312359']
+    for n in range(count):
+        stamp = '%04d%02d%02d%02d%02d' % (rng.integers(1971, 2037), rng.integers(1, 13),
+                                          rng.integers(1, 29), rng.integers(0, 24),
+                                          rng.integers(0, 60))
+        stamp = stamp[:rng.integers(6, 13)]
+        # A field cut to one digit can read as day 0, which is not a time.
+        try:
+            Time.str_to_datetime(stamp)
+        except ValueError:
+            continue
+        strings.append(stamp)
+    return strings
+
+
+@pytest.mark.parametrize('dtype', ['U', 'S'])
+def test_str_to_datetime64(dtype):
+    strings = time_strings()
+    result = Time.str_to_datetime64(np.array(strings, dtype=dtype))
+    expected = [np.datetime64(Time.str_to_datetime(s), 's') for s in strings]
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_str_to_datetime64_epoch_time():
+    strings = time_strings(seed=1, count=50)
+    seconds = (Time.str_to_datetime64(strings) - np.datetime64(0, 's')).astype(np.int64)
+    expected = [Time.epoch_time(s) for s in strings]
+    np.testing.assert_array_equal(seconds, expected)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from camps.StatPP.regression import plr
+
+
+"""Regression tests of the vectorized cross products of
+camps.StatPP.regression.plr.xprod_numpy against the loop based
+xprod_loop they replaced.
+"""
+
+
+class Variable(object):
+    """Stands in for a Camps_data object in get_aaa; data is [dates, stations]."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+def predictor_data(num_vars, num_stations, num_dates, integer, seed=0):
+    """Returns a list of masked [dates, stations] arrays with about 5% of
+    values missing, masked as main_camps masks them.
+    """
+
+    rng = np.random.default_rng(seed)
+    variables = []
+    for nv in range(num_vars):
+        if integer:
+            data = rng.integers(-50, 50, size=(num_dates, num_stations)).astype('float32')
+        else:
+            data = rng.normal(280., 10., size=(num_dates, num_stations)).astype('float32')
+        data[rng.random(data.shape) < 0.05] = 9999.
+        # A station with every date missing for one variable.
+        if nv == 1:
+            data[:,3] = 9999.
+        variables.append(Variable(np.ma.masked_greater_equal(data, 9999.)))
+    return variables
+
+
+def station_groups(num_stations, seed=0):
+    """Returns station names and disjoint groups of 1 to 5 stations."""
+
+    stations = ['K%03d' % i for i in range(num_stations)]
+    order = np.random.default_rng(seed).permutation(num_stations)
+    groups = []
+    start = 0
+    sizes = [1, 5, 2, 4, 3]
+    while start < num_stations:
+        size = sizes[len(groups) % len(sizes)]
+        groups.append([stations[i] for i in order[start:start+size]])
+        start += size
+    return stations, groups
+
+
+def reference_aaa(variables):
+    """The aaa array of the original get_aaa, [vars, stations, dates]."""
+
+    aaa = np.dstack([np.ma.getdata(v.data).T for v in variables])
+    return np.moveaxis(aaa, 2, 0)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 256])
+@pytest.mark.parametrize('num_vars', [1, 4])
+def test_xprod_numpy_exact(chunk_size, num_vars):
+    """Integer data has exact sums, so both engines agree exactly."""
+
+    num_stations, num_dates = 40, 30
+    variables = predictor_data(num_vars, num_stations, num_dates, integer=True)
+    stations, groups = station_groups(num_stations)
+    expected = plr.xprod_loop({}, reference_aaa(variables), num_dates, stations, groups, num_vars)
+
+    cube = plr.get_aaa(stations, variables)
+    result = plr.xprod_numpy({}, cube, num_dates, stations, groups, num_vars, chunk_size=chunk_size)
+    for r,e in zip(result, expected):
+        np.testing.assert_array_equal(r, e)
+
+
+@pytest.mark.parametrize('num_processors', [1, 2])
+def test_xprod_close(num_processors):
+    num_vars, num_stations, num_dates = 5, 60, 45
+    variables = predictor_data(num_vars, num_stations, num_dates, integer=False, seed=1)
+    stations, groups = station_groups(num_stations, seed=1)
+    expected = plr.xprod_loop({}, reference_aaa(variables), num_dates, stations, groups, num_vars)
+
+    cube = plr.get_aaa(stations, variables, shared=num_processors > 1)
+    try:
+        result = plr.xprod_numpy({}, cube, num_dates, stations, groups, num_vars,
+                                 chunk_size=8, num_processors=num_processors)
+    finally:
+        cube.close()
+    # xprod_loop multiplies in float32, xprod_numpy in float64.
+    np.testing.assert_array_equal(result[0], expected[0])
+    for r,e in zip(result[1:], expected[1:]):
+        np.testing.assert_allclose(r, e, rtol=1.e-6)
+